@@ -28,6 +28,21 @@ class MobileAgent(ABC):
         """
         pass
 
+    def bulkgenerator(self, tx, params, number):
+        """
+        Generates a number of agents in one transaction. The base function calls generator once per agent, so models
+        which do not override it get no batching. Subclasses should override it to insert all the agents with a single
+        batched write using Interface.addagents, as Population and large Resets call it for every agent they add.
+
+        :param tx: write transaction for a neo4j database
+        :param params: paramaters are given as a list to be used by the subclass.
+        :param number: number of agents to generate
+
+        :return: None
+        """
+        for i in range(number):
+            self.generator(tx, params)
+
     @abstractmethod
     def perception(self, tx, perc):
         """
@@ -79,7 +94,7 @@ class MobileAgent(ABC):
         """
         return None
 
-    def move(self, tx, perc):
+    def move(self, tx, perc, moves=None):
         """
         This function performs action of the agent. It calls the choice function and checks for a return and a payment
         has been made (if the payment fails the agent doesn't move). The agent is moved and then learns. There is no
@@ -87,23 +102,91 @@ class MobileAgent(ABC):
 
         :param tx: neo4j write transaction
         :param perc: perception of local surroundings passed to agent by it's local node
+        :param moves: list collecting pending moves in batch mode. If given the agent and its destination are appended
+                      and the payment, relocation and learning are left to commitmoves.
 
         :return: If agent moves return the new local node
         """
         self.choice = self.choose(tx, perc)
         if self.choice:
+            if moves is not None:
+                new = self.choice.end_node[self.nuid]
+                moves.append((self, new))
+                return new
             if self.payment(tx):
-                # Move node based on choice using tx
-                tx.run("MATCH (n:Agent)-[r:LOCATED]->() "
-                       "WHERE n.id = {id} "
-                       "DELETE r", id=self.id)
                 new = self.choice.end_node[self.nuid]
-                tx.run("MATCH (n:Agent), (a:Node) "
-                       "WHERE n.id={id} AND a." + self.nuid + "={new} "
-                                                              "CREATE (n)-[r:LOCATED]->(a)", id=self.id, new=new)
+                # Move node based on choice using tx
+                intf.moveagent(tx, self.id, new, self.nuid)
                 self.learn(tx, self.choice)
                 return new
 
+    @classmethod
+    def choosebatch(cls, tx, agents, edges, view):
+        """
+        Chooses moves for every agent at a node in one call, used by Node.agentsbatch when batch_decisions is set in
+        specification. Subclasses can override this with vectorised NumPy code; the base function falls back to
+        creating each agent and calling its choose function. Payment is left to commitmoves, so only agents whose move
+        is accepted pay.
+
+        :param tx: neo4j write transaction
+        :param agents: dictionary of agent attribute name to NumPy array, one entry per agent, always including "id"
+        :param edges: dictionary of candidate edge attribute name to NumPy array, one entry per edge in view, with
+                      "destination" holding the end node id and end node attributes prefixed "end_"
+        :param view: the candidate relationship objects in the same order as the edge arrays
+
+        :return: NumPy integer array giving each agent's chosen destination as an index into view, -1 to stay
+        """
+        import numpy
+        positions = {id(edge): i for i, edge in enumerate(view)}
+        choices = numpy.full(len(agents["id"]), -1, dtype=int)
+        for i, agentid in enumerate(agents["id"].tolist()):
+            agent = cls(agentid)
+            choice = agent.choose(tx, list(view))
+            if choice:
+                choices[i] = positions[id(choice)] if id(choice) in positions else view.index(choice)
+        return choices
+
+    @staticmethod
+    def commitmoves(tx, moves):
+        """
+        Writes the relocations collected by move in batch mode with one query per node id type, then calls learn for
+        each moved agent in the order they chose. The agents chose before any of the batch had moved or learned, so
+        destinations with a cap are re-read and accept arrivals in the order chosen until their load reaches the cap.
+        Each accepted agent then makes its payment, and only agents whose payment succeeds move and learn. Agents
+        turned away by a cap stay where they are without paying.
+
+        :param tx: neo4j write transaction
+        :param moves: list of (agent, destination) pairs collected by move
+
+        :return: list of the (agent, destination) pairs turned away
+        """
+        accepted = []
+        rejected = []
+        free = {}
+        for agent, new in moves:
+            if agent.choice is not None and "cap" in agent.choice.end_node.keys():
+                key = (agent.nuid, new)
+                if key not in free:
+                    node = intf.getnode(tx, new, "Node", agent.nuid)
+                    free[key] = node["cap"] - node["load"]
+                if free[key] <= 0:
+                    rejected.append((agent, new))
+                    continue
+                if not agent.payment(tx):
+                    continue
+                free[key] = free[key] - 1
+            elif not agent.payment(tx):
+                continue
+            accepted.append((agent, new))
+        bynuid = {}
+        for agent, new in accepted:
+            bynuid.setdefault(agent.nuid, []).append({"id": agent.id, "new": new})
+        for nuid in bynuid:
+            intf.moveagents(tx, bynuid[nuid], nuid)
+        for agent, new in accepted:
+            agent.learn(tx, agent.choice)
+        return rejected
+
 
 class CommunicativeAgent(ABC):
     """
@@ -0,0 +1,182 @@
+import threading
+from contextlib import contextmanager
+import SPmodelling.Instrument as instrument
+import SPmodelling.Memory as memory
+
+
+def name():
+    """
+    Name of the graph backend selected by the specification. Set backend = "memory" in specification to run against
+    the in-process graph store, otherwise the neo4j database at specification.database_uri is used.
+
+    :return: "neo4j" or "memory"
+    """
+    import specification
+    return getattr(specification, "backend", "neo4j")
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of drivers and idle sessions keyed by backend, database uri and the per module credentials in
+    specification. Drivers are created once and kept until close is called, sessions are returned to the pool after
+    use so the next tick or module with the same credentials reuses them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.drivers = {}
+        self.sessions = {}
+        self.stats = {"drivers created": 0, "drivers reused": 0, "sessions created": 0, "sessions reused": 0}
+
+    @staticmethod
+    def key(auth):
+        """
+        Pool key for the current specification and the given credentials.
+        """
+        import specification
+        try:
+            hash(auth)
+        except TypeError:
+            auth = repr(auth)
+        return name(), getattr(specification, "database_uri", "default"), auth
+
+    def driver(self, auth, max_connection_lifetime=2000):
+        """
+        Returns the shared driver for the credentials, creating it on first use.
+
+        :param auth: per module credentials from specification, eg. specification.Flow_auth
+        :param max_connection_lifetime: passed to the neo4j driver when it is created
+
+        :return: driver with a session() method
+        """
+        key = self.key(auth)
+        with self.lock:
+            if key in self.drivers:
+                self.stats["drivers reused"] += 1
+                return self.drivers[key]
+            backendname, uri, _ = key
+            if backendname == "memory":
+                dri = memory.MemoryDriver(memory.graph(uri))
+            else:
+                from neo4j import GraphDatabase
+                dri = GraphDatabase.driver(uri, auth=auth, max_connection_lifetime=max_connection_lifetime)
+            self.drivers[key] = dri
+            self.stats["drivers created"] += 1
+            return dri
+
+    @contextmanager
+    def session(self, auth, max_connection_lifetime=2000):
+        """
+        Lends an idle session for the credentials, opening one if none is free, and returns it to the pool afterwards.
+        Neo4j sessions are lent wrapped so statements sent directly with run are recorded when instrumentation is on.
+
+        :param auth: per module credentials from specification
+        :param max_connection_lifetime: passed to the neo4j driver when it is created
+
+        :return: context manager giving a session
+        """
+        key = self.key(auth)
+        dri = self.driver(auth, max_connection_lifetime)
+        with self.lock:
+            idle = self.sessions.setdefault(key, [])
+            if idle:
+                ses = idle.pop()
+                self.stats["sessions reused"] += 1
+            else:
+                ses = None
+                self.stats["sessions created"] += 1
+        if ses is None:
+            ses = dri.session()
+        try:
+            yield ses if key[0] == "memory" else instrument.RecordedSession(ses)
+        finally:
+            with self.lock:
+                if key in self.drivers:
+                    self.sessions.setdefault(key, []).append(ses)
+                else:
+                    ses.close()
+
+    def size(self):
+        """
+        Number of open drivers and idle sessions held by the pool.
+
+        :return: dictionary with "drivers" and "idle sessions" counts
+        """
+        with self.lock:
+            return {"drivers": len(self.drivers),
+                    "idle sessions": sum(len(idle) for idle in self.sessions.values())}
+
+    def close(self):
+        """
+        Closes all pooled sessions and drivers. Sessions still lent out are closed when they are returned.
+
+        :return: None
+        """
+        with self.lock:
+            for idle in self.sessions.values():
+                for ses in idle:
+                    ses.close()
+            for dri in self.drivers.values():
+                dri.close()
+            self.sessions = {}
+            self.drivers = {}
+
+
+pool = ConnectionPool()
+
+
+def driver(auth, max_connection_lifetime=2000):
+    """
+    Returns the pooled driver for the selected backend and the given credentials. The neo4j driver is created with the
+    credentials, the memory driver ignores them and hands out sessions over the shared in-process graph.
+
+    :param auth: per module credentials from specification, eg. specification.Flow_auth
+    :param max_connection_lifetime: passed to the neo4j driver
+
+    :return: driver with a session() method
+    """
+    return pool.driver(auth, max_connection_lifetime)
+
+
+def session(auth, max_connection_lifetime=2000):
+    """
+    Lends a pooled session for the given credentials, use as a context manager.
+
+    :param auth: per module credentials from specification, eg. specification.Flow_auth
+    :param max_connection_lifetime: passed to the neo4j driver
+
+    :return: context manager giving a session
+    """
+    return pool.session(auth, max_connection_lifetime)
+
+
+def stats():
+    """
+    Pool size and reuse counts, eg. to check connections are set up once per run rather than once per tick.
+
+    :return: dictionary of counts
+    """
+    with pool.lock:
+        counts = dict(pool.stats)
+    counts.update(pool.size())
+    return counts
+
+
+def close():
+    """
+    Closes all pooled connections, called at the end of a batch of runs.
+
+    :return: None
+    """
+    pool.close()
+
+
+def inmemory(tx):
+    """
+    Checks if a transaction belongs to the in-memory backend.
+
+    :param tx: transaction passed to an Interface function
+
+    :return: True if Interface functions should use the in-memory graph
+    """
+    return isinstance(tx, memory.MemoryTransaction)
@@ -1,7 +1,9 @@
-from neo4j import GraphDatabase
+import SPmodelling.Backend as backend
+import SPmodelling.Cache as cache
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Instrument as instrument
 from abc import ABC, abstractmethod
-import specification
-import SPmodelling.Interface as intf
+import SPmodelling.Paths as paths
 
 
 class FlowReaction(ABC):
@@ -31,6 +33,21 @@ class FlowReaction(ABC):
         pass
 
 
+def step(ses, flowreaction):
+    """
+    Applies the flow reaction rules once and drops node views and shortest path graphs read before the change, which
+    may have been made with queries outside the Interface.
+
+    :param ses: neo4j session
+    :param flowreaction: specification.Balancer.FlowReaction instance
+
+    :return: None
+    """
+    ses.write_transaction(flowreaction.applyrules)
+    cache.perceptions.clear()
+    paths.service.clear()
+
+
 def main(rl):
     """
     Implements a FlowReaction repeatedly until the clock in the database reaches the run length.
@@ -39,17 +56,32 @@ def main(rl):
 
     :return: None
     """
+    import specification
+    flowreaction = specification.Balancer.FlowReaction()
+    clock = 0
+    with backend.session(specification.Balancer_auth) as ses:
+        while clock < rl:
+            with instrument.step("Balancer", clock):
+                step(ses, flowreaction)
+            clock = clocksignal.waittick(ses, clock)
+    print("Balancer closed")
+
+
+async def amain(rl):
+    """
+    Asynchronous version of main run as a task by Orchestrator.run.
+
+    :param rl: run length
+
+    :return: None
+    """
+    import specification
+    import SPmodelling.Orchestrator as orchestrator
     flowreaction = specification.Balancer.FlowReaction()
     clock = 0
-    while clock < rl:
-        dri = GraphDatabase.driver(specification.database_uri, auth=specification.Balancer_auth,
-                                   max_connection_lifetime=2000)
-        with dri.session() as ses:
-            ses.write_transaction(flowreaction.applyrules)
-            tx = ses.begin_transaction()
-            time = intf.gettime(tx)
-            while clock == time:
-                time = intf.gettime(tx)
-            clock = time
-        dri.close()
+    with backend.session(specification.Balancer_auth) as ses:
+        while clock < rl:
+            with instrument.step("Balancer", clock):
+                await orchestrator.call(step, ses, flowreaction)
+            clock = await orchestrator.waittick(ses, clock)
     print("Balancer closed")
@@ -0,0 +1,260 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+
+
+class PerceptionCache:
+    """
+    Node neighbourhoods (the node followed by its outgoing REACHES edges) keyed by node id and tick, shared by all
+    agents at a node. Entries are dropped when the Interface changes the node, one of its edges or one of the nodes
+    those edges reach, and all entries are dropped after each Structure and Balancer step.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.members = {}
+
+    def get(self, uid, nodeid, clock):
+        """
+        Cached neighbourhood of a node for the given tick.
+
+        :param uid: type of id used for the node
+        :param nodeid: id of the node
+        :param clock: current time
+
+        :return: list of node followed by edges, None if not cached for this tick
+        """
+        with self.lock:
+            entry = self.entries.get((uid, nodeid))
+            if entry and entry[0] == clock:
+                return entry[1]
+        return None
+
+    def put(self, uid, nodeid, clock, view):
+        """
+        Stores the neighbourhood of a node for the given tick.
+
+        :param uid: type of id used for the node
+        :param nodeid: id of the node
+        :param clock: current time
+        :param view: list of node followed by edges as returned by Interface.nodeperception
+
+        :return: None
+        """
+        key = (uid, nodeid)
+        values = {(uid, nodeid)} | {(uid, edge.end_node.get(uid)) for edge in view[1:]}
+        with self.lock:
+            self._drop(key)
+            self.entries[key] = (clock, view, values)
+            for value in values:
+                self.members.setdefault(value, set()).add(key)
+
+    def invalidate(self, uid, nodeid):
+        """
+        Drops every cached neighbourhood containing a node, either as the source or as the end of an edge. If cached
+        nodes are identified by a different type of id the node cannot be matched and everything is dropped.
+
+        :param uid: type of id used for the changed node
+        :param nodeid: id of the changed node
+
+        :return: None
+        """
+        with self.lock:
+            if any(key[0] != uid for key in self.entries):
+                self.entries = {}
+                self.members = {}
+                return
+            for key in list(self.members.get((uid, nodeid), ())):
+                self._drop(key)
+
+    def clear(self):
+        """
+        Drops all cached neighbourhoods.
+
+        :return: None
+        """
+        with self.lock:
+            self.entries = {}
+            self.members = {}
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry:
+            for value in entry[2]:
+                keys = self.members.get(value)
+                if keys:
+                    keys.discard(key)
+                    if not keys:
+                        del self.members[value]
+
+
+class NeighbourhoodCache:
+    """
+    Social contacts and co-located agents for every agent, each read in bulk once per tick and shared by all agents in
+    the Social step. Only the Social step is served from the cache, other modules always read the database. An agent's
+    contacts are marked stale when the Interface creates, changes or deletes one of its contact edges, or deletes the
+    agent at either end, and are then read directly until the next tick. Co-location is a snapshot of agent positions
+    when first read in the tick, read again after agents are added, moved or deleted.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clock = None
+        self.active = contextvars.ContextVar("neighbourhoods", default=False)
+        self.changes = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Drops everything read, called with the lock held.
+        """
+        self.changes += 1
+        self.edges = None
+        self.located = None
+        self.atnode = None
+        self.stale = set()
+
+    @contextmanager
+    def step(self, clock):
+        """
+        Serves contacts and co-location from the cache until the block ends, to the calling thread or task and to work
+        it runs with a copy of its context. The cache is emptied when the block ends.
+
+        :param clock: current time
+
+        :return: context manager
+        """
+        self.open(clock)
+        token = self.active.set(True)
+        try:
+            yield
+        finally:
+            self.active.reset(token)
+            self.close()
+
+    def open(self, clock):
+        """
+        Serves contacts and co-location from the cache for a tick, dropping anything read in an earlier tick.
+
+        :param clock: current time
+
+        :return: None
+        """
+        with self.lock:
+            if clock != self.clock:
+                self.reset()
+                self.clock = clock
+
+    def close(self):
+        """
+        Stops serving from the cache and drops its contents.
+
+        :return: None
+        """
+        with self.lock:
+            self.clock = None
+            self.reset()
+
+    def contacts(self, node_a, label, contact_label, load):
+        """
+        Outgoing SOCIAL edges of a node from the cache.
+
+        :param node_a: source node id
+        :param label: source node label, None for any
+        :param contact_label: end node label, None for any
+        :param load: function returning every SOCIAL edge as (source id, source labels, end id, end labels,
+                     relationship)
+
+        :return: list of relationships, None if the cache is not serving this caller or the node's contacts are stale
+        """
+        with self.lock:
+            if self.clock is None or not self.active.get() or node_a in self.stale:
+                return None
+            changes = self.changes
+            edges = self.edges
+        if edges is None:
+            edges = {}
+            for start, labels_a, end, labels_b, edge in load():
+                edges.setdefault(start, []).append((labels_a, end, labels_b, edge))
+            with self.lock:
+                if self.changes == changes and self.edges is None:
+                    self.edges = edges
+        return [edge for labels_a, end, labels_b, edge in edges.get(node_a, ())
+                if (not label or label in labels_a) and (not contact_label or contact_label in labels_b)]
+
+    def colocated(self, agent, load):
+        """
+        Agents at the same node as an agent from the cache.
+
+        :param agent: agent id
+        :param load: function returning every agent location as (node key, agent node)
+
+        :return: list of agent nodes, None if the cache is not serving this caller
+        """
+        with self.lock:
+            if self.clock is None or not self.active.get():
+                return None
+            changes = self.changes
+            located = self.located
+            atnode = self.atnode
+        if located is None:
+            located = {}
+            atnode = {}
+            for node, ag in load():
+                located[ag["id"]] = node
+                atnode.setdefault(node, []).append(ag)
+            with self.lock:
+                if self.changes == changes and self.located is None:
+                    self.located = located
+                    self.atnode = atnode
+        if agent not in located:
+            return []
+        return list(atnode[located[agent]])
+
+    def invalidate(self, node_a=None):
+        """
+        Marks a node's contacts stale, or drops everything read this tick if no node is given.
+
+        :param node_a: id of the node whose contact edges changed
+
+        :return: None
+        """
+        with self.lock:
+            if node_a is None:
+                self.reset()
+            else:
+                self.stale.add(node_a)
+
+    def removeagent(self, agent):
+        """
+        Marks the contacts of a deleted agent, and of every agent with a cached contact edge to it, stale and drops the
+        co-location snapshot.
+
+        :param agent: id of the deleted agent
+
+        :return: None
+        """
+        with self.lock:
+            self.stale.add(agent)
+            for start, edges in (self.edges or {}).items():
+                if any(end == agent for labels_a, end, labels_b, edge in edges):
+                    self.stale.add(start)
+            self.changes += 1
+            self.located = None
+            self.atnode = None
+
+    def invalidatelocations(self):
+        """
+        Drops the co-location snapshot, called when agents are added or moved.
+
+        :return: None
+        """
+        with self.lock:
+            self.changes += 1
+            self.located = None
+            self.atnode = None
+
+
+perceptions = PerceptionCache()
+neighbourhoods = NeighbourhoodCache()
@@ -0,0 +1,140 @@
+import gzip
+import os
+import pickle
+import threading
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Interface as intf
+
+lock = threading.Lock()
+participants = {}
+pending = {}
+
+
+def register(name, participant):
+    """
+    Adds a module object whose state is kept in checkpoints, eg. the Monitor. It must have getstate and setstate
+    functions. If a checkpoint holding state for the name has been restored the state is handed to it now.
+
+    :param name: name the state is saved under
+    :param participant: object with getstate() and setstate(state)
+
+    :return: None
+    """
+    with lock:
+        participants[name] = participant
+        state = pending.pop(name, None)
+    if state is not None:
+        participant.setstate(state)
+
+
+def unregister(name):
+    """
+    Stops keeping a module object's state in checkpoints.
+
+    :param name: name given to register
+
+    :return: None
+    """
+    with lock:
+        participants.pop(name, None)
+
+
+def discard():
+    """
+    Drops restored participant state not yet handed over, eg. when the next run is reset rather than restored.
+
+    :return: None
+    """
+    with lock:
+        pending.clear()
+
+
+def save(ses, path):
+    """
+    Writes the simulation state to a compressed file: every node and relationship in the graph, including the Clock
+    and Tag, the queues of the specification's nodes and the state of registered participants. The file is written
+    beside its final name and renamed into place so an interrupted write never replaces a good checkpoint.
+
+    :param ses: neo4j session
+    :param path: checkpoint file name
+
+    :return: path
+    """
+    import specification
+    with lock:
+        states = {name: participant.getstate() for name, participant in participants.items()}
+    time, nodes, edges = ses.read_transaction(intf.graphsnapshot)
+    state = {"time": time,
+             "nodes": nodes,
+             "edges": edges,
+             "queues": {node.name: node.queue for node in specification.nodes if node.queue is not None},
+             "participants": states}
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with gzip.open(path + ".tmp", "wb") as f:
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def load(path):
+    """
+    Reads a checkpoint file.
+
+    :param path: checkpoint file name
+
+    :return: dictionary of checkpointed state
+    """
+    with gzip.open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def restore(ses, path, batch_size=10000):
+    """
+    Rebuilds the simulation state from a checkpoint into an empty database. Nodes and relationships are created in
+    transactions of batch_size, node queues are replaced and participant state is handed over as each participant
+    registers. Modules waiting on the clock are woken at the checkpointed time.
+
+    :param ses: neo4j session
+    :param path: checkpoint file name
+    :param batch_size: nodes or relationships created per transaction
+
+    :return: time on the restored clock
+    """
+    import specification
+    state = load(path)
+    ses.write_transaction(intf.createindex, "Checkpoint", "_checkpoint")
+    nodes = state["nodes"]
+    for start in range(0, len(nodes), batch_size):
+        ses.write_transaction(intf.restorenodes, nodes[start:start + batch_size])
+    edges = state["edges"]
+    for start in range(0, len(edges), batch_size):
+        ses.write_transaction(intf.restoreedges, edges[start:start + batch_size])
+    ses.write_transaction(intf.finishrestore)
+    for node in specification.nodes:
+        if node.name in state["queues"]:
+            node.queue = state["queues"][node.name]
+    with lock:
+        pending.clear()
+        pending.update(state["participants"])
+    clocksignal.signal.publish(state["time"])
+    return state["time"]
+
+
+def due(ses, clock):
+    """
+    Writes a checkpoint if the clock is at a multiple of checkpoint_interval in specification. Checkpoints are saved in
+    checkpoint_path, "checkpoints" by default, named after the run and time.
+
+    :param ses: neo4j session
+    :param clock: current time
+
+    :return: checkpoint file name, None if no checkpoint was due
+    """
+    import specification
+    interval = getattr(specification, "checkpoint_interval", None)
+    if not interval or clock % interval:
+        return None
+    name = str(ses.read_transaction(intf.getrunname)) + "_" + str(clock) + ".ckpt"
+    return save(ses, os.path.join(getattr(specification, "checkpoint_path", "checkpoints"), name))
@@ -0,0 +1,109 @@
+import threading
+
+
+class TickSignal:
+    """
+    Process-wide notification of clock ticks. tick publishes each new time once it is committed and modules waiting for
+    the clock to advance block on the signal in waittick instead of repeatedly reading the Clock node. Module loops
+    running as asyncio tasks await it with waitasync.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.time = None
+        self.waiters = set()
+
+    def publish(self, time):
+        """
+        Records the new clock time and wakes all waiting modules.
+
+        :param time: new time on the clock
+
+        :return: None
+        """
+        with self.condition:
+            self.time = time
+            self.condition.notify_all()
+            waiters = list(self.waiters)
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def wait(self, clock, timeout=None):
+        """
+        Blocks until a time later than clock has been published or the timeout expires.
+
+        :param clock: last time seen by the caller
+        :param timeout: seconds to wait, None to wait indefinitely
+
+        :return: latest published time, None if nothing has been published
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.time is not None and self.time > clock, timeout)
+            return self.time
+
+    async def waitasync(self, clock, timeout=None):
+        """
+        Waits without blocking the event loop until a time later than clock has been published or the timeout expires.
+
+        :param clock: last time seen by the caller
+        :param timeout: seconds to wait, None to wait indefinitely
+
+        :return: latest published time, None if nothing has been published
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self.condition:
+            if self.time is not None and self.time > clock:
+                return self.time
+            self.waiters.add(waiter)
+        try:
+            await asyncio.wait([future], timeout=timeout)
+        finally:
+            with self.condition:
+                self.waiters.discard(waiter)
+        return self.time
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+signal = TickSignal()
+
+
+def tick(ses):
+    """
+    Increments the clock in its own write transaction, then wakes the modules waiting for it. Publishing after the
+    commit means woken modules read the new time rather than finding the old one and polling until the commit.
+
+    :param ses: neo4j session
+
+    :return: New time
+    """
+    import SPmodelling.Interface as intf
+    time = ses.write_transaction(intf.tick)
+    signal.publish(time)
+    return time
+
+
+def waittick(ses, clock, timeout=0.1):
+    """
+    Blocks until the clock has moved on from the given time. Waits on the tick signal published by tick, re-reading
+    the clock in a short read transaction when woken or after the timeout so a clock advanced from another process is
+    still seen. No transaction is held open while waiting.
+
+    :param ses: neo4j session
+    :param clock: last time seen by the caller
+    :param timeout: seconds between clock reads when no tick is signalled
+
+    :return: Current time on clock
+    """
+    import SPmodelling.Interface as intf
+    time = ses.read_transaction(intf.gettime)
+    while time == clock:
+        signal.wait(clock, timeout)
+        time = ses.read_transaction(intf.gettime)
+    return time
@@ -1,33 +1,215 @@
-from neo4j import GraphDatabase
-import specification
+import contextvars
+import os
+import SPmodelling.Backend as backend
+import SPmodelling.Checkpoint as checkpoint
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Instrument as instrument
 import SPmodelling.Interface as intf
+from SPmodelling.Agent import MobileAgent
+
+
+def processnode(tx, node, batch=False):
+    """
+    Runs a node's agentsready in a transaction. In batch mode the agents' moves are collected and written together at
+    the end of the node.
+
+    :param tx: neo4j write transaction
+    :param node: Node to process
+    :param batch: collect moves and write them in one query
+
+    :return: None
+    """
+    node.moves = [] if batch else None
+    node.agentsready(tx)
+    if batch:
+        MobileAgent.commitmoves(tx, node.moves)
+    node.moves = None
+
+
+def processtick(tx, nodes):
+    """
+    Runs agentsready for every node in a single transaction, collecting all moves and writing them together at the end
+    of the tick. Agents keep their location until the write, so each agent is processed at most once per tick.
+
+    :param tx: neo4j write transaction
+    :param nodes: list of Nodes to process
+
+    :return: None
+    """
+    moves = []
+    for node in nodes:
+        node.moves = moves
+        node.agentsready(tx)
+    MobileAgent.commitmoves(tx, moves)
+    for node in nodes:
+        node.moves = None
+
+
+def shards(nodes, count):
+    """
+    Splits the nodes into count shards of near equal size, dealing them out in turn so neighbouring nodes in the
+    specification's list are spread across shards.
+
+    :param nodes: list of Nodes
+    :param count: number of shards
+
+    :return: list of non-empty lists of Nodes
+    """
+    return [nodes[i::count] for i in range(count) if nodes[i::count]]
+
+
+def processshard(tx, nodes):
+    """
+    Runs agentsready for every node in a shard, collecting the moves without writing them.
+
+    :param tx: neo4j write transaction
+    :param nodes: list of Nodes in the shard
+
+    :return: list of (agent, destination) pairs
+    """
+    moves = []
+    for node in nodes:
+        node.moves = moves
+        node.agentsready(tx)
+        node.moves = None
+    return moves
+
+
+def runshard(nodes):
+    """
+    Processes a shard on a pooled session of its own. On the memory backend the shard runs in an explicit transaction,
+    which locks per Interface call rather than for the whole shard, so shards interleave.
+
+    :param nodes: list of Nodes in the shard
+
+    :return: list of (agent, destination) pairs
+    """
+    import specification
+    with backend.session(specification.Flow_auth) as ses:
+        if backend.name() == "memory":
+            return processshard(ses.begin_transaction(), nodes)
+        return ses.write_transaction(processshard, nodes)
+
+
+def reconcile(tx, moves):
+    """
+    Writes the moves from every shard at the end of the tick with commitmoves, so capped destinations accept arrivals
+    in shard order until their load reaches the cap. Agents pay only once their move is accepted.
+
+    :param tx: neo4j write transaction
+    :param moves: list of (agent, destination) pairs from all shards in shard order
+
+    :return: number of moves turned away
+    """
+    return len(MobileAgent.commitmoves(tx, moves))
+
+
+def step(ses, batch=None, executor=None):
+    """
+    Processes the agents at every node once, without ticking the clock.
+
+    :param ses: neo4j session
+    :param batch: batch_moves setting, None, "node", "tick" or "shard"
+    :param executor: concurrent.futures executor running the shards when batch is "shard", None to run them in turn
+
+    :return: None
+    """
+    import specification
+    if batch == "tick":
+        ses.write_transaction(processtick, specification.nodes)
+    elif batch == "shard":
+        parts = shards(specification.nodes, getattr(specification, "flow_shards", None) or os.cpu_count() or 1)
+        if executor is None:
+            results = [runshard(part) for part in parts]
+        else:
+            futures = [executor.submit(contextvars.copy_context().run, runshard, part) for part in parts]
+            results = [future.result() for future in futures]
+        ses.write_transaction(reconcile, [move for moves in results for move in moves])
+    else:
+        for node in specification.nodes:
+            ses.write_transaction(processnode, node, batch == "node")
+
+
+def shardexecutor(batch):
+    """
+    Thread pool for the shards when batch_moves is "shard" and there is more than one shard.
+
+    :param batch: batch_moves setting
+
+    :return: concurrent.futures executor, None when shards are not run concurrently
+    """
+    import specification
+    import concurrent.futures
+    count = min(getattr(specification, "flow_shards", None) or os.cpu_count() or 1, len(specification.nodes))
+    if batch != "shard" or count < 2:
+        return None
+    return concurrent.futures.ThreadPoolExecutor(max_workers=count)
+
 
 def main(rl, rn):
     """
     Process agents at each node and call the move function for each. Ticks the clock after all agents have been
-    processed. Stops when clock reaches or exceeds run length.
+    processed. Stops when clock reaches or exceeds run length. Set batch_moves in specification to "node" or "tick" to
+    write agent moves together per node or per tick instead of one at a time. Set it to "shard" to split the nodes into
+    flow_shards shards, one per CPU by default, processed concurrently on their own sessions with the moves written
+    together by reconcile at the end of the tick. Checkpoints are written after the clock ticks when
+    checkpoint_interval is set in specification.
 
     :param rl: run length
     :param rn: run number
 
     :return: None
     """
+    import specification
     print("In to flow")
     verbose = False
-    uri = specification.database_uri
-    dri = GraphDatabase.driver(uri, auth=specification.Flow_auth, max_connection_lifetime=2000)
+    batch = getattr(specification, "batch_moves", None)
     nuid = "name"
     runtype = "dynamic"
     runnum = rn
     runname = "careag_" + runtype + "_" + str(runnum)
-    with dri.session() as ses:
-        clock = 0
-        while clock < rl:
-            for node in specification.nodes:
-                ses.write_transaction(node.agentsready)
-            clock = ses.write_transaction(intf.gettime)
-            ses.write_transaction(intf.tick)
-            print("T: " + clock.__str__())
-        # ses.write_transaction(activeagentsave, nodes[1:], intf, runname)
-    dri.close()
+    executor = shardexecutor(batch)
+    try:
+        with backend.session(specification.Flow_auth) as ses:
+            clock = 0
+            while clock < rl:
+                with instrument.step("Flow", clock):
+                    step(ses, batch, executor)
+                    clock = ses.write_transaction(intf.gettime)
+                    checkpoint.due(ses, clocksignal.tick(ses))
+                print("T: " + clock.__str__())
+            # ses.write_transaction(activeagentsave, nodes[1:], intf, runname)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print("Flow closed")
+
+
+async def amain(rl, rn):
+    """
+    Asynchronous version of main run as a task by Orchestrator.run. Each pass runs step on one of the event loop's
+    worker threads, with shards on a pool of their own as in main.
+
+    :param rl: run length
+    :param rn: run number
+
+    :return: None
+    """
+    import specification
+    import SPmodelling.Orchestrator as orchestrator
+    print("In to flow")
+    batch = getattr(specification, "batch_moves", None)
+    executor = shardexecutor(batch)
+    try:
+        with backend.session(specification.Flow_auth) as ses:
+            clock = 0
+            while clock < rl:
+                with instrument.step("Flow", clock):
+                    await orchestrator.call(step, ses, batch, executor)
+                    clock = await orchestrator.transaction(ses, intf.gettime)
+                    await orchestrator.call(checkpoint.due, ses, await orchestrator.call(clocksignal.tick, ses))
+                print("T: " + clock.__str__())
+    finally:
+        if executor is not None:
+            executor.shutdown()
     print("Flow closed")
@@ -0,0 +1,299 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+enabled = False
+lock = threading.Lock()
+local = threading.local()
+current = contextvars.ContextVar("current", default=(None, None))
+calls = {}
+steps = {}
+
+
+def enable(on=True):
+    """
+    Turns recording on or off. It is off by default and costs a flag check per query when off. SPm.run turns it on for
+    a run when instrument is set in specification.
+
+    :param on: record if True
+
+    :return: None
+    """
+    global enabled
+    enabled = on
+
+
+def reset():
+    """
+    Drops everything recorded, called at the start of each run.
+
+    :return: None
+    """
+    with lock:
+        calls.clear()
+        steps.clear()
+
+
+@contextmanager
+def step(module, clock):
+    """
+    Marks one pass of a module's loop. Queries made in the thread, or asyncio task, until the pass ends are recorded
+    against the module and tick, and the pass's duration is recorded as the module's time for the tick. Queries outside
+    any pass, eg. waiting for the clock, are recorded without a module.
+
+    :param module: module name, eg. "Flow"
+    :param clock: time at the start of the pass
+
+    :return: context manager
+    """
+    token = current.set((module, clock))
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.reset(token)
+        if enabled:
+            seconds = time.perf_counter() - start
+            with lock:
+                entry = steps.setdefault((clock, module), [0, 0.0])
+                entry[0] += 1
+                entry[1] += seconds
+
+
+def record(function, seconds, rows=0, server=0.0):
+    """
+    Records one query or in-memory graph call against the current module and tick.
+
+    :param function: Interface function or query name
+    :param seconds: time from sending the query to having all its rows
+    :param rows: number of rows returned
+    :param server: time reported by the server, 0 where unavailable
+
+    :return: None
+    """
+    module, clock = current.get()
+    key = (clock, module, function)
+    with lock:
+        entry = calls.setdefault(key, [0, 0.0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += server
+        entry[3] += rows
+
+
+def call(function, method, *args, **kwargs):
+    """
+    Runs and records an in-memory graph call. Calls made from inside another recorded call are part of it and are not
+    recorded separately.
+
+    :param function: name to record the call under
+    :param method: function to run
+
+    :return: result of method
+    """
+    depth = getattr(local, "depth", 0)
+    if depth:
+        return method(*args, **kwargs)
+    local.depth = 1
+    start = time.perf_counter()
+    try:
+        result = method(*args, **kwargs)
+    finally:
+        local.depth = 0
+    record(function, time.perf_counter() - start, len(result) if isinstance(result, list) else int(result is not None))
+    return result
+
+
+def statement(run, statement, parameters=None, **kwparameters):
+    """
+    Runs and records a Cypher statement sent directly with tx.run or session.run rather than through Queries.run. The
+    result is fetched in full so the time includes the rows coming back.
+
+    :param run: the driver's run method
+    :param statement: Cypher statement
+    :param parameters: dictionary of statement parameters
+
+    :return: neo4j statement result
+    """
+    if not enabled:
+        return run(statement, parameters, **kwparameters)
+    start = time.perf_counter()
+    result = run(statement, parameters, **kwparameters)
+    detach = getattr(result, "detach", None)
+    rows = detach() if detach is not None else 0
+    record("tx.run", time.perf_counter() - start, rows or 0, server_seconds(result))
+    return result
+
+
+class RecordedTransaction:
+    """
+    Neo4j transaction handed to module and model code whose run calls are recorded, see statement. Queries.run records
+    its own calls and runs them on the driver's transaction, held as inner.
+    """
+
+    def __init__(self, inner):
+        object.__setattr__(self, "inner", inner)
+
+    def run(self, statement_text, parameters=None, **kwparameters):
+        return statement(self.inner.run, statement_text, parameters, **kwparameters)
+
+    def __getattr__(self, attr):
+        return getattr(self.inner, attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.inner, attr, value)
+
+    def __enter__(self):
+        self.inner.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.inner.__exit__(exc_type, exc_value, traceback)
+
+
+class RecordedSession:
+    """
+    Neo4j session lent by Backend.session which hands out RecordedTransactions, so statements model code sends itself
+    are recorded against the current module and tick like the Interface's queries.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def write_transaction(self, unit_of_work, *args, **kwargs):
+        return self.inner.write_transaction(_recorded(unit_of_work), *args, **kwargs)
+
+    def read_transaction(self, unit_of_work, *args, **kwargs):
+        return self.inner.read_transaction(_recorded(unit_of_work), *args, **kwargs)
+
+    def begin_transaction(self, *args, **kwargs):
+        return RecordedTransaction(self.inner.begin_transaction(*args, **kwargs))
+
+    def run(self, statement_text, parameters=None, **kwparameters):
+        return statement(self.inner.run, statement_text, parameters, **kwparameters)
+
+    def __getattr__(self, attr):
+        return getattr(self.inner, attr)
+
+
+def _recorded(unit_of_work):
+    def unit(tx, *args, **kwargs):
+        return unit_of_work(RecordedTransaction(tx), *args, **kwargs)
+    return unit
+
+
+def server_seconds(result):
+    """
+    Server side time for a consumed neo4j result, from its summary.
+
+    :param result: neo4j statement result
+
+    :return: seconds, 0 if the driver does not report it
+    """
+    try:
+        summary = result.summary()
+    except AttributeError:
+        return 0.0
+    available = getattr(summary, "result_available_after", None) or 0
+    consumed = getattr(summary, "result_consumed_after", None) or 0
+    return (available + consumed) / 1000
+
+
+def summary():
+    """
+    Totals for each module and function across the run. Python time is the module's step time not spent waiting for
+    queries.
+
+    :return: list of dictionaries with "module", "function", "calls", "seconds", "server seconds", "rows" and, for the
+             module totals where function is None, "step seconds", "ticks" and "python seconds"
+    """
+    with lock:
+        callitems = list(calls.items())
+        stepitems = list(steps.items())
+    functions = {}
+    modules = {}
+    for (clock, module, function), (count, seconds, server, rows) in callitems:
+        for key, table in (((module, function), functions), (module, modules)):
+            entry = table.setdefault(key, [0, 0.0, 0.0, 0])
+            entry[0] += count
+            entry[1] += seconds
+            entry[2] += server
+            entry[3] += rows
+    stepped = {}
+    for (clock, module), (count, seconds) in stepitems:
+        entry = stepped.setdefault(module, [0, 0.0])
+        entry[0] += count
+        entry[1] += seconds
+    rows = []
+    for module in sorted(set(modules) | set(stepped), key=str):
+        count, seconds, server, returned = modules.get(module, [0, 0.0, 0.0, 0])
+        ticks, stepseconds = stepped.get(module, [0, 0.0])
+        rows.append({"module": module, "function": None, "calls": count, "seconds": seconds, "server seconds": server,
+                     "rows": returned, "step seconds": stepseconds, "ticks": ticks,
+                     "python seconds": max(0.0, stepseconds - seconds)})
+        for (mod, function), (count, seconds, server, returned) in sorted(functions.items(), key=str):
+            if mod == module:
+                rows.append({"module": module, "function": function, "calls": count, "seconds": seconds,
+                             "server seconds": server, "rows": returned})
+    return rows
+
+
+def table():
+    """
+    Summary as a text table, modules followed by their functions by time.
+
+    :return: string
+    """
+    lines = ["%-12s %-20s %8s %10s %10s %10s %10s" % ("module", "function", "calls", "query s", "server s", "rows",
+                                                     "python s")]
+    for row in summary():
+        if row["function"] is None:
+            lines.append("%-12s %-20s %8d %10.3f %10.3f %10d %10.3f" % (
+                row["module"], "(all)", row["calls"], row["seconds"], row["server seconds"], row["rows"],
+                row["python seconds"]))
+        else:
+            lines.append("%-12s %-20s %8d %10.3f %10.3f %10d" % (
+                "", row["function"], row["calls"], row["seconds"], row["server seconds"], row["rows"]))
+    return "\n".join(lines)
+
+
+def trace(path):
+    """
+    Writes everything recorded as JSON lines, one per tick, module and function with the function null for module step
+    times.
+
+    :param path: trace file name
+
+    :return: None
+    """
+    with lock:
+        callitems = sorted(calls.items(), key=lambda item: str(item[0]))
+        stepitems = sorted(steps.items(), key=lambda item: str(item[0]))
+    with open(path, "w") as f:
+        for (clock, module), (count, seconds) in stepitems:
+            f.write(json.dumps({"tick": clock, "module": module, "function": None, "passes": count,
+                                "seconds": seconds}) + "\n")
+        for (clock, module, function), (count, seconds, server, rows) in callitems:
+            f.write(json.dumps({"tick": clock, "module": module, "function": function, "calls": count,
+                                "seconds": seconds, "server seconds": server, "rows": rows}) + "\n")
+
+
+def save(runname):
+    """
+    Writes the trace for a run to <run name>.trace.jsonl in instrument_path from specification, the working directory
+    by default, and prints the summary table.
+
+    :param runname: name of the run
+
+    :return: trace file name
+    """
+    import specification
+    path = getattr(specification, "instrument_path", ".")
+    os.makedirs(path, exist_ok=True)
+    name = os.path.join(path, str(runname) + ".trace.jsonl")
+    trace(name)
+    print(table())
+    return name
@@ -1,3 +1,10 @@
+import re
+import SPmodelling.Backend as backend
+import SPmodelling.Cache as cache
+import SPmodelling.Paths as paths
+import SPmodelling.Queries as queries
+
+
 def perception(tx, agent):
     """
     Provides the local environment for the given agent
@@ -7,11 +14,9 @@ def perception(tx, agent):
 
     :return: Node the agent is located at followed by the outgoing edges of that node and those edges end nodes.
     """
-    results = tx.run("MATCH (m:Agent)-[s:LOCATED]->(n:Node) "
-                     "WITH n, m "
-                     "WHERE m.id={agent} "
-                     "MATCH (n)-[r:REACHES]->(a) "
-                     "RETURN n, r, a", agent=agent).values()
+    if backend.inmemory(tx):
+        return tx.graph.perception(agent)
+    results = queries.run(tx, "perception", agent=agent)
     if results:
         node = results[0][0]
         edges = [edge[1] for edge in results]
@@ -19,6 +24,32 @@ def perception(tx, agent):
     return results
 
 
+def nodeperception(tx, nodeid, uid="name", clock=None):
+    """
+    Provides the local environment of a node, shared by every agent located there. When the current time is given the
+    result is cached for that tick so the node is read once per tick however many agents it holds.
+
+    :param tx: read or write transaction for neo4j database
+    :param nodeid: id of the node
+    :param uid: type of id node uses
+    :param clock: current time, None to bypass the cache
+
+    :return: Node followed by its outgoing edges, a new list which callers may modify
+    """
+    if clock is not None:
+        view = cache.perceptions.get(uid, nodeid, clock)
+        if view is not None:
+            return list(view)
+    if backend.inmemory(tx):
+        view = tx.graph.nodeperception(nodeid, uid)
+    else:
+        results = queries.run(tx, "nodeperception", {"uid": uid}, id=nodeid)
+        view = [results[0][0]] + [res[1] for res in results] if results else []
+    if clock is not None and view:
+        cache.perceptions.put(uid, nodeid, clock, view)
+    return list(view)
+
+
 def locateagent(tx, agent):
     """
     Finds which node the given agent is currently located at.
@@ -28,9 +59,9 @@ def locateagent(tx, agent):
 
     :return: Node the agent is currently located at
     """
-    results = tx.run("MATCH (m:Agent)-[s:LOCATED]->(n:Node) "
-                     "WHERE m.id={agent} "
-                     "RETURN n", agent=agent).values()
+    if backend.inmemory(tx):
+        return tx.graph.locateagent(agent)
+    results = queries.run(tx, "locateagent", agent=agent)
     return results[0][0]
 
 
@@ -48,14 +79,11 @@ def updatecontactedge(tx, node_a, node_b, attribute, value, label_a=None, label_
 
     :return: None
     """
-    query = "MATCH (a"
-    if label_a:
-        query = query + ":" + label_a
-    query = query + ")-[r:SOCIAL]->(b"
-    if label_b:
-        query = query + ":" + label_b
-    query = query + ") WHERE a.id={node_a} and b.id={node_b} SET r." + attribute + "={value} "
-    tx.run(query, node_a=node_a, node_b=node_b, value=value)
+    cache.neighbourhoods.invalidate(node_a)
+    if backend.inmemory(tx):
+        return tx.graph.updatecontactedge(node_a, node_b, attribute, value, label_a, label_b)
+    queries.run(tx, "updatecontactedge", {"label_a": _label(label_a), "label_b": _label(label_b),
+                                          "attribute": attribute}, node_a=node_a, node_b=node_b, value=value)
 
 
 def deletecontact(tx, node_a, node_b, label_a, label_b, contact_type='SOCIAL'):
@@ -70,12 +98,17 @@ def deletecontact(tx, node_a, node_b, label_a, label_b, contact_type='SOCIAL'):
 
     :return: None
     """
-    query = "MATCH (a:" + label_a + ")-[r"
-    if contact_type:
-        query = query + ":" + contact_type
-    query = query + "]->(b:" + label_b + ") WHERE a.id=" + str(node_a) + " and b.id=" + str(node_b)
-    query = query + " DELETE r RETURN COUNT(r)"
-    tx.run(query)
+    if "Node" in (label_a, label_b):
+        cache.perceptions.clear()
+    cache.neighbourhoods.invalidate(node_a)
+    if backend.inmemory(tx):
+        for edgetype in tx.graph.deletecontact(node_a, node_b, label_a, label_b, contact_type):
+            paths.service.edgeremoved(node_a, node_b, label_a, label_b, edgetype)
+        return
+    removed = queries.run(tx, "deletecontact", {"label_a": _label(label_a), "label_b": _label(label_b),
+                                                "contact_type": _label(contact_type)}, node_a=node_a, node_b=node_b)
+    if removed and removed[0][0]:
+        paths.service.invalidate(label_a, label_b, contact_type)
 
 
 def agentcontacts(tx, node_a, label, contact_label=None):
@@ -89,13 +122,15 @@ def agentcontacts(tx, node_a, label, contact_label=None):
 
     :return: relationships and end nodes
     """
-    if contact_label:
-        contact_label = ": " + contact_label
-    else:
-        contact_label = ": " + label
-    results = tx.run("MATCH (a:" + label + ")-[r:SOCIAL]->(b" + contact_label + ") "
-                                                                                "WHERE a.id={node_a} "
-                                                                                "RETURN r, b", node_a=node_a).values()
+    if not contact_label:
+        contact_label = label
+    contacts = cache.neighbourhoods.contacts(node_a, label, contact_label, lambda: socialedges(tx))
+    if contacts is not None:
+        return contacts
+    if backend.inmemory(tx):
+        return tx.graph.agentcontacts(node_a, label, contact_label)
+    results = queries.run(tx, "agentcontacts", {"label": _label(label), "contact_label": _label(contact_label)},
+                          node_a=node_a)
     return [res[0] for res in results]
 
 
@@ -108,15 +143,43 @@ def colocated(tx, agent):
 
     :return: List of co-located agents
     """
-    results = tx.run("MATCH (m:Agent)-[s:LOCATED]->(n:Node) "
-                     "WITH n "
-                     "WHERE m.id={agent} "
-                     "MATCH (a:Agent)-[s:LOCATED]->(n:Node) "
-                     "RETURN a", agent=agent).values()
+    agents = cache.neighbourhoods.colocated(agent, lambda: locations(tx))
+    if agents is not None:
+        return agents
+    if backend.inmemory(tx):
+        return tx.graph.colocated(agent)
+    results = queries.run(tx, "colocated", agent=agent)
     results = [res[0] for res in results]
     return results
 
 
+def socialedges(tx):
+    """
+    Every SOCIAL edge in the system, read in one query to fill the neighbourhood cache.
+
+    :param tx: neo4j read or write transaction
+
+    :return: list of (source node id, source labels, end node id, end node labels, relationship)
+    """
+    if backend.inmemory(tx):
+        return tx.graph.socialedges()
+    # the end node is returned as well so the driver fills in the properties of the relationship's end node
+    return [(res[0], res[1], res[2], res[3], res[4]) for res in queries.run(tx, "socialedges")]
+
+
+def locations(tx):
+    """
+    The node every agent is located at, read in one query to fill the neighbourhood cache.
+
+    :param tx: neo4j read or write transaction
+
+    :return: list of (node key, agent node)
+    """
+    if backend.inmemory(tx):
+        return tx.graph.locations()
+    return [tuple(res) for res in queries.run(tx, "locations")]
+
+
 def getnode(tx, nodeid, label=None, uid=None):
     """
     Returns the details of a given node
@@ -128,17 +191,11 @@ def getnode(tx, nodeid, label=None, uid=None):
 
     :return: Node object
     """
+    if backend.inmemory(tx):
+        return tx.graph.getnode(nodeid, label, uid)
     if not uid:
         uid = "id"
-    if label == "Agent":
-        query = "MATCH (n:Agent) ""WHERE n." + uid + " = {id} ""RETURN n"
-        results = tx.run(query, id=nodeid, lab=label).values()
-    elif label:
-        query = "MATCH (n:" + label + ") ""WHERE n." + uid + " = {id} ""RETURN n"
-        results = tx.run(query, id=nodeid).values()
-    else:
-        query = "MATCH (n) ""WHERE n." + uid + " = {id} ""RETURN n"
-        results = tx.run(query, id=nodeid).values()
+    results = queries.run(tx, "getnode", {"label": _label(label), "uid": uid}, id=nodeid)
     node = results[0][0]
     return node
 
@@ -153,8 +210,9 @@ def getnodeagents(tx, nodeid, uid="name"):
 
     :return: List of agents at node
     """
-    query = "MATCH (a)-[r:LOCATED]->(n) ""WHERE n." + uid + " ={id} ""RETURN a"
-    results = tx.run(query, id=nodeid).values()
+    if backend.inmemory(tx):
+        return tx.graph.getnodeagents(nodeid, uid)
+    results = queries.run(tx, "getnodeagents", {"uid": uid}, id=nodeid)
     results = [res[0] for res in results]
     return results
 
@@ -171,14 +229,14 @@ def getnodevalue(tx, node, value, label=None, uid=None):
 
     :return: value of attribute asked for
     """
+    if backend.inmemory(tx):
+        return tx.graph.getnodevalue(node, value, label, uid)
     if not uid:
         uid = "id"
-    if label:
-        query = "MATCH (a:" + label + ") ""WHERE a." + uid + "=" + str(node) + " ""RETURN a." + value
-    else:
-        query = "MATCH (a:Node) ""WHERE a." + uid + "=" + str(node) + " ""RETURN a." + value
-    results = tx.run(query, node=node).value()
-    return results[0]
+    if not label:
+        label = "Node"
+    results = queries.run(tx, "getnodevalue", {"label": _label(label), "uid": uid, "value": value}, node=node)
+    return results[0][0]
 
 
 def getrunname(tx):
@@ -189,8 +247,9 @@ def getrunname(tx):
 
     :return: run name string
     """
-    query = "MATCH (a:Tag) ""RETURN a.tag"
-    return tx.run(query).value()[0]
+    if backend.inmemory(tx):
+        return tx.graph.getrunname()
+    return queries.run(tx, "getrunname")[0][0]
 
 
 def gettime(tx):
@@ -201,21 +260,23 @@ def gettime(tx):
 
     :return: Current time on clock
     """
-    query = "MATCH (a:Clock) ""RETURN a.time"
-    return tx.run(query).value()[0]
+    if backend.inmemory(tx):
+        return tx.graph.gettime()
+    return queries.run(tx, "gettime")[0][0]
 
 
 def tick(tx):
     """
-    Increment the clock in the database
+    Increment the clock in the database. Use Clock.tick to also wake modules waiting on the clock once the new time is
+    committed.
 
     :param tx: neo4j write transaction
 
     :return: New time
     """
-    time = 1 + gettime(tx)
-    query = "MATCH (a:Clock) ""SET a.time={time} "
-    return tx.run(query, time=time)
+    if backend.inmemory(tx):
+        return tx.graph.tick()
+    return queries.run(tx, "tick")[0][0]
 
 
 def shortestpath(tx, node_a, node_b, node_label, edge_label, directed=False):
@@ -229,17 +290,27 @@ def shortestpath(tx, node_a, node_b, node_label, edge_label, directed=False):
     :param edge_label: label for the type of relationships to use in path
     :param directed: whether to consider direction of path in calculations
 
-    :return: Length of shortest path between two nodes
+    :return: Length of shortest path between two nodes as a number of edges, None if there is no path. Lengths are
+             integers, the graph algorithms plugin query this replaced returned its float totalCost.
     """
-    if directed:
-        directionality = 'OUTGOING'
-    else:
-        directionality = 'BOTH'
-    query = "MATCH (a) WHERE a.id=" + str(node_a) + " WITH a MATCH (b) WHERE b.id=" + str(node_b) + " WITH a, b "
-    query = query + "CALL algo.shortestPath(a, b,null, {relationshipQuery:'" + edge_label
-    query = query + "', direction: '" + directionality + "'}) YIELD totalCost RETURN totalCost"
-    sp = tx.run(query).values()[0]
-    return sp[0]
+    return paths.service.distance(node_a, node_b, node_label, edge_label, directed,
+                                  lambda: adjacency(tx, node_label, edge_label))
+
+
+def adjacency(tx, node_label, edge_label):
+    """
+    Every edge of a type between nodes with a label, read in one query for the shortest path service.
+
+    :param tx: neo4j read or write transaction
+    :param node_label: label of the nodes at both ends, None for any
+    :param edge_label: type of relationship
+
+    :return: list of (start node id, end node id)
+    """
+    if backend.inmemory(tx):
+        return tx.graph.adjacency(node_label, edge_label)
+    results = queries.run(tx, "adjacency", {"node_label": _label(node_label), "edge_label": _label(edge_label)})
+    return [(res[0], res[1]) for res in results]
 
 
 def updateedge(tx, edge, attr, value, uid=None):
@@ -254,13 +325,14 @@ def updateedge(tx, edge, attr, value, uid=None):
 
     :return: None
     """
+    cache.perceptions.invalidate(uid or "id", edge.start_node[uid or "id"])
+    if backend.inmemory(tx):
+        return tx.graph.updateedge(edge, attr, value, uid)
     if not uid:
         uid = "id"
     start = edge.start_node
     end = edge.end_node
-    query = "MATCH (a:Node)-[r:REACHES]->(b:Node) ""WHERE a." + uid + "={start} AND b." + uid + \
-            "={end} ""SET r." + attr + "={val}"
-    tx.run(query, start=start[uid], end=end[uid], val=value)
+    queries.run(tx, "updateedge", {"uid": uid, "attr": attr}, start=start[uid], end=end[uid], val=value)
 
 
 def updatenode(tx, node, attr, value, uid=None, label=None):
@@ -276,12 +348,15 @@ def updatenode(tx, node, attr, value, uid=None, label=None):
 
     :return: None
     """
+    if label in (None, "Node"):
+        cache.perceptions.invalidate(uid or "id", node)
+    if backend.inmemory(tx):
+        return tx.graph.updatenode(node, attr, value, uid, label)
     if not uid:
         uid = "id"
     if not label:
         label = "Node"
-    query = "MATCH (a:" + label + ") ""WHERE a." + uid + "={node} ""SET a." + attr + "={value}"
-    tx.run(query, node=node, value=value)
+    queries.run(tx, "updatenode", {"label": _label(label), "uid": uid, "attr": attr}, node=node, value=value)
 
 
 def updateagent(tx, node, attr, value, uid=None):
@@ -296,10 +371,11 @@ def updateagent(tx, node, attr, value, uid=None):
 
     :return: None
     """
+    if backend.inmemory(tx):
+        return tx.graph.updateagent(node, attr, value, uid)
     if not uid:
         uid = "id"
-    query = "MATCH (a:Agent) ""WHERE a." + uid + "={node} ""SET a." + attr + "={value}"
-    tx.run(query, node=node, value=value)
+    queries.run(tx, "updateagent", {"uid": uid, "attr": attr}, node=node, value=value)
 
 
 def deleteagent(tx, agent, uid=None):
@@ -314,8 +390,19 @@ def deleteagent(tx, agent, uid=None):
     """
     if not uid:
         uid = "id"
-    tx.run("MATCH (n:Agent)-[r:LOCATED]->() ""WHERE n." + uid + "={ID} ""DELETE r", ID=agent[uid])
-    tx.run("MATCH (n:Agent) ""WHERE n." + uid + "={ID} ""DELETE n", ID=agent[uid])
+    if "id" in agent:
+        cache.neighbourhoods.removeagent(agent["id"])
+    else:
+        cache.neighbourhoods.invalidate()
+    if backend.inmemory(tx):
+        tx.graph.deleteagent(agent, uid)
+        if "id" in agent:
+            paths.service.noderemoved(agent["id"], "Agent")
+        else:
+            paths.service.invalidate("Agent", "Agent", None)
+        return
+    queries.run(tx, "deleteagent", {"uid": uid}, ID=agent[uid])
+    paths.service.invalidate("Agent", "Agent", None)
 
 
 def addagent(tx, node, label, params, uid=None):
@@ -330,19 +417,66 @@ def addagent(tx, node, label, params, uid=None):
 
     :return: None
     """
+    cache.neighbourhoods.invalidatelocations()
+    if backend.inmemory(tx):
+        return tx.graph.addagent(node, label, params, uid)
     if not uid:
         uid = "id"
-    query = "MATCH (n: " + label + ") ""WITH n ""ORDER BY n.id DESC ""RETURN n.id"
-    highest_id = tx.run(query).values()
-    if highest_id:
-        agent_id = highest_id[0][0] + 1
+    agent = dict(params)
+    agent["id"] = nextids(tx, label)
+    queries.run(tx, "addagent", {"uid": uid, "label": _label(label)}, node=node[uid], params=agent)
+
+
+def addagents(tx, node, label, params, uid=None):
+    """
+    Insert many new agents at a node in a single query
+
+    :param tx: neo4j write transaction
+    :param node: node to locate agents at
+    :param label: label of agent nodes
+    :param params: list of dictionaries of agent parameters, one per agent
+    :param uid: type of id used by node
+
+    :return: List of new agent ids
+    """
+    if not uid:
+        uid = "id"
+    if not params:
+        return []
+    cache.neighbourhoods.invalidatelocations()
+    first = nextids(tx, label, len(params))
+    agents = []
+    for offset, agent in enumerate(params):
+        agent = dict(agent)
+        agent["id"] = first + offset
+        agents.append(agent)
+    if backend.inmemory(tx):
+        tx.graph.addagents(node, label, agents, uid)
     else:
-        agent_id = 0
-    query = "CREATE (a:" + label + " {id:" + str(agent_id)
-    for param in params:
-        query = query + ", " + param + ":" + str(params[param])
-    query = query + "})-[r:LOCATED]->(n)"
-    tx.run("MATCH (n:Node) ""WHERE n." + uid + "= '" + node[uid] + "' " + query)
+        queries.run(tx, "addagents", {"uid": uid, "label": _label(label)}, node=node[uid], agents=agents)
+    return [agent["id"] for agent in agents]
+
+
+def nextids(tx, label, count=1):
+    """
+    Allocate ids for new agents from a counter kept in a Sequence node, so no scan of existing agents is needed. The
+    counter starts after the highest id already in use the first time a label is allocated. The Sequence node is
+    merged on its label, which Reset gives a uniqueness constraint, so concurrent first allocations share one counter.
+
+    :param tx: neo4j write transaction
+    :param label: label of agent nodes
+    :param count: number of ids to allocate
+
+    :return: first id of the allocated block, the rest follow consecutively
+    """
+    if backend.inmemory(tx):
+        return tx.graph.nextids(label, count)
+    allocated = queries.run(tx, "nextids", label=label, count=count)
+    if allocated:
+        return allocated[0][0]
+    highest = queries.run(tx, "highestid", {"label": _label(label)})
+    first = highest[0][0] + 1 if highest and highest[0][0] is not None else 0
+    return queries.run(tx, "createsequence", label=label, first=first, count=count)[0][0]
 
 
 def createedge(tx, node_a, node_b, label_a, label_b, edge_label, parameters=None):
@@ -354,16 +488,351 @@ def createedge(tx, node_a, node_b, label_a, label_b, edge_label, parameters=None
     :param label_a: source node label
     :param label_b: target node label
     :param edge_label: label of new edge
-    :param parameters: parameters of new edge
+    :param parameters: parameters of new edge, a dictionary or a Cypher map body of literal values such as
+                       "weight: 1, tags: [1, 2]"
+
+    :return: None
+    """
+    if "Node" in (label_a, label_b):
+        cache.perceptions.clear()
+    cache.neighbourhoods.invalidate(node_a)
+    if backend.inmemory(tx):
+        for i in range(tx.graph.createedge(node_a, node_b, label_a, label_b, edge_label, _properties(parameters))):
+            paths.service.edgeadded(node_a, node_b, label_a, label_b, edge_label)
+        return
+    created = queries.run(tx, "createedge", {"label_a": _label(label_a), "label_b": _label(label_b),
+                                             "edge_label": _label(edge_label)},
+                          node_a=node_a, node_b=node_b, parameters=_properties(parameters) or {})
+    if created and created[0][0]:
+        paths.service.invalidate(label_a, label_b, edge_label)
+
+
+def moveagent(tx, agent, new, nuid=None):
+    """
+    Relocate an agent by replacing its LOCATED edge.
+
+    :param tx: neo4j write transaction
+    :param agent: agent id
+    :param new: id of the node to move the agent to
+    :param nuid: type of id used by the node
+
+    :return: None
+    """
+    if not nuid:
+        nuid = "id"
+    cache.neighbourhoods.invalidatelocations()
+    if backend.inmemory(tx):
+        return tx.graph.moveagent(agent, new, nuid)
+    queries.run(tx, "moveagent", {"nuid": nuid}, id=agent, new=new)
+
+
+def moveagents(tx, moves, nuid=None):
+    """
+    Relocate many agents in a single query.
+
+    :param tx: neo4j write transaction
+    :param moves: list of dictionaries with the agent "id" and the "new" node id
+    :param nuid: type of id used by the nodes
+
+    :return: None
+    """
+    if not nuid:
+        nuid = "id"
+    cache.neighbourhoods.invalidatelocations()
+    if backend.inmemory(tx):
+        return tx.graph.moveagents(moves, nuid)
+    queries.run(tx, "moveagents", {"nuid": nuid}, moves=moves)
+
+
+def agentids(tx, label="Agent"):
+    """
+    Ids of all agents in the system
+
+    :param tx: neo4j read or write transaction
+    :param label: label of agent nodes
+
+    :return: List of agent ids
+    """
+    if backend.inmemory(tx):
+        return tx.graph.agentids(label)
+    return [res[0] for res in queries.run(tx, "agentids", {"label": _label(label)})]
+
+
+def addnode(tx, label, params):
+    """
+    Insert a node with the given label and attributes, used for environment nodes and the Clock and Tag nodes.
+
+    :param tx: neo4j write transaction
+    :param label: label of node
+    :param params: dictionary of node attributes
+
+    :return: None
+    """
+    if backend.inmemory(tx):
+        return tx.graph.addnode(label, params)
+    queries.run(tx, "addnode", {"label": _label(label)}, params=params)
+
+
+def cleardatabase(tx):
+    """
+    Remove all nodes and relationships
+
+    :param tx: neo4j write transaction
+
+    :return: None
+    """
+    cache.perceptions.clear()
+    cache.neighbourhoods.invalidate()
+    paths.service.clear()
+    if backend.inmemory(tx):
+        return tx.graph.cleardatabase()
+    queries.run(tx, "cleardatabase")
+
+
+def clearchunk(tx, batch_size):
+    """
+    Remove up to batch_size relationships from the database, or once none are left up to batch_size nodes. Deleting
+    the relationships first bounds the work of each call, as deleting a node also deletes all of its relationships.
+
+    :param tx: neo4j write transaction
+    :param batch_size: maximum number of relationships or nodes to delete
+
+    :return: number of relationships or nodes deleted, 0 once the database is empty
+    """
+    cache.perceptions.clear()
+    cache.neighbourhoods.invalidate()
+    paths.service.clear()
+    if backend.inmemory(tx):
+        return tx.graph.clearchunk(batch_size)
+    deleted = queries.run(tx, "clearedgechunk", batch=batch_size)[0][0]
+    if deleted:
+        return deleted
+    return queries.run(tx, "clearchunk", batch=batch_size)[0][0]
+
+
+def createindex(tx, label, attr, unique=False):
+    """
+    Create an index, or a uniqueness constraint, on an attribute of nodes with the given label. Must run in its own
+    transaction on neo4j as schema changes cannot be mixed with data changes.
+
+    :param tx: neo4j write transaction
+    :param label: node label
+    :param attr: attribute to index
+    :param unique: create a uniqueness constraint, which is backed by an index
 
     :return: None
     """
-    query = "MATCH (a:" + label_a + ") WHERE a.id=" + str(node_a) + " WITH a MATCH (b:" + label_b + ") " \
-                                                                                                    "WHERE b.id=" + str(
-        node_b) + " " \
-                  "WITH a, b " \
-                  "CREATE (a)-[n:" + edge_label
-    if parameters:
-        query = query + " {" + str(parameters) + "}"
-    query = query + "]->(b) "
-    tx.run(query)
+    if backend.inmemory(tx):
+        return tx.graph.createindex(label, attr, unique)
+    if unique:
+        queries.run(tx, "createconstraint", {"label": _label(label), "attr": attr})
+    else:
+        queries.run(tx, "createindex", {"label": _label(label), "attr": attr})
+
+
+def indexes(tx):
+    """
+    Lists the indexed node lookups
+
+    :param tx: neo4j read transaction
+
+    :return: List of (label, attribute) pairs with an index
+    """
+    if backend.inmemory(tx):
+        return tx.graph.listindexes()
+    results = queries.run(tx, "indexes")
+    return [(label, attr) for labels, attrs in results for label in labels for attr in attrs]
+
+
+def graphnodes(tx):
+    """
+    Every node in the database, used to write checkpoints.
+
+    :param tx: neo4j read transaction
+
+    :return: List of (internal id, labels, properties)
+    """
+    if backend.inmemory(tx):
+        return tx.graph.graphnodes()
+    return [tuple(res) for res in queries.run(tx, "graphnodes")]
+
+
+def graphedges(tx):
+    """
+    Every relationship in the database, used to write checkpoints.
+
+    :param tx: neo4j read transaction
+
+    :return: List of (start node internal id, end node internal id, type, properties)
+    """
+    if backend.inmemory(tx):
+        return tx.graph.graphedges()
+    return [tuple(res) for res in queries.run(tx, "graphedges")]
+
+
+def graphsnapshot(tx):
+    """
+    The clock time with every node and relationship in the database read together, used to write checkpoints.
+    Relationships whose end nodes were created after the nodes were read are left out so the snapshot can always be
+    restored.
+
+    :param tx: neo4j read transaction
+
+    :return: (time, nodes as returned by graphnodes, relationships as returned by graphedges)
+    """
+    if backend.inmemory(tx):
+        return tx.graph.graphsnapshot()
+    time = gettime(tx)
+    nodes = graphnodes(tx)
+    keys = {node[0] for node in nodes}
+    edges = [edge for edge in graphedges(tx) if edge[0] in keys and edge[1] in keys]
+    return time, nodes, edges
+
+
+def restorenodes(tx, nodes):
+    """
+    Recreates checkpointed nodes. Each is marked with the id it had when the checkpoint was written until finishrestore
+    is called, so restoreedges can connect them.
+
+    :param tx: neo4j write transaction
+    :param nodes: List of (internal id, labels, properties) as returned by graphnodes
+
+    :return: None
+    """
+    if backend.inmemory(tx):
+        return tx.graph.restorenodes(nodes)
+    groups = {}
+    for key, labels, properties in nodes:
+        groups.setdefault(tuple(sorted(labels)), []).append({"key": key, "properties": properties})
+    for labels, group in groups.items():
+        queries.run(tx, "restorenodes", {"labels": "".join(_label(label) for label in labels)}, nodes=group)
+
+
+def restoreedges(tx, edges):
+    """
+    Recreates checkpointed relationships between nodes added by restorenodes.
+
+    :param tx: neo4j write transaction
+    :param edges: List of (start id, end id, type, properties) as returned by graphedges
+
+    :return: None
+    """
+    if backend.inmemory(tx):
+        return tx.graph.restoreedges(edges)
+    groups = {}
+    for start, end, edgetype, properties in edges:
+        groups.setdefault(edgetype, []).append({"start": start, "end": end, "properties": properties})
+    for edgetype, group in groups.items():
+        queries.run(tx, "restoreedges", {"type": _label(edgetype)}, edges=group)
+
+
+def finishrestore(tx):
+    """
+    Removes the markers left on nodes by restorenodes.
+
+    :param tx: neo4j write transaction
+
+    :return: None
+    """
+    cache.perceptions.clear()
+    cache.neighbourhoods.invalidate()
+    paths.service.clear()
+    if backend.inmemory(tx):
+        return tx.graph.finishrestore()
+    queries.run(tx, "finishrestore")
+
+
+def _properties(parameters):
+    """
+    Converts edge parameters given as a Cypher map body, eg. "weight: 1, kind: 'friend', tags: [1, 2]", into a
+    dictionary. Dictionaries are returned unchanged. Values must be literals: numbers, strings, booleans, null, lists
+    and maps.
+    """
+    if not parameters or isinstance(parameters, dict):
+        return parameters
+    text = str(parameters).strip()
+    if not text.startswith("{"):
+        text = "{" + text + "}"
+    try:
+        properties, end = _literal(text, 0)
+        if _skip(text, end) != len(text):
+            raise ValueError("unexpected " + repr(text[end:]))
+    except (ValueError, IndexError) as error:
+        raise ValueError("Edge parameters must be a dictionary or a Cypher map of literal values, could not read " +
+                         repr(parameters) + ": " + str(error))
+    return properties
+
+
+_token = re.compile(r"-?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?|[A-Za-z_][A-Za-z0-9_]*|`[^`]*`")
+_escapes = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+
+def _skip(text, i):
+    """
+    Index of the next non-space character in text from i.
+    """
+    while i < len(text) and text[i].isspace():
+        i = i + 1
+    return i
+
+
+def _literal(text, i):
+    """
+    Reads the Cypher literal starting at or after i.
+
+    :return: (value, index after the literal)
+    """
+    i = _skip(text, i)
+    if text[i] in "{[":
+        close = "}" if text[i] == "{" else "]"
+        items = {} if close == "}" else []
+        i = _skip(text, i + 1)
+        while text[i] != close:
+            if close == "}":
+                match = _token.match(text, i)
+                if not match or match.group().lstrip("-")[:1].isdigit():
+                    raise ValueError("expected a key at " + repr(text[i:]))
+                i = _skip(text, match.end())
+                if text[i] != ":":
+                    raise ValueError("expected ':' at " + repr(text[i:]))
+                items[match.group().strip("`")], i = _literal(text, i + 1)
+            else:
+                value, i = _literal(text, i)
+                items.append(value)
+            i = _skip(text, i)
+            if text[i] == ",":
+                i = _skip(text, i + 1)
+            elif text[i] != close:
+                raise ValueError("expected ',' or '" + close + "' at " + repr(text[i:]))
+        return items, i + 1
+    if text[i] in "'\"":
+        quote = text[i]
+        chars = []
+        i = i + 1
+        while text[i] != quote:
+            if text[i] == "\\":
+                i = i + 1
+                chars.append(_escapes.get(text[i], text[i]))
+            else:
+                chars.append(text[i])
+            i = i + 1
+        return "".join(chars), i + 1
+    match = _token.match(text, i)
+    if not match:
+        raise ValueError("expected a value at " + repr(text[i:]))
+    word = match.group()
+    if word[:1] in "-.0123456789":
+        number = float(word) if any(c in word for c in ".eE") else int(word)
+        return number, match.end()
+    if word.lower() in ("true", "false", "null"):
+        return {"true": True, "false": False, "null": None}[word.lower()], match.end()
+    raise ValueError("expected a value at " + repr(text[i:]))
+
+
+def _label(label):
+    """
+    Label or relationship type as written in a pattern, empty when no label is given.
+    """
+    if label:
+        return ":" + label
+    return ""
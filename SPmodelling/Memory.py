@@ -0,0 +1,559 @@
+import threading
+from itertools import islice
+from functools import wraps
+import SPmodelling.Instrument as instrument
+
+
+def _locked(func):
+    """
+    Run a graph method while holding the graph lock, so each Interface call is atomic with respect to other modules
+    sharing the store.
+    """
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            if instrument.enabled:
+                return instrument.call(func.__name__, func, self, *args, **kwargs)
+            return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+class GraphNode:
+    """
+    Node held in a MemoryGraph. Mirrors the parts of the neo4j Node object used by the framework: item access to
+    properties, keys and labels.
+    """
+
+    def __init__(self, nodeid, labels, properties):
+        self.id = nodeid
+        self.labels = frozenset(labels)
+        self._properties = dict(properties)
+
+    def __getitem__(self, key):
+        return self._properties[key]
+
+    def __contains__(self, key):
+        return key in self._properties
+
+    def __iter__(self):
+        return iter(self._properties)
+
+    def get(self, key, default=None):
+        return self._properties.get(key, default)
+
+    def keys(self):
+        return self._properties.keys()
+
+    def values(self):
+        return self._properties.values()
+
+    def items(self):
+        return self._properties.items()
+
+    def __repr__(self):
+        return "<GraphNode id=%r labels=%r properties=%r>" % (self.id, set(self.labels), self._properties)
+
+
+class GraphEdge:
+    """
+    Relationship held in a MemoryGraph. Mirrors the parts of the neo4j Relationship object used by the framework:
+    start_node, end_node, type and item access to properties.
+    """
+
+    def __init__(self, edgeid, start_node, end_node, edgetype, properties):
+        self.id = edgeid
+        self.start_node = start_node
+        self.end_node = end_node
+        self.type = edgetype
+        self._properties = dict(properties)
+
+    def __getitem__(self, key):
+        return self._properties[key]
+
+    def __setitem__(self, key, value):
+        self._properties[key] = value
+
+    def __contains__(self, key):
+        return key in self._properties
+
+    def __iter__(self):
+        return iter(self._properties)
+
+    def get(self, key, default=None):
+        return self._properties.get(key, default)
+
+    def keys(self):
+        return self._properties.keys()
+
+    def values(self):
+        return self._properties.values()
+
+    def items(self):
+        return self._properties.items()
+
+    def __repr__(self):
+        return "<GraphEdge id=%r type=%r properties=%r>" % (self.id, self.type, self._properties)
+
+
+class MemoryGraph:
+    """
+    In-process graph store. Nodes and edges are held in dictionaries keyed by internal id, with adjacency held per node
+    and relationship type and property lookups served from (label, attribute) indexes built on first use. Methods
+    share their names and arguments with the functions in SPmodelling.Interface, which dispatches to them when given a
+    MemoryTransaction.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """
+        Remove every node, edge and index from the store.
+        """
+        self.nodes = {}
+        self.edges = {}
+        self.labels = {}
+        self.outgoing = {}
+        self.incoming = {}
+        self.indexes = {}
+        self.sequences = {}
+        self.restoring = {}
+        self.nextnode = 0
+        self.nextedge = 0
+
+    # Storage primitives
+
+    def _index(self, label, attr):
+        """
+        Returns the value index for a label and attribute, building it from the label set on first use.
+        """
+        key = (label, attr)
+        index = self.indexes.get(key)
+        if index is None:
+            index = {}
+            for nid in self.labels.get(label, ()):
+                node = self.nodes[nid]
+                if attr in node:
+                    index.setdefault(node[attr], {})[nid] = node
+            self.indexes[key] = index
+        return index
+
+    def _unindex(self, node, attrs=None):
+        for label in node.labels:
+            for attr in (attrs if attrs is not None else node.keys()):
+                index = self.indexes.get((label, attr))
+                if index is not None and attr in node:
+                    bucket = index.get(node[attr])
+                    if bucket:
+                        bucket.pop(node.id, None)
+                        if not bucket:
+                            del index[node[attr]]
+
+    def _reindex(self, node, attrs=None):
+        for label in node.labels:
+            for attr in (attrs if attrs is not None else node.keys()):
+                index = self.indexes.get((label, attr))
+                if index is not None and attr in node:
+                    index.setdefault(node[attr], {})[node.id] = node
+
+    def find(self, label, attr, value):
+        """
+        All nodes with the given label (any label if None) whose attribute equals value.
+        """
+        if label:
+            return list(self._index(label, attr).get(value, {}).values())
+        return [node for node in self.nodes.values() if attr in node and node[attr] == value]
+
+    def first(self, label, attr, value):
+        found = self.find(label, attr, value)
+        return found[0] if found else None
+
+    def labelled(self, label):
+        return [self.nodes[nid] for nid in self.labels.get(label, ())]
+
+    def createnode(self, labels, properties):
+        if isinstance(labels, str):
+            labels = [labels]
+        node = GraphNode(self.nextnode, labels, properties)
+        self.nextnode = self.nextnode + 1
+        self.nodes[node.id] = node
+        self.outgoing[node.id] = {}
+        self.incoming[node.id] = {}
+        for label in node.labels:
+            self.labels.setdefault(label, {})[node.id] = None
+        self._reindex(node)
+        return node
+
+    def setproperty(self, node, attr, value):
+        self._unindex(node, [attr])
+        node._properties[attr] = value
+        self._reindex(node, [attr])
+
+    def removenode(self, node):
+        for edge in list(self.edgesof(node)):
+            self.removeedge(edge)
+        self._unindex(node)
+        for label in node.labels:
+            self.labels[label].pop(node.id, None)
+        del self.outgoing[node.id]
+        del self.incoming[node.id]
+        del self.nodes[node.id]
+
+    def createrelationship(self, start, end, edgetype, properties=None):
+        edge = GraphEdge(self.nextedge, start, end, edgetype, properties or {})
+        self.nextedge = self.nextedge + 1
+        self.edges[edge.id] = edge
+        self.outgoing[start.id].setdefault(edgetype, {})[edge.id] = edge
+        self.incoming[end.id].setdefault(edgetype, {})[edge.id] = edge
+        return edge
+
+    def removeedge(self, edge):
+        self.outgoing[edge.start_node.id][edge.type].pop(edge.id, None)
+        self.incoming[edge.end_node.id][edge.type].pop(edge.id, None)
+        del self.edges[edge.id]
+
+    def out(self, node, edgetype=None):
+        if edgetype:
+            return list(self.outgoing[node.id].get(edgetype, {}).values())
+        return [edge for edges in self.outgoing[node.id].values() for edge in edges.values()]
+
+    def into(self, node, edgetype=None):
+        if edgetype:
+            return list(self.incoming[node.id].get(edgetype, {}).values())
+        return [edge for edges in self.incoming[node.id].values() for edge in edges.values()]
+
+    def edgesof(self, node):
+        return self.out(node) + self.into(node)
+
+    def location(self, agent):
+        """
+        Node the agent node is LOCATED at, or None.
+        """
+        located = self.out(agent, "LOCATED")
+        return located[0].end_node if located else None
+
+    # Interface operations
+
+    @_locked
+    def perception(self, agent):
+        ag = self.first("Agent", "id", agent)
+        node = self.location(ag) if ag else None
+        if node is None:
+            return []
+        edges = self.out(node, "REACHES")
+        return [node] + edges if edges else []
+
+    @_locked
+    def nodeperception(self, nodeid, uid="name"):
+        node = self.first("Node", uid, nodeid)
+        edges = self.out(node, "REACHES") if node else []
+        return [node] + edges if edges else []
+
+    @_locked
+    def locateagent(self, agent):
+        return self.location(self.first("Agent", "id", agent))
+
+    @_locked
+    def updatecontactedge(self, node_a, node_b, attribute, value, label_a=None, label_b=None):
+        for edge in self._contacts(node_a, node_b, label_a, label_b, "SOCIAL"):
+            edge[attribute] = value
+
+    @_locked
+    def deletecontact(self, node_a, node_b, label_a, label_b, contact_type='SOCIAL'):
+        edges = self._contacts(node_a, node_b, label_a, label_b, contact_type)
+        for edge in edges:
+            self.removeedge(edge)
+        return [edge.type for edge in edges]
+
+    def _contacts(self, node_a, node_b, label_a, label_b, contact_type):
+        return [edge for start in self.find(label_a, "id", node_a) for edge in self.out(start, contact_type)
+                if edge.end_node.get("id") == node_b and (not label_b or label_b in edge.end_node.labels)]
+
+    @_locked
+    def agentcontacts(self, node_a, label, contact_label=None):
+        if not contact_label:
+            contact_label = label
+        return [edge for start in self.find(label, "id", node_a) for edge in self.out(start, "SOCIAL")
+                if contact_label in edge.end_node.labels]
+
+    @_locked
+    def socialedges(self):
+        return [(edge.start_node.get("id"), list(edge.start_node.labels), edge.end_node.get("id"),
+                 list(edge.end_node.labels), edge)
+                for start in list(self.nodes.values()) for edge in self.out(start, "SOCIAL")]
+
+    @_locked
+    def locations(self):
+        return [(edge.end_node.id, agent) for agent in self.labelled("Agent") for edge in self.out(agent, "LOCATED")
+                if "Node" in edge.end_node.labels]
+
+    @_locked
+    def colocated(self, agent):
+        node = self.locateagent(agent)
+        if node is None:
+            return []
+        return [edge.start_node for edge in self.into(node, "LOCATED") if "Agent" in edge.start_node.labels]
+
+    @_locked
+    def getnode(self, nodeid, label=None, uid=None):
+        return self.find(label, uid or "id", nodeid)[0]
+
+    @_locked
+    def getnodeagents(self, nodeid, uid="name"):
+        return [edge.start_node for node in self.find("Node", uid, nodeid) for edge in self.into(node, "LOCATED")]
+
+    @_locked
+    def getnodevalue(self, node, value, label=None, uid=None):
+        return self.find(label or "Node", uid or "id", node)[0].get(value)
+
+    @_locked
+    def getrunname(self):
+        return self.labelled("Tag")[0]["tag"]
+
+    @_locked
+    def gettime(self):
+        return self.labelled("Clock")[0]["time"]
+
+    @_locked
+    def tick(self):
+        clock = self.labelled("Clock")[0]
+        self.setproperty(clock, "time", clock["time"] + 1)
+        return clock["time"]
+
+    @_locked
+    def adjacency(self, node_label, edge_label):
+        starts = self.labelled(node_label) if node_label else list(self.nodes.values())
+        return [(start.get("id"), edge.end_node.get("id")) for start in starts for edge in self.out(start, edge_label)
+                if not node_label or node_label in edge.end_node.labels]
+
+    @_locked
+    def updateedge(self, edge, attr, value, uid=None):
+        uid = uid or "id"
+        for start in self.find("Node", uid, edge.start_node[uid]):
+            for rel in self.out(start, "REACHES"):
+                if "Node" in rel.end_node.labels and rel.end_node.get(uid) == edge.end_node[uid]:
+                    rel[attr] = value
+
+    @_locked
+    def updatenode(self, node, attr, value, uid=None, label=None):
+        for found in self.find(label or "Node", uid or "id", node):
+            self.setproperty(found, attr, value)
+
+    @_locked
+    def updateagent(self, node, attr, value, uid=None):
+        for found in self.find("Agent", uid or "id", node):
+            self.setproperty(found, attr, value)
+
+    @_locked
+    def deleteagent(self, agent, uid=None):
+        uid = uid or "id"
+        for found in self.find("Agent", uid, agent[uid]):
+            self.removenode(found)
+
+    @_locked
+    def addagent(self, node, label, params, uid=None):
+        uid = uid or "id"
+        properties = {"id": self.nextids(label)}
+        properties.update(params)
+        for location in self.find("Node", uid, node[uid]):
+            agent = self.createnode(label, properties)
+            self.createrelationship(agent, location, "LOCATED")
+
+    @_locked
+    def addagents(self, node, label, agents, uid=None):
+        for location in self.find("Node", uid or "id", node[uid or "id"]):
+            for properties in agents:
+                agent = self.createnode(label, properties)
+                self.createrelationship(agent, location, "LOCATED")
+
+    @_locked
+    def nextids(self, label, count=1):
+        if label not in self.sequences:
+            ids = [ag["id"] for ag in self.labelled(label) if "id" in ag]
+            self.sequences[label] = max(ids) + 1 if ids else 0
+        first = self.sequences[label]
+        self.sequences[label] = first + count
+        return first
+
+    @_locked
+    def createedge(self, node_a, node_b, label_a, label_b, edge_label, parameters=None):
+        created = 0
+        for start in self.find(label_a, "id", node_a):
+            for end in self.find(label_b, "id", node_b):
+                self.createrelationship(start, end, edge_label, parameters)
+                created = created + 1
+        return created
+
+    @_locked
+    def moveagent(self, agent, new, nuid="id"):
+        ag = self.first("Agent", "id", agent)
+        if ag is None:
+            return
+        for edge in self.out(ag, "LOCATED"):
+            self.removeedge(edge)
+        for node in self.find("Node", nuid, new):
+            self.createrelationship(ag, node, "LOCATED")
+
+    @_locked
+    def moveagents(self, moves, nuid="id"):
+        for move in moves:
+            self.moveagent(move["id"], move["new"], nuid)
+
+    @_locked
+    def agentids(self, label="Agent"):
+        return [ag["id"] for ag in self.labelled(label)]
+
+    @_locked
+    def addnode(self, label, params):
+        self.createnode(label, params)
+
+    @_locked
+    def createindex(self, label, attr, unique=False):
+        self._index(label, attr)
+
+    @_locked
+    def listindexes(self):
+        return list(self.indexes.keys())
+
+    @_locked
+    def clearchunk(self, batch_size):
+        edges = list(islice(self.edges.values(), batch_size))
+        if edges:
+            for edge in edges:
+                self.removeedge(edge)
+            return len(edges)
+        chunk = list(islice(self.nodes.values(), batch_size))
+        for node in chunk:
+            self.removenode(node)
+        if not self.nodes:
+            self.sequences = {}
+            self.restoring = {}
+        return len(chunk)
+
+    @_locked
+    def cleardatabase(self):
+        self.clear()
+
+    @_locked
+    def graphnodes(self):
+        return [(node.id, sorted(node.labels), dict(node.items())) for node in self.nodes.values()]
+
+    @_locked
+    def graphedges(self):
+        return [(edge.start_node.id, edge.end_node.id, edge.type, dict(edge.items())) for edge in self.edges.values()]
+
+    @_locked
+    def graphsnapshot(self):
+        return self.gettime(), self.graphnodes(), self.graphedges()
+
+    @_locked
+    def restorenodes(self, nodes):
+        for key, labels, properties in nodes:
+            self.restoring[key] = self.createnode(labels, properties)
+
+    @_locked
+    def restoreedges(self, edges):
+        for start, end, edgetype, properties in edges:
+            self.createrelationship(self.restoring[start], self.restoring[end], edgetype, properties)
+
+    @_locked
+    def finishrestore(self):
+        self.restoring = {}
+
+
+class MemoryTransaction:
+    """
+    Transaction handed to module and model functions when running on the in-memory backend. Interface functions
+    recognise it and operate directly on its graph. Changes are applied immediately; there is no rollback.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.closed = False
+
+    def run(self, statement, parameters=None, **kwparameters):
+        raise NotImplementedError("The in-memory backend does not execute Cypher, use SPmodelling.Interface "
+                                  "functions instead of tx.run")
+
+    def commit(self):
+        self.closed = True
+
+    def rollback(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class MemorySession:
+    """
+    Session over a MemoryGraph with the neo4j session methods used by the framework. Write transactions hold the graph
+    lock for their whole duration, read and explicit transactions lock per Interface call.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def write_transaction(self, unit_of_work, *args, **kwargs):
+        with self.graph.lock:
+            return unit_of_work(MemoryTransaction(self.graph), *args, **kwargs)
+
+    def read_transaction(self, unit_of_work, *args, **kwargs):
+        return unit_of_work(MemoryTransaction(self.graph), *args, **kwargs)
+
+    def begin_transaction(self):
+        return MemoryTransaction(self.graph)
+
+    def run(self, statement, parameters=None, **kwparameters):
+        return MemoryTransaction(self.graph).run(statement, parameters, **kwparameters)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class MemoryDriver:
+    """
+    Driver handing out sessions over a shared MemoryGraph.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def session(self, **kwargs):
+        return MemorySession(self.graph)
+
+    def close(self):
+        pass
+
+
+_graphs = {}
+_graphslock = threading.Lock()
+
+
+def graph(name="default"):
+    """
+    Returns the process-wide graph with the given name, creating it if needed. All modules in a process share it.
+
+    :param name: name of the store, the backend uses the database uri from specification
+
+    :return: MemoryGraph
+    """
+    with _graphslock:
+        if name not in _graphs:
+            _graphs[name] = MemoryGraph()
+        return _graphs[name]
@@ -1,7 +1,9 @@
-from neo4j import GraphDatabase
-from matplotlib.pylab import *
 from abc import ABC, abstractmethod
-import specification
+import os
+import SPmodelling.Backend as backend
+import SPmodelling.Checkpoint as checkpoint
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Instrument as instrument
 import SPmodelling.Interface as intf
 
 
@@ -12,22 +14,102 @@ class Monitor(ABC):
     """
 
     @abstractmethod
-    def __init__(self, show_local=True):
+    def __init__(self, show_local=True, record_path=None, record_buffer=None, headless=None):
         """
         Sets up clock, records and basic graph. Subclass must implement function to set up graphs and other data needed
 
+        When a record path is given, or record_path is set in specification, records are streamed to a Recorder in a
+        directory named after the run instead of being kept in self.records.
+
+        In headless mode matplotlib is not imported and self.fig is None, so subclasses should only set up graphs when
+        self.headless is False. Graphs are then drawn afterwards from the recorded data with plotruns.
+
         :param show_local: display graph during run
+        :param record_path: directory for streamed records
+        :param record_buffer: records held in memory before being written, record_buffer in specification or 100
+        :param headless: record data only, headless in specification or False
         """
+        import specification
         self.clock = 0
         self.records = {}
         self.orecord = None
         self.nrecord = None
         self.show = show_local
+        self.record_path = record_path or getattr(specification, "record_path", None)
+        self.record_buffer = record_buffer or getattr(specification, "record_buffer", 100)
+        self.recorder = None
+        self.headless = headless if headless is not None else getattr(specification, "headless", False)
         # Set up plot
-        self.fig = figure()
-        self.t = zeros(0)
+        if self.headless:
+            self.show = False
+            self.fig = None
+        else:
+            import matplotlib.pyplot as plt
+            self.fig = plt.figure()
+        self.times = []
         self.x = 0
 
+    @property
+    def t(self):
+        """
+        Times at which snapshots were recorded as an array.
+        """
+        import numpy
+        return numpy.array(self.times)
+
+    @t.setter
+    def t(self, value):
+        self.times = list(value)
+
+    def record(self, txl, clock, rec):
+        """
+        Keeps a completed record, streaming it to the recorder when one is set up.
+
+        :param txl: neo4j read or write transaction
+        :param clock: snapshot number
+        :param rec: record, a dictionary is written as one column per key, None is not streamed
+
+        :return: None
+        """
+        if self.record_path is None:
+            self.records[clock] = rec
+            return
+        if rec is None:
+            return
+        if self.recorder is None:
+            from SPmodelling.Recorder import Recorder
+            self.recorder = Recorder(os.path.join(self.record_path, str(intf.getrunname(txl))), self.record_buffer)
+        row = dict(rec) if isinstance(rec, dict) else {"record": rec}
+        row["clock"] = clock
+        self.recorder.append(row)
+
+    def getstate(self):
+        """
+        Monitor state kept in checkpoints. Streamed records are written out first, so the recorder's files match the
+        checkpoint. Subclasses holding their own data should extend the dictionary.
+
+        :return: dictionary of picklable state
+        """
+        if self.recorder:
+            self.recorder.flush()
+        return {"clock": self.clock, "records": dict(self.records), "orecord": self.orecord,
+                "nrecord": self.nrecord, "times": list(self.times), "x": self.x}
+
+    def setstate(self, state):
+        """
+        Restores monitor state from a checkpoint.
+
+        :param state: dictionary returned by getstate
+
+        :return: None
+        """
+        self.clock = state["clock"]
+        self.records = state["records"]
+        self.orecord = state["orecord"]
+        self.nrecord = state["nrecord"]
+        self.times = state["times"]
+        self.x = state["x"]
+
     @abstractmethod
     def snapshot(self, txl, ctime):
         """
@@ -41,10 +123,10 @@ class Monitor(ABC):
         if self.x != ctime:
             # Update time
             print(ctime)
-            self.records[self.clock] = self.orecord
+            self.record(txl, self.clock, self.orecord)
             self.orecord = self.nrecord
             self.clock = self.clock + 1
-            self.t = append(self.t, ctime)
+            self.times.append(ctime)
             self.x = ctime
             return True
         return False
@@ -60,6 +142,52 @@ class Monitor(ABC):
         """
         pass
 
+    @staticmethod
+    def plot(data, fig):
+        """
+        Draws graphs for one run from its recorded data, used by plotruns after headless runs. Subclass should implement
+        to draw the same graphs as during a run, the base function draws nothing and plotruns refuses a Monitor which
+        does not override it.
+
+        :param data: dictionary of column name to array, as returned by Recorder.read
+        :param fig: matplotlib figure to draw on
+
+        :return: None
+        """
+        return None
+
+
+def plotruns(paths, monitor=None, fmt="png"):
+    """
+    Draws and saves the graphs for many recorded runs in one process, each figure is saved next to its run's record
+    directory as <directory>.<fmt>.
+
+    :param paths: record directories, one per run
+    :param monitor: Monitor subclass with a plot function, specification.Monitor by default
+    :param fmt: image format passed to savefig
+
+    :return: list of saved file names
+    """
+    if monitor is None:
+        import specification
+        monitor = specification.Monitor
+    if monitor.plot is Monitor.plot:
+        name = monitor.__name__ if isinstance(monitor, type) else type(monitor).__name__
+        raise NotImplementedError(name + " does not implement plot, which plotruns needs to draw recorded runs")
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from SPmodelling.Recorder import read
+    saved = []
+    for path in paths:
+        fig = plt.figure()
+        monitor.plot(read(path), fig)
+        name = os.path.normpath(path) + "." + fmt
+        fig.savefig(name)
+        plt.close(fig)
+        saved.append(name)
+    return saved
+
 
 def main(rl):
     """
@@ -69,24 +197,45 @@ def main(rl):
 
     :return: None
     """
+    import specification
     monitor = specification.Monitor()
-    clock = 0
-    while clock < rl:
-        driver = GraphDatabase.driver(specification.database_uri, auth=specification.Monitor_auth,
-                                      max_connection_lifetime=20000)
-        with driver.session() as session:
+    checkpoint.register("Monitor", monitor)
+    with backend.session(specification.Monitor_auth, max_connection_lifetime=20000) as session:
+        clock = session.read_transaction(intf.gettime)
+        while clock < rl:
             # modifying and redrawing plot over time and saving plot rather than an animation
-            session.write_transaction(monitor.snapshot, clock)
-            tx = session.begin_transaction()
-            current_time = intf.gettime(tx)
-            while clock == current_time:
-                current_time = intf.gettime(tx)
-            clock = current_time
-        driver.close()
-    print("Monitor Capture complete")
-    driver = GraphDatabase.driver(specification.database_uri, auth=specification.Monitor_auth,
-                                  max_connection_lifetime=2000)
-    with driver.session() as session:
+            with instrument.step("Monitor", clock):
+                session.write_transaction(monitor.snapshot, clock)
+            clock = clocksignal.waittick(session, clock)
+        print("Monitor Capture complete")
+        checkpoint.unregister("Monitor")
         session.write_transaction(monitor.close)
-    driver.close()
+    if monitor.recorder:
+        monitor.recorder.close()
+    print("Monitor closed")
+
+
+async def amain(rl):
+    """
+    Asynchronous version of main run as a task by Orchestrator.run.
+
+    :param rl: run length
+
+    :return: None
+    """
+    import specification
+    import SPmodelling.Orchestrator as orchestrator
+    monitor = specification.Monitor()
+    checkpoint.register("Monitor", monitor)
+    with backend.session(specification.Monitor_auth, max_connection_lifetime=20000) as session:
+        clock = await orchestrator.transaction(session, intf.gettime, write=False)
+        while clock < rl:
+            with instrument.step("Monitor", clock):
+                await orchestrator.transaction(session, monitor.snapshot, clock)
+            clock = await orchestrator.waittick(session, clock)
+        print("Monitor Capture complete")
+        checkpoint.unregister("Monitor")
+        await orchestrator.transaction(session, monitor.close)
+    if monitor.recorder:
+        monitor.recorder.close()
     print("Monitor closed")
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
-import specification
 import SPmodelling.Interface as intf
+from SPmodelling.Agent import MobileAgent
+from SPmodelling.Wheel import AgentQueue
 
 
 class Node(ABC):
@@ -15,14 +16,21 @@ class Node(ABC):
         :param name: Used as node id
         :param capacity: Max number of agents which can be located at node
         :param duration: Number of timesteps all agents spend at node
-        :param queue: List of agents and times for them to be processed at nodes with predictions
+        :param queue: List of agents and times for them to be processed at nodes with predictions, given as a
+                      dictionary of {time: {agent id: entry}} and held as an AgentQueue. Set queue_spill in
+                      specification to spill distant times to disk once that many agents are queued.
         :param nuid: defaults to "name" unless another form of id is used.
         """
+        import specification
         self.name = name
         self.capacity = capacity
         self.duration = duration
+        if queue is not None and not isinstance(queue, AgentQueue):
+            queue = AgentQueue(queue, getattr(specification, "queue_spill", None))
         self.queue = queue
         self.nuid = nuid
+        self.moves = None
+        self.clock = None
 
     @abstractmethod
     def agentsready(self, tx):
@@ -31,38 +39,92 @@ class Node(ABC):
         the node. It checks for unqueued agents in nodes with queue and runs the nodes prediction function to add them
         to the queue. It then gathers the agents local environment perception and passes that to the agent when calling
         the move function. We then delete the part of the queue that has been processed to save space. Subclass must
-        implement this function for any aspects unique to model.
+        implement this function for any aspects unique to model. When Flow runs in batch mode it sets self.moves to a
+        list, agents append their chosen moves to it and Flow writes them with MobileAgent.commitmoves.
 
         :param tx: neo4j write transaction
 
         :return: None
         """
+        import specification
         agents = intf.getnodeagents(tx, self.name, "name")
         clock = intf.gettime(tx)
-        if self.queue or self.queue == {}:
-            queueagents = [key for time in self.queue.keys() for key in self.queue[time].keys()]
-            newagents = [ag for ag in agents if ag["id"] not in queueagents]
+        self.clock = clock
+        if self.queue is not None and not isinstance(self.queue, AgentQueue):
+            self.queue = AgentQueue(self.queue, getattr(specification, "queue_spill", None))
+        if self.queue is not None:
+            newagents = [ag for ag in agents if not self.queue.queued(ag["id"])]
             # run prediction on each unqueued agent
             for ag in newagents:
                 self.agentprediction(tx, ag)
-        for ag in agents:
-            if self.queue:
-                if clock in self.queue.keys():
-                    if ag["id"] in self.queue[clock].keys():
-                        agper = self.agentperception(tx, ag, self.queue[clock][ag["id"]][0],
-                                                     self.queue[clock][ag["id"]])
-                        specification.Agent(ag["id"]).move(tx, agper)
-            else:
+        if self.queue:
+            due = self.queue.due(clock)
+            for ag in agents:
+                if ag["id"] in due:
+                    agper = self.agentperception(tx, ag, due[ag["id"]][0], due[ag["id"]])
+                    specification.Agent(ag["id"]).move(tx, agper, self.moves)
+            self.queue.expire(clock)
+        elif getattr(specification, "batch_decisions", False):
+            self.agentsbatch(tx, agents)
+        else:
+            for ag in agents:
                 agper = self.agentperception(tx, ag)
-                specification.Agent(ag["id"]).move(tx, agper)
-        if self.queue and clock in self.queue.keys():
-            del self.queue[clock]
+                specification.Agent(ag["id"]).move(tx, agper, self.moves)
+
+    def agentsbatch(self, tx, agents):
+        """
+        Moves all the agents at the node with one call to the agent class's choosebatch, used when batch_decisions is
+        set in specification. Agents share the node's view, so agent specific filtering belongs in choosebatch rather
+        than agentperception. Chosen moves are added to self.moves when Flow is batching, otherwise written together
+        here, and each moved agent then learns.
+
+        :param tx: neo4j write transaction
+        :param agents: agent nodes located at the node
+
+        :return: None
+        """
+        import specification
+        import numpy
+        if not agents:
+            return
+        view = self.nodeview(tx)
+        keys = sorted({key for ag in agents for key in ag.keys()})
+        agentarrays = {key: numpy.array([ag.get(key) for ag in agents]) for key in keys}
+        edgearrays = {"destination": numpy.array([edge.end_node[self.nuid] for edge in view])}
+        for key in sorted({key for edge in view for key in edge.keys()}):
+            edgearrays[key] = numpy.array([edge.get(key) for edge in view])
+        for key in sorted({key for edge in view for key in edge.end_node.keys()}):
+            edgearrays["end_" + key] = numpy.array([edge.end_node.get(key) for edge in view])
+        choices = specification.Agent.choosebatch(tx, agentarrays, edgearrays, view)
+        moves = []
+        for ag, choice in zip(agents, numpy.asarray(choices).tolist()):
+            if choice >= 0:
+                agent = specification.Agent(ag["id"])
+                agent.choice = view[choice]
+                moves.append((agent, view[choice].end_node[agent.nuid]))
+        if self.moves is not None:
+            self.moves.extend(moves)
+        else:
+            MobileAgent.commitmoves(tx, moves)
+
+    def nodeview(self, tx):
+        """
+        The node's outgoing edges with those leading to nodes at capacity removed, read once per tick.
+
+        :param tx: neo4j read or write transaction
+
+        :return: list of relationships
+        """
+        view = intf.nodeperception(tx, self.name, "name", self.clock)[1:]
+        return [edge for edge in view
+                if "cap" not in edge.end_node.keys() or edge.end_node["cap"] > edge.end_node["load"]]
 
     @abstractmethod
     def agentperception(self, tx, agent, dest=None, waittime=None):
         """
         The local environment of the node filtered by availability to a particular agent. Subclass must implement this
-        function to add node filtering for particular model
+        function to add node filtering for particular model. The unfiltered environment is read once per tick and shared
+        by all agents at the node.
 
         :param tx: neo4j read or write transaction
         :param agent: agent id
@@ -71,15 +133,12 @@ class Node(ABC):
 
         :return: view of local environment for agent as list of relationships
         """
-        if dest:
-            view = dest
-        else:
-            view = intf.perception(tx, agent["id"])[1:]
+        if not dest:
+            return self.nodeview(tx)
+        view = dest
         if type(view) == list:
-            for edge in view:
-                if "cap" in edge.end_node.keys():
-                    if edge.end_node["cap"] <= edge.end_node["load"]:
-                        view.remove(edge)
+            view = [edge for edge in view
+                    if "cap" not in edge.end_node.keys() or edge.end_node["cap"] > edge.end_node["load"]]
         return view
 
     @abstractmethod
@@ -93,5 +152,5 @@ class Node(ABC):
 
         :return: view of local environment for agent
         """
-        view = intf.perception(tx, agent["id"])
+        view = intf.nodeperception(tx, self.name, "name", self.clock)
         return view
@@ -0,0 +1,105 @@
+import asyncio
+import time
+import SPmodelling.Backend as backend
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Instrument as instrument
+import SPmodelling.Interface as intf
+
+
+async def call(func, *args):
+    """
+    Runs a blocking function from a module loop. Database work on neo4j runs on the event loop's worker threads so
+    other module loops keep going while it waits on the server. The in-memory backend never waits so its work runs
+    directly on the event loop, which then gets a chance to switch to another module loop.
+
+    :param func: function to run
+    :param args: arguments for func
+
+    :return: result of func
+    """
+    if backend.name() == "memory":
+        result = func(*args)
+        await asyncio.sleep(0)
+        return result
+    return await asyncio.to_thread(func, *args)
+
+
+async def transaction(ses, func, *args, write=True):
+    """
+    Runs a unit of work in a write or read transaction from a module loop, see call.
+
+    :param ses: neo4j session
+    :param func: transaction function, eg. an Interface function
+    :param args: arguments for func after the transaction
+    :param write: use a write transaction if True, otherwise a read transaction
+
+    :return: result of func
+    """
+    return await call(ses.write_transaction if write else ses.read_transaction, func, *args)
+
+
+async def waittick(ses, clock, timeout=0.1):
+    """
+    Waits until the clock has moved on from the given time without holding a thread, see Clock.waittick.
+
+    :param ses: neo4j session
+    :param clock: last time seen by the caller
+    :param timeout: seconds between clock reads when no tick is signalled
+
+    :return: Current time on clock
+    """
+    now = await transaction(ses, intf.gettime, write=False)
+    while now == clock:
+        await clocksignal.signal.waitasync(clock, timeout)
+        now = await transaction(ses, intf.gettime, write=False)
+    return now
+
+
+async def run(rn, length, population, modules=None, checkpoint=None):
+    """
+    Runs a single model run with each module's loop as a task on the running event loop, see SPm.run. Modules waiting
+    for the clock or, on neo4j, for the database hold no thread while they wait.
+
+    :param rn: Run number
+    :param length: Time-step length of the run
+    :param population: Size of initial and maintained population
+    :param modules: List of modules to be used in this run eg. ['Monitor', 'Flow', 'Population', 'Balancer',
+                    'Structure', 'Social']
+    :param checkpoint: checkpoint file to start the run from instead of resetting
+
+    :return: dictionary with the run number, run name, final clock time and wall time in seconds
+    """
+    import specification
+    import SPmodelling.Balancer
+    import SPmodelling.Flow
+    import SPmodelling.Monitor
+    import SPmodelling.Population
+    import SPmodelling.Reset
+    import SPmodelling.Social
+    import SPmodelling.Structure
+    start = time.time()
+    instrumented = getattr(specification, "instrument", False)
+    instrument.enable(instrumented)
+    instrument.reset()
+    with instrument.step("Reset", 0):
+        await call(SPmodelling.Reset.main, rn, population, length, checkpoint)
+    print("Finished Reset")
+    loops = {"Monitor": (SPmodelling.Monitor.amain, length),
+             "Population": (SPmodelling.Population.amain, length, population),
+             "Structure": (SPmodelling.Structure.amain, length),
+             "Balancer": (SPmodelling.Balancer.amain, length),
+             "Flow": (SPmodelling.Flow.amain, length, rn),
+             "Social": (SPmodelling.Social.amain, length, rn)}
+    tasks = [asyncio.create_task(loop[0](*loop[1:])) for name, loop in loops.items() if name in (modules or [])]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    with backend.session(specification.Reset_auth) as ses:
+        runname = await transaction(ses, intf.getrunname, write=False)
+        clock = await transaction(ses, intf.gettime, write=False)
+    if instrumented:
+        instrument.enable(False)
+        instrument.save(runname)
+    return {"run": rn, "name": runname, "time": clock, "seconds": time.time() - start}
@@ -0,0 +1,270 @@
+import threading
+from array import array
+from collections import Counter, OrderedDict, deque
+
+
+class PathGraph:
+    """
+    Compact adjacency for one combination of node label, edge type and direction. Node ids are mapped to consecutive
+    integers and hop distances from each source already searched are kept as arrays, least recently used sources are
+    dropped once more than maxsources are held.
+    """
+
+    def __init__(self, pairs, directed, maxsources=None):
+        """
+        :param pairs: (start id, end id) for every edge
+        :param directed: only follow edges from start to end
+        :param maxsources: number of sources to keep distances for, None for no limit
+        """
+        self.directed = directed
+        self.maxsources = maxsources
+        self.index = {}
+        self.adjacency = []
+        self.edges = Counter()
+        self.sources = OrderedDict()
+        for start, end in pairs:
+            self.add(start, end)
+
+    def node(self, nodeid):
+        """
+        Integer index of a node id, adding the node if it is new.
+        """
+        if nodeid not in self.index:
+            self.index[nodeid] = len(self.adjacency)
+            self.adjacency.append([])
+        return self.index[nodeid]
+
+    def distances(self, source):
+        """
+        Hop distances from a source index to every node, -1 where unreachable, searched on first use.
+        """
+        dist = self.sources.get(source)
+        if dist is None:
+            dist = array("i", [-1]) * len(self.adjacency)
+            dist[source] = 0
+            self._relax(dist, deque([source]))
+            self.sources[source] = dist
+            if self.maxsources is not None and len(self.sources) > self.maxsources:
+                self.sources.popitem(last=False)
+        else:
+            self.sources.move_to_end(source)
+            if len(dist) < len(self.adjacency):
+                dist.extend(array("i", [-1]) * (len(self.adjacency) - len(dist)))
+        return dist
+
+    def distance(self, node_a, node_b):
+        if node_a not in self.index or node_b not in self.index:
+            return None
+        hops = self.distances(self.index[node_a])[self.index[node_b]]
+        return hops if hops >= 0 else None
+
+    def add(self, start, end):
+        """
+        Adds an edge, lowering cached distances which now pass through it.
+        """
+        a = self.node(start)
+        b = self.node(end)
+        self.edges[(a, b)] += 1
+        self.adjacency[a].append(b)
+        if not self.directed:
+            self.adjacency[b].append(a)
+        for source in list(self.sources):
+            dist = self.distances(source)
+            self._shorten(dist, a, b)
+            if not self.directed:
+                self._shorten(dist, b, a)
+
+    def remove(self, start, end):
+        """
+        Removes every edge from start to end, dropping cached distances from sources with a shortest path that may have
+        used them.
+        """
+        if start in self.index and end in self.index:
+            self._remove(self.index[start], self.index[end])
+
+    def discard(self, nodeid):
+        """
+        Removes every edge to or from a node, see remove.
+        """
+        if nodeid in self.index:
+            n = self.index[nodeid]
+            for a, b in [pair for pair in self.edges if n in pair]:
+                self._remove(a, b)
+
+    def _remove(self, a, b):
+        for _ in range(self.edges.pop((a, b), 0)):
+            self.adjacency[a].remove(b)
+            if not self.directed:
+                self.adjacency[b].remove(a)
+        for source in list(self.sources):
+            dist = self.distances(source)
+            if self._tight(dist, a, b) or (not self.directed and self._tight(dist, b, a)):
+                del self.sources[source]
+
+    def _shorten(self, dist, a, b):
+        if dist[a] >= 0 and (dist[b] < 0 or dist[a] + 1 < dist[b]):
+            dist[b] = dist[a] + 1
+            self._relax(dist, deque([b]))
+
+    @staticmethod
+    def _tight(dist, a, b):
+        return dist[a] >= 0 and dist[b] == dist[a] + 1
+
+    def _relax(self, dist, frontier):
+        while frontier:
+            node = frontier.popleft()
+            for neighbour in self.adjacency[node]:
+                if dist[neighbour] < 0 or dist[node] + 1 < dist[neighbour]:
+                    dist[neighbour] = dist[node] + 1
+                    frontier.append(neighbour)
+
+
+class PathService:
+    """
+    In-process shortest path lengths. The edges of each combination of node label, edge type and direction are read in
+    one query on first use and searched breadth first, so repeated lookups are memory reads. Edges created or deleted
+    through the Interface update the cached graphs on the memory backend, where writes are applied at once, and drop
+    them on neo4j, where the transaction may yet roll back. Changes made with other queries need clear to be called,
+    Structure and Balancer do so after each of their steps.
+    """
+
+    def __init__(self, maxsources=None):
+        """
+        :param maxsources: number of sources to keep distances for in each graph, None for no limit
+        """
+        self.lock = threading.RLock()
+        self.maxsources = maxsources
+        self.graphs = {}
+
+    def graph(self, node_label, edge_label, directed, load):
+        """
+        Cached graph for the label, type and direction, built with load on first use.
+
+        :param load: function returning (start id, end id) for every edge of the type between nodes with the label
+
+        :return: PathGraph
+        """
+        key = (node_label, edge_label, directed)
+        with self.lock:
+            if key in self.graphs:
+                return self.graphs[key]
+        pairs = load()
+        with self.lock:
+            if key not in self.graphs:
+                self.graphs[key] = PathGraph(pairs, directed, self.maxsources)
+            return self.graphs[key]
+
+    def distance(self, node_a, node_b, node_label, edge_label, directed, load):
+        """
+        Length of the shortest path between two nodes.
+
+        :param node_a: first node id
+        :param node_b: second node id
+        :param node_label: label for both nodes
+        :param edge_label: type of relationships to use in path
+        :param directed: whether to consider direction of path
+        :param load: function returning the edges, used if the graph is not cached
+
+        :return: number of edges in the path, None if there is no path
+        """
+        graph = self.graph(node_label, edge_label, directed, load)
+        with self.lock:
+            return graph.distance(node_a, node_b)
+
+    def precompute(self, node_label, edge_label, directed, load):
+        """
+        Searches from every node, giving all pairs distances for the graph.
+
+        :return: None
+        """
+        graph = self.graph(node_label, edge_label, directed, load)
+        with self.lock:
+            for source in range(len(graph.adjacency)):
+                graph.distances(source)
+
+    def edgeadded(self, node_a, node_b, label_a, label_b, edge_label):
+        """
+        Updates cached graphs for a new edge. Graphs it may belong to but cannot be placed in, because a node label is
+        not known, are dropped.
+
+        :return: None
+        """
+        with self.lock:
+            for key, graph in list(self.graphs.items()):
+                match = _matches(key, label_a, label_b, edge_label)
+                if match == "yes":
+                    graph.add(node_a, node_b)
+                elif match == "maybe":
+                    del self.graphs[key]
+
+    def edgeremoved(self, node_a, node_b, label_a, label_b, edge_label):
+        """
+        Updates cached graphs for a deleted edge, see edgeadded.
+
+        :return: None
+        """
+        with self.lock:
+            for key, graph in list(self.graphs.items()):
+                match = _matches(key, label_a, label_b, edge_label)
+                if match == "yes":
+                    graph.remove(node_a, node_b)
+                elif match == "maybe":
+                    del self.graphs[key]
+
+    def noderemoved(self, nodeid, label):
+        """
+        Updates cached graphs for a deleted node and its edges. Graphs over any label, which may hold a node of another
+        label with the same id, are dropped.
+
+        :param nodeid: id of the deleted node
+        :param label: label of the deleted node
+
+        :return: None
+        """
+        with self.lock:
+            for key, graph in list(self.graphs.items()):
+                if key[0] == label:
+                    graph.discard(nodeid)
+                elif key[0] is None:
+                    del self.graphs[key]
+
+    def invalidate(self, label_a, label_b, edge_label):
+        """
+        Drops the cached graphs an edge written between nodes with the labels could belong to.
+
+        :param label_a: label of the start node, None if unknown
+        :param label_b: label of the end node, None if unknown
+        :param edge_label: type of the edge, None for any type
+
+        :return: None
+        """
+        with self.lock:
+            for key in list(self.graphs):
+                if _matches(key, label_a, label_b, edge_label) != "no":
+                    del self.graphs[key]
+
+    def clear(self):
+        """
+        Drops all cached graphs.
+
+        :return: None
+        """
+        with self.lock:
+            self.graphs = {}
+
+
+def _matches(key, label_a, label_b, edge_label):
+    """
+    Whether an edge belongs to a cached graph: "yes", "no" or "maybe" when a label or the type is not known.
+    """
+    node_label, edge_type, directed = key
+    if edge_label is not None and edge_label != edge_type:
+        return "no"
+    if node_label is not None and (label_a not in (node_label, None) or label_b not in (node_label, None)):
+        return "no"
+    if edge_label is None or node_label is not None and None in (label_a, label_b):
+        return "maybe"
+    return "yes"
+
+
+service = PathService()
@@ -1,6 +1,24 @@
-from neo4j import GraphDatabase
-import SPmodelling.Interface as intf
-import specification as specification
+import SPmodelling.Backend as backend
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Instrument as instrument
+
+
+def step(ses, agent, ps):
+    """
+    Adds agents if the population is below the required size, with one call to the agent class's bulkgenerator. The
+    agents are only written in one batch if the model overrides bulkgenerator, see Agent.MobileAgent.bulkgenerator.
+
+    :param ses: neo4j session
+    :param agent: specification.Agents instance used to generate agents
+    :param ps: population size
+
+    :return: number of agents added
+    """
+    import specification
+    populationdeficite = specification.Population.check(ses, ps)
+    if populationdeficite:
+        ses.write_transaction(agent.bulkgenerator, specification.Population.params, populationdeficite)
+    return populationdeficite
 
 
 def main(rl, ps):
@@ -13,20 +31,33 @@ def main(rl, ps):
 
     :return: None
     """
+    import specification
+    clock = 0
+    agent = specification.Agents(None)
+    with backend.session(specification.Population_auth) as ses:
+        while clock < rl:
+            with instrument.step("Population", clock):
+                step(ses, agent, ps)
+            clock = clocksignal.waittick(ses, clock)
+    print("Population closed")
+
+
+async def amain(rl, ps):
+    """
+    Asynchronous version of main run as a task by Orchestrator.run.
+
+    :param rl: run length
+    :param ps: population size
+
+    :return: None
+    """
+    import specification
+    import SPmodelling.Orchestrator as orchestrator
     clock = 0
     agent = specification.Agents(None)
-    while clock < rl:
-        dri = GraphDatabase.driver(specification.database_uri, auth=specification.Population_auth,
-                                   max_connection_lifetime=2000)
-        with dri.session() as ses:
-            populationdeficite = specification.Population.check(ses, ps)
-            if populationdeficite:
-                for i in range(populationdeficite):
-                    ses.write_transaction(agent.generator, specification.Population.params)
-            tx = ses.begin_transaction()
-            time = intf.gettime(tx)
-            while clock == time:
-                time = intf.gettime(tx)
-            clock = time
-        dri.close()
+    with backend.session(specification.Population_auth) as ses:
+        while clock < rl:
+            with instrument.step("Population", clock):
+                await orchestrator.call(step, ses, agent, ps)
+            clock = await orchestrator.waittick(ses, clock)
     print("Population closed")
@@ -0,0 +1,251 @@
+import re
+import threading
+import time
+from string import Template
+import SPmodelling.Instrument as instrument
+
+_identifier = re.compile(r"^(:[A-Za-z_][A-Za-z0-9_]*)*$|^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class QueryTemplate:
+    """
+    A Cypher query with every value passed as a parameter. Labels, relationship types and attribute names cannot be
+    parameters in Cypher so they are written as $name placeholders and filled in once per combination, the filled in
+    statements are kept so the same text is sent, and the server's cached plan reused, on every call. Counts calls,
+    time spent and distinct statements.
+    """
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = Template(text)
+        self.statements = {}
+        self.sent = set()
+        self.calls = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def statement(self, identifiers):
+        """
+        Query text for a set of identifiers, compiled on first use.
+
+        :param identifiers: dictionary of labels and attribute names to fill in
+
+        :return: Cypher statement
+        """
+        key = tuple(sorted(identifiers.items()))
+        statement = self.statements.get(key)
+        if statement is None:
+            for identifier in identifiers.values():
+                if not _identifier.match(identifier):
+                    raise ValueError("Invalid identifier " + repr(identifier) + " in query " + self.name)
+            statement = self.text.substitute(identifiers)
+            with self.lock:
+                self.statements[key] = statement
+        return statement
+
+    def record(self, statement, seconds):
+        with self.lock:
+            self.sent.add(statement)
+            self.calls = self.calls + 1
+            self.seconds = self.seconds + seconds
+
+
+templates = {}
+
+
+def register(name, text):
+    """
+    Add a query template to the registry.
+
+    :param name: name used to run the query, usually the Interface function it belongs to
+    :param text: Cypher with {value} parameters and $identifier placeholders
+
+    :return: QueryTemplate
+    """
+    templates[name] = QueryTemplate(name, text)
+    return templates[name]
+
+
+def run(tx, name, identifiers=None, **parameters):
+    """
+    Runs a registered query and returns all its records.
+
+    :param tx: neo4j transaction
+    :param name: name of the template
+    :param identifiers: dictionary of labels and attribute names for the template placeholders
+    :param parameters: query parameters
+
+    :return: List of records as lists of values
+    """
+    template = templates[name]
+    statement = template.statement(identifiers or {})
+    start = time.perf_counter()
+    result = getattr(tx, "inner", tx).run(statement, **parameters)
+    records = result.values()
+    seconds = time.perf_counter() - start
+    template.record(statement, seconds)
+    if instrument.enabled:
+        instrument.record(name, seconds, len(records), instrument.server_seconds(result))
+    return records
+
+
+def stats():
+    """
+    Calls, total time and plan reuse for each template that has been run since the last reset. Reuse is the fraction
+    of calls which sent a statement text already sent before in that time, the best plan cache hit rate the server can
+    achieve for that template.
+
+    :return: dictionary of template name to dictionary of "calls", "seconds", "statements" and "reuse"
+    """
+    results = {}
+    for name, template in templates.items():
+        with template.lock:
+            calls, seconds, sent = template.calls, template.seconds, len(template.sent)
+        if calls:
+            results[name] = {"calls": calls, "seconds": seconds, "statements": sent,
+                             "reuse": min(1.0, max(0.0, 1 - sent / calls))}
+    return results
+
+
+def reset():
+    """
+    Zero the call counts, timings and statements sent, eg. between runs. Compiled statements are kept.
+
+    :return: None
+    """
+    for template in templates.values():
+        with template.lock:
+            template.sent = set()
+            template.calls = 0
+            template.seconds = 0.0
+
+
+register("perception", "MATCH (m:Agent)-[s:LOCATED]->(n:Node) "
+                       "WITH n, m "
+                       "WHERE m.id={agent} "
+                       "MATCH (n)-[r:REACHES]->(a) "
+                       "RETURN n, r, a")
+register("nodeperception", "MATCH (n:Node)-[r:REACHES]->(a) "
+                           "WHERE n.$uid = {id} "
+                           "RETURN n, r, a")
+register("locateagent", "MATCH (m:Agent)-[s:LOCATED]->(n:Node) "
+                        "WHERE m.id={agent} "
+                        "RETURN n")
+register("updatecontactedge", "MATCH (a$label_a)-[r:SOCIAL]->(b$label_b) "
+                              "WHERE a.id={node_a} and b.id={node_b} "
+                              "SET r.$attribute={value}")
+register("deletecontact", "MATCH (a$label_a)-[r$contact_type]->(b$label_b) "
+                          "WHERE a.id={node_a} and b.id={node_b} "
+                          "DELETE r RETURN COUNT(r)")
+register("agentcontacts", "MATCH (a$label)-[r:SOCIAL]->(b$contact_label) "
+                          "WHERE a.id={node_a} "
+                          "RETURN r, b")
+register("socialedges", "MATCH (a)-[r:SOCIAL]->(b) "
+                        "RETURN a.id, labels(a), b.id, labels(b), r, b")
+register("locations", "MATCH (a:Agent)-[s:LOCATED]->(n:Node) "
+                      "RETURN id(n), a")
+register("colocated", "MATCH (m:Agent)-[s:LOCATED]->(n:Node) "
+                      "WITH n "
+                      "WHERE m.id={agent} "
+                      "MATCH (a:Agent)-[s:LOCATED]->(n:Node) "
+                      "RETURN a")
+register("getnode", "MATCH (n$label) "
+                    "WHERE n.$uid = {id} "
+                    "RETURN n")
+register("getnodeagents", "MATCH (a)-[r:LOCATED]->(n) "
+                          "WHERE n.$uid = {id} "
+                          "RETURN a")
+register("getnodevalue", "MATCH (a$label) "
+                         "WHERE a.$uid = {node} "
+                         "RETURN a.$value")
+register("getrunname", "MATCH (a:Tag) "
+                       "RETURN a.tag")
+register("gettime", "MATCH (a:Clock) "
+                    "RETURN a.time")
+register("tick", "MATCH (a:Clock) "
+                 "SET a.time = a.time + 1 "
+                 "RETURN a.time")
+register("adjacency", "MATCH (a$node_label)-[r$edge_label]->(b$node_label) "
+                      "RETURN a.id, b.id")
+register("updateedge", "MATCH (a:Node)-[r:REACHES]->(b:Node) "
+                       "WHERE a.$uid={start} AND b.$uid={end} "
+                       "SET r.$attr={val}")
+register("updatenode", "MATCH (a$label) "
+                       "WHERE a.$uid={node} "
+                       "SET a.$attr={value}")
+register("updateagent", "MATCH (a:Agent) "
+                        "WHERE a.$uid={node} "
+                        "SET a.$attr={value}")
+register("deleteagent", "MATCH (n:Agent) "
+                        "WHERE n.$uid={ID} "
+                        "DETACH DELETE n")
+register("addagent", "MATCH (n:Node) "
+                     "WHERE n.$uid = {node} "
+                     "CREATE (a$label)-[r:LOCATED]->(n) "
+                     "SET a = {params}")
+register("addagents", "MATCH (n:Node) "
+                      "WHERE n.$uid = {node} "
+                      "UNWIND {agents} AS params "
+                      "CREATE (a$label)-[r:LOCATED]->(n) "
+                      "SET a = params")
+register("nextids", "MATCH (s:Sequence) "
+                    "WHERE s.label = {label} "
+                    "SET s.next = s.next + {count} "
+                    "RETURN s.next - {count}")
+register("highestid", "MATCH (a$label) "
+                      "RETURN max(a.id)")
+register("createsequence", "MERGE (s:Sequence {label: {label}}) "
+                           "ON CREATE SET s.next = {first} "
+                           "SET s.next = s.next + {count} "
+                           "RETURN s.next - {count}")
+register("createedge", "MATCH (a$label_a) WHERE a.id={node_a} "
+                       "WITH a MATCH (b$label_b) WHERE b.id={node_b} "
+                       "CREATE (a)-[n$edge_label]->(b) "
+                       "SET n = {parameters} RETURN COUNT(n)")
+register("moveagent", "MATCH (n:Agent) WHERE n.id = {id} "
+                      "OPTIONAL MATCH (n)-[r:LOCATED]->() "
+                      "DELETE r "
+                      "WITH n "
+                      "MATCH (a:Node) WHERE a.$nuid = {new} "
+                      "CREATE (n)-[:LOCATED]->(a)")
+register("moveagents", "UNWIND {moves} AS m "
+                       "MATCH (n:Agent) WHERE n.id = m.id "
+                       "OPTIONAL MATCH (n)-[r:LOCATED]->() "
+                       "DELETE r "
+                       "WITH n, m "
+                       "MATCH (a:Node) WHERE a.$nuid = m.new "
+                       "CREATE (n)-[:LOCATED]->(a)")
+register("agentids", "MATCH (a$label) "
+                     "RETURN a.id")
+register("addnode", "CREATE (a$label) "
+                    "SET a = {params}")
+register("cleardatabase", "MATCH (a) "
+                          "DETACH DELETE a")
+register("clearedgechunk", "MATCH ()-[r]->() "
+                           "WITH r LIMIT {batch} "
+                           "DELETE r "
+                           "RETURN count(*)")
+register("clearchunk", "MATCH (a) "
+                       "WITH a LIMIT {batch} "
+                       "DETACH DELETE a "
+                       "RETURN count(*)")
+register("graphnodes", "MATCH (a) "
+                       "RETURN id(a), labels(a), properties(a)")
+register("graphedges", "MATCH (a)-[r]->(b) "
+                       "RETURN id(a), id(b), type(r), properties(r)")
+register("restorenodes", "UNWIND {nodes} AS n "
+                         "CREATE (a:Checkpoint$labels) "
+                         "SET a = n.properties, a._checkpoint = n.key")
+register("restoreedges", "UNWIND {edges} AS e "
+                         "MATCH (a:Checkpoint) WHERE a._checkpoint = e.start "
+                         "MATCH (b:Checkpoint) WHERE b._checkpoint = e.end "
+                         "CREATE (a)-[r$type]->(b) "
+                         "SET r = e.properties")
+register("finishrestore", "MATCH (a:Checkpoint) "
+                          "REMOVE a:Checkpoint, a._checkpoint")
+register("createindex", "CREATE INDEX ON $label($attr)")
+register("createconstraint", "CREATE CONSTRAINT ON (a$label) "
+                             "ASSERT a.$attr IS UNIQUE")
+register("indexes", "CALL db.indexes() "
+                    "YIELD tokenNames, properties "
+                    "RETURN tokenNames, properties")
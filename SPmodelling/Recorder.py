@@ -0,0 +1,119 @@
+import os
+import numpy
+
+
+class Recorder:
+    """
+    Streams monitor snapshots to disk as they are taken. Rows are held in a bounded buffer and written as numbered
+    .npz chunks with one array per column, each chunk is written to a temporary file and renamed into place so a crash
+    loses at most the rows still in the buffer. Reopening a directory continues after the chunks already there.
+    """
+
+    def __init__(self, path, buffer=100):
+        """
+        :param path: directory for the chunk files, created if missing
+        :param buffer: rows held in memory before a chunk is written, 1 to write every snapshot
+        """
+        self.path = path
+        self.buffer = max(1, buffer)
+        self.columns = {}
+        self.rows = 0
+        os.makedirs(path, exist_ok=True)
+        self.chunk = len(chunks(path))
+
+    def append(self, row):
+        """
+        Add a row to the buffer, writing a chunk when the buffer is full.
+
+        :param row: dictionary of column name to value, values in a column should have the same shape
+
+        :return: None
+        """
+        for column in set(self.columns) | set(row):
+            self.columns.setdefault(column, [None] * self.rows).append(row.get(column))
+        self.rows = self.rows + 1
+        if self.rows >= self.buffer:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered rows as the next chunk.
+
+        :return: None
+        """
+        if not self.rows:
+            return
+        name = os.path.join(self.path, "chunk%06d.npz" % self.chunk)
+        with open(name + ".tmp", "wb") as f:
+            numpy.savez(f, **{column: _column(values) for column, values in self.columns.items()})
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(name + ".tmp", name)
+        self.chunk = self.chunk + 1
+        self.columns = {}
+        self.rows = 0
+
+    def close(self):
+        """
+        Writes any rows left in the buffer.
+
+        :return: None
+        """
+        self.flush()
+
+
+def _column(values):
+    """
+    Array for a buffered column, falling back to an object array for values of differing shape or type.
+    """
+    try:
+        array = numpy.array(values)
+    except ValueError:
+        array = None
+    if array is None or array.dtype == object:
+        array = numpy.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            array[i] = value
+    return array
+
+
+def chunks(path):
+    """
+    Chunk files written to a directory, in the order they were written.
+
+    :param path: recorder directory
+
+    :return: list of file paths
+    """
+    if not os.path.isdir(path):
+        return []
+    return [os.path.join(path, name) for name in sorted(os.listdir(path))
+            if name.startswith("chunk") and name.endswith(".npz")]
+
+
+def read(path, columns=None):
+    """
+    Reads the recorded columns back, eg. for plotting after a run.
+
+    :param path: recorder directory
+    :param columns: names of the columns wanted, all columns if None
+
+    :return: dictionary of column name to array of every recorded value
+    """
+    parts = {}
+    for name in chunks(path):
+        with numpy.load(name, allow_pickle=True) as chunk:
+            for column in chunk.files:
+                if columns is None or column in columns:
+                    parts.setdefault(column, []).append(chunk[column])
+    return {column: _concatenate(arrays) for column, arrays in parts.items()}
+
+
+def _concatenate(arrays):
+    """
+    Joins a column's chunks, as an object array of rows if their shapes differ, eg. when the first record was None.
+    """
+    try:
+        return numpy.concatenate(arrays)
+    except ValueError:
+        return _column([row for array in arrays for row in array])
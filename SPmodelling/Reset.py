@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 from abc import ABC, abstractmethod
-from neo4j import GraphDatabase
+import SPmodelling.Backend as backend
+import SPmodelling.Checkpoint as checkpoint
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Interface as intf
 
 
 class Reset(ABC):
@@ -22,11 +25,22 @@ class Reset(ABC):
 
         :return: None
         """
+        intf.addnode(tx, "Tag", {"tag": self.runname(run_number, pop_size, run_length)})
+        print("set output")
+
+    def runname(self, run_number, pop_size, run_length):
+        """
+        Name of a run, used for the Tag node and output files
+
+        :param run_number: run number
+        :param pop_size: size of initial population
+        :param run_length: number of time steps in run
+
+        :return: run name string
+        """
         import specification
-        tag = specification.specname + "_" + self.reset_name + "_" + str(pop_size) + "_" + str(run_length) + "_" + str(
+        return specification.specname + "_" + self.reset_name + "_" + str(pop_size) + "_" + str(run_length) + "_" + str(
             run_number)
-        tx.run("CREATE (a:Tag {tag:{tag}})", tag=tag)
-        print("set output")
 
     @staticmethod
     def clear_database(tx):
@@ -37,12 +51,48 @@ class Reset(ABC):
 
         :return: NOne
         """
-        tx.run("MATCH ()-[r]->() "
-               "DELETE r")
-        tx.run("MATCH (a) "
-               "DELETE a")
+        intf.cleardatabase(tx)
         print("clear database")
 
+    @staticmethod
+    def clear_database_chunked(ses, batch_size=10000):
+        """
+        Remove all relationships and then all nodes in transactions of at most batch_size deletions, so clearing a large
+        graph uses bounded transaction memory however many relationships its nodes have. Prints progress after each
+        chunk.
+
+        :param ses: neo4j session
+        :param batch_size: maximum relationships or nodes deleted per transaction
+
+        :return: total number of relationships and nodes deleted
+        """
+        total = 0
+        deleted = ses.write_transaction(intf.clearchunk, batch_size)
+        while deleted:
+            total = total + deleted
+            print("clear database: " + str(total) + " nodes and relationships deleted")
+            deleted = ses.write_transaction(intf.clearchunk, batch_size)
+        print("clear database")
+        return total
+
+    @staticmethod
+    def clear_database_drop(ses, batch_size=10000):
+        """
+        Drop and recreate the graph where the backend supports it, which the in-memory store does by discarding its
+        contents. Other backends fall back to a chunked clear.
+
+        :param ses: neo4j session
+        :param batch_size: chunk size for the fallback
+
+        :return: None
+        """
+        if backend.name() == "memory":
+            ses.write_transaction(intf.cleardatabase)
+            print("clear database")
+        else:
+            print("clear database: drop not supported by " + backend.name() + " backend, clearing in chunks")
+            Reset.clear_database_chunked(ses, batch_size)
+
     @staticmethod
     def set_clock(tx):
         """
@@ -52,7 +102,8 @@ class Reset(ABC):
 
         :return: None
         """
-        tx.run("CREATE (a:Clock {time:0})")
+        intf.addnode(tx, "Clock", {"time": 0})
+        clocksignal.signal.publish(0)
 
     @staticmethod
     @abstractmethod
@@ -82,7 +133,9 @@ class Reset(ABC):
     @abstractmethod
     def generate_population(tx, pop_size):
         """
-        Subclass must implement this to set up the initial population of the run
+        Subclass must implement this to set up the initial population of the run. For large populations call the agent
+        class's bulkgenerator with a subclass override that inserts the agents with Interface.addagents. The base
+        bulkgenerator still calls generator once per agent, so it writes one agent at a time.
 
         :param tx: neo4j write transaction
         :param pop_size: number of agents to add to system
@@ -92,26 +145,96 @@ class Reset(ABC):
         pass
 
 
-def main(rn, ps, rl):
+def lookups():
+    """
+    Node lookups made by the Interface which should be served by an index: agent ids and the labels of the id
+    Sequence nodes, both with a uniqueness constraint, the id field of each Node class in specification.nodes (nuid)
+    and any extra (label, attribute) pairs listed in specification.indexes.
+
+    :return: List of (label, attribute, unique) tuples
+    """
+    import specification
+    wanted = [("Agent", "id", True), ("Sequence", "label", True)]
+    for nuid in sorted({node.nuid for node in getattr(specification, "nodes", [])}):
+        wanted.append(("Node", nuid, False))
+    for label, attr in getattr(specification, "indexes", []):
+        wanted.append((label, attr, False))
+    return wanted
+
+
+def provision_indexes(ses, wanted):
+    """
+    Creates the indexes and constraints for any lookups not already indexed, each in its own schema transaction.
+
+    :param ses: neo4j session
+    :param wanted: List of (label, attribute, unique) tuples
+
+    :return: List of (label, attribute) pairs that were created
+    """
+    existing = ses.read_transaction(intf.indexes)
+    created = []
+    for label, attr, unique in wanted:
+        if (label, attr) not in existing and (label, attr) not in created:
+            ses.write_transaction(intf.createindex, label, attr, unique)
+            created.append((label, attr))
+    return created
+
+
+def unindexed(ses, wanted):
+    """
+    Reports lookups which still have no index, eg. because creating the index failed or it was dropped.
+
+    :param ses: neo4j session
+    :param wanted: List of (label, attribute, unique) tuples
+
+    :return: List of (label, attribute) pairs without an index
+    """
+    existing = ses.read_transaction(intf.indexes)
+    missing = [(label, attr) for label, attr, unique in wanted if (label, attr) not in existing]
+    for label, attr in missing:
+        print("Unindexed lookup: " + label + "." + attr)
+    return missing
+
+
+def main(rn, ps, rl, start=None):
     """
-    Runs the rest class functions to  set up database for a run
+    Runs the rest class functions to  set up database for a run. The database is cleared according to
+    specification.clear_strategy: "single" (default) in one transaction, "chunked" in transactions of
+    specification.clear_batch nodes, or "drop" to discard the whole graph where the backend allows. Indexes for the
+    Interface lookups are created after the database is cleared and any still missing are reported once the population
+    is in place. Given a checkpoint file the run starts from the checkpointed state instead of the reset functions,
+    renamed for this run.
 
     :param rn: Number of run of the model
     :param ps: size of population
     :param rl: number of time steps in each run
+    :param start: checkpoint file to start the run from, None to reset
 
     :return: None
     """
     import specification
     print("running rest")
-    dri = GraphDatabase.driver(specification.database_uri, auth=specification.Reset_auth, max_connection_lifetime=2000)
     print("In code")
-    with dri.session() as ses:
+    with backend.session(specification.Reset_auth) as ses:
         reset = specification.Reset.Reset()
-        ses.write_transaction(reset.clear_database)
-        ses.write_transaction(reset.set_output, rn, ps, rl)
-        ses.write_transaction(reset.set_clock)
-        ses.write_transaction(reset.set_nodes)
-        ses.write_transaction(reset.set_edges)
-        ses.write_transaction(reset.generate_population, ps)
-    dri.close()
+        strategy = getattr(specification, "clear_strategy", "single")
+        if strategy == "chunked":
+            reset.clear_database_chunked(ses, getattr(specification, "clear_batch", 10000))
+        elif strategy == "drop":
+            reset.clear_database_drop(ses, getattr(specification, "clear_batch", 10000))
+        else:
+            ses.write_transaction(reset.clear_database)
+        wanted = lookups()
+        provision_indexes(ses, wanted)
+        if start:
+            checkpoint.restore(ses, start, getattr(specification, "clear_batch", 10000))
+            ses.write_transaction(intf.updatenode, ses.read_transaction(intf.getrunname), "tag",
+                                  reset.runname(rn, ps, rl), "tag", "Tag")
+        else:
+            checkpoint.discard()
+            ses.write_transaction(reset.set_output, rn, ps, rl)
+            ses.write_transaction(reset.set_clock)
+            ses.write_transaction(reset.set_nodes)
+            ses.write_transaction(reset.set_edges)
+            ses.write_transaction(reset.generate_population, ps)
+        unindexed(ses, wanted)
@@ -1,46 +1,138 @@
-# import SPmodelling
+import SPmodelling
 import concurrent.futures
+import multiprocessing
+import time
 print("finished spm imports")
 
 
-def main(runs, length, population, modules=None):
+def run(rn, length, population, modules=None, checkpoint=None):
+    """
+    Runs a single model run: resets the database then runs the requested modules concurrently, one thread per module,
+    until the clock reaches the run length. With instrument set in specification, query counts and times are recorded
+    per tick, module and Interface function, written to <run name>.trace.jsonl in instrument_path and printed as a
+    summary table. Set orchestrator = "asyncio" in specification to run the modules as tasks on an event loop instead,
+    see Orchestrator.run, or orchestrator = "phases" to run them in a fixed order within each tick, see Scheduler.main.
+
+    :param rn: Run number
+    :param length: Time-step length of the run
+    :param population: Size of initial and maintained population
+    :param modules: List of modules to be used in this run eg. ['Monitor', 'Flow', 'Population', 'Balancer',
+                    'Structure', 'Social']
+    :param checkpoint: checkpoint file to start the run from instead of resetting, eg. a shared burn-in state
+
+    :return: dictionary with the run number, run name, final clock time and wall time in seconds
+    """
+    import specification
+    if getattr(specification, "orchestrator", "threads") == "asyncio":
+        import asyncio
+        return asyncio.run(SPmodelling.Orchestrator.run(rn, length, population, modules, checkpoint))
+    start = time.time()
+    instrumented = getattr(specification, "instrument", False)
+    SPmodelling.Instrument.enable(instrumented)
+    SPmodelling.Instrument.reset()
+    with SPmodelling.Instrument.step("Reset", 0):
+        SPmodelling.Reset.main(rn, population, length, checkpoint)
+    print("Finished Reset")
+    if modules and getattr(specification, "orchestrator", "threads") == "phases":
+        SPmodelling.Scheduler.main(length, population, modules)
+    elif modules:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(modules))
+        futures = []
+        if "Monitor" in modules:
+            futures.append(executor.submit(SPmodelling.Monitor.main, length))
+        if "Population" in modules:
+            futures.append(executor.submit(SPmodelling.Population.main, length, population))
+        if "Structure" in modules:
+            futures.append(executor.submit(SPmodelling.Structure.main, length))
+        if "Balancer" in modules:
+            futures.append(executor.submit(SPmodelling.Balancer.main, length))
+        if "Flow" in modules:
+            print("Executing Flow")
+            futures.append(executor.submit(SPmodelling.Flow.main, length, rn))
+        if "Social" in modules:
+            print("Executing Social")
+            futures.append(executor.submit(SPmodelling.Social.main, length, rn))
+        executor.shutdown()
+        for future in futures:
+            future.result()
+    with SPmodelling.Backend.session(specification.Reset_auth) as ses:
+        runname = ses.read_transaction(SPmodelling.Interface.getrunname)
+        clock = ses.read_transaction(SPmodelling.Interface.gettime)
+    if instrumented:
+        SPmodelling.Instrument.enable(False)
+        SPmodelling.Instrument.save(runname)
+    return {"run": rn, "name": runname, "time": clock, "seconds": time.time() - start}
+
+
+def _isolate(uris):
+    """
+    Process pool initializer. Gives the worker its own connection pool and, for neo4j, claims one of the databases in
+    specification.database_uris so no two workers share a graph. Workers on the memory backend each have their own
+    in-process store.
+
+    :param uris: queue of database uris, None for the memory backend
+
+    :return: None
+    """
+    import specification
+    SPmodelling.Backend.pool = SPmodelling.Backend.ConnectionPool()
+    if uris is not None:
+        specification.database_uri = uris.get()
+
+
+def _databases(processes):
+    """
+    Queue of database uris for the workers of a process pool, one each from specification.database_uris on neo4j.
+
+    :param processes: number of worker processes
+
+    :return: multiprocessing queue of uris, None for the memory backend
+    """
+    import specification
+    if SPmodelling.Backend.name() == "memory":
+        return None
+    databases = getattr(specification, "database_uris", [])
+    if len(databases) < processes:
+        raise ValueError("Parallel runs on neo4j need a separate database per process, "
+                         "specification.database_uris has " + str(len(databases)) + " for " +
+                         str(processes) + " processes")
+    uris = multiprocessing.Queue()
+    for uri in databases[:processes]:
+        uris.put(uri)
+    return uris
+
+
+def main(runs, length, population, modules=None, processes=None, checkpoint=None):
     """
     This function takes the number of runs required, the time-step length of each run and the size of population and
     runs a SPmodel based on the local specification file. It saves all output to a run name as defined by the parameters
     given and the specification. This uses concurrent.futures to run the Monitor, Population, Structure, Balancer and
-    Flow concurrently.
+    Flow concurrently. With processes set, independent runs are spread over a pool of worker processes, each against
+    its own graph: the in-process store for the memory backend, or one of the databases listed in
+    specification.database_uris for neo4j.
 
     :param runs: Number of models runs required
     :param length: Time-step length of each run
     :param population: Size of initial and maintained population for each run
     :param modules: List of modules to be used in this modelling batch eg. ['Monitor', 'Flow', 'Population', 'Balancer',
                     'Structure', 'Social']
+    :param processes: Number of runs to execute at once in separate processes, None runs them one after another
+    :param checkpoint: checkpoint file every run starts from instead of resetting
 
-    :return: None
+    :return: List of results from run, one per run in run number order
     """
-    for i in range(runs):
-        SPmodelling.Reset.main(i, population, length)
-        print("Finished Reset")
-        if modules:
-            executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
-            if "Monitor" in modules:
-                executor.submit(SPmodelling.Monitor.main, length)
-            if "Population" in modules:
-                executor.submit(SPmodelling.Population.main, length, population)
-            if "Structure" in modules:
-                executor.submit(SPmodelling.Structure.main, length)
-            if "Balancer" in modules:
-                executor.submit(SPmodelling.Balancer.main, length)
-            if "Flow" in modules:
-                print("Executing Flow")
-                # SPmodelling.Flow.main(length, i)
-                executor.submit(SPmodelling.Flow.main, length, i)
-            if "Social" in modules:
-                print("Executing Social")
-                # SPmodelling.Social.main(length, i)
-                executor.submit(SPmodelling.Social.main, length)
-            executor.shutdown()
+    results = []
+    if processes and processes > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=_isolate,
+                                                    initargs=(_databases(processes),)) as executor:
+            futures = [executor.submit(run, i, length, population, modules, checkpoint) for i in range(runs)]
+            results = [future.result() for future in futures]
+    else:
+        for i in range(runs):
+            results.append(run(i, length, population, modules, checkpoint))
+    SPmodelling.Backend.close()
     print("Main thread exit")
+    return results
 
 
 # if __name__ == '__main__':
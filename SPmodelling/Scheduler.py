@@ -0,0 +1,225 @@
+import concurrent.futures
+import contextlib
+import SPmodelling.Backend as backend
+import SPmodelling.Checkpoint as checkpoint
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Instrument as instrument
+import SPmodelling.Interface as intf
+
+phases = {"Structure": [], "Balancer": ["Structure"], "Flow": ["Balancer"], "Social": ["Flow"],
+          "Population": ["Social"], "Monitor": ["Population"]}
+
+
+class Phase:
+    """
+    One module's work in a tick: its step function run once per tick on the module's own session.
+    """
+
+    def __init__(self, name, auth, run, finish=None, max_connection_lifetime=2000):
+        """
+        :param name: module name
+        :param auth: module credentials from specification
+        :param run: function of the session and clock doing the module's work for one tick
+        :param finish: function of the session called once at the end of the run, None if there is nothing to close
+        :param max_connection_lifetime: passed to the neo4j driver
+        """
+        self.name = name
+        self.auth = auth
+        self.run = run
+        self.finish = finish
+        self.max_connection_lifetime = max_connection_lifetime
+        self.after = set()
+        self.ses = None
+
+    def __call__(self, clock):
+        with instrument.step(self.name, clock):
+            self.run(self.ses, clock)
+
+
+def dependencies(modules, order=None):
+    """
+    Phases each module waits for within a tick. A module waiting for one that is not in the run waits for that
+    module's own dependencies instead, so Flow still follows Structure in a run without Balancer.
+
+    :param modules: names of the modules in the run
+    :param order: dictionary of module name to the names it follows, phases by default
+
+    :return: dictionary of module name to the set of modules in the run it waits for
+    """
+    order = phases if order is None else order
+    unknown = [name for name in modules if name not in order]
+    if unknown:
+        raise ValueError("No phase declared for " + ", ".join(unknown))
+
+    def resolve(name, seen):
+        if name in seen:
+            raise ValueError("Phase order has a cycle through " + name)
+        found = set()
+        for before in order.get(name, []):
+            if before in modules:
+                found.add(before)
+            else:
+                found |= resolve(before, seen | {name})
+        return found
+
+    after = {name: resolve(name, set()) for name in modules}
+    levels(after)
+    return after
+
+
+def levels(after):
+    """
+    Groups phases into levels where each phase only waits for phases in earlier levels.
+
+    :param after: dictionary of module name to the modules it waits for
+
+    :return: list of lists of module names, sorted within each level
+    """
+    remaining = dict(after)
+    placed = set()
+    result = []
+    while remaining:
+        level = sorted(name for name, before in remaining.items() if before <= placed)
+        if not level:
+            raise ValueError("Phase order has a cycle through " + ", ".join(sorted(remaining)))
+        for name in level:
+            del remaining[name]
+        placed.update(level)
+        result.append(level)
+    return result
+
+
+def build(modules, population):
+    """
+    Sets up the phase for each module in the run.
+
+    :param modules: names of the modules in the run
+    :param population: size of maintained population
+
+    :return: dictionary of module name to Phase
+    """
+    import specification
+    import SPmodelling.Balancer
+    import SPmodelling.Flow
+    import SPmodelling.Population
+    import SPmodelling.Social
+    import SPmodelling.Structure
+    built = {}
+    if "Structure" in modules:
+        built["Structure"] = Phase("Structure", specification.Structure_auth,
+                                   lambda ses, clock: SPmodelling.Structure.step(ses))
+    if "Balancer" in modules:
+        flowreaction = specification.Balancer.FlowReaction()
+        built["Balancer"] = Phase("Balancer", specification.Balancer_auth,
+                                  lambda ses, clock: SPmodelling.Balancer.step(ses, flowreaction))
+    if "Flow" in modules:
+        batch = getattr(specification, "batch_moves", None)
+        shardexecutor = SPmodelling.Flow.shardexecutor(batch)
+
+        def finishflow(ses):
+            if shardexecutor is not None:
+                shardexecutor.shutdown()
+
+        built["Flow"] = Phase("Flow", specification.Flow_auth,
+                              lambda ses, clock: SPmodelling.Flow.step(ses, batch, shardexecutor), finishflow)
+    if "Social" in modules:
+        size = getattr(specification, "social_chunk", None)
+        workers = getattr(specification, "social_workers", 1)
+        strategy = getattr(specification, "social_conflicts", "retry")
+        retries = getattr(specification, "social_retries", 3)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+
+        def finishsocial(ses):
+            if executor is not None:
+                executor.shutdown()
+
+        built["Social"] = Phase("Social", specification.Flow_auth,
+                                lambda ses, clock: SPmodelling.Social.step(ses, executor, size, strategy, retries),
+                                finishsocial)
+    if "Population" in modules:
+        agent = specification.Agents(None)
+        built["Population"] = Phase("Population", specification.Population_auth,
+                                    lambda ses, clock: SPmodelling.Population.step(ses, agent, population))
+    if "Monitor" in modules:
+        monitor = specification.Monitor()
+        checkpoint.register("Monitor", monitor)
+
+        def finishmonitor(ses):
+            checkpoint.unregister("Monitor")
+            ses.write_transaction(monitor.close)
+            if monitor.recorder:
+                monitor.recorder.close()
+
+        built["Monitor"] = Phase("Monitor", specification.Monitor_auth,
+                                 lambda ses, clock: ses.write_transaction(monitor.snapshot, clock), finishmonitor,
+                                 20000)
+    return built
+
+
+def runtick(executor, built, clock):
+    """
+    Runs every phase once. A phase starts as soon as the phases it waits for have finished, so independent phases run
+    at the same time on the executor. Returns when all have finished.
+
+    :param executor: concurrent.futures executor, None to run the phases one at a time in level order
+    :param built: dictionary of module name to Phase with its after set
+    :param clock: current time
+
+    :return: None
+    """
+    if executor is None:
+        for level in levels({name: phase.after for name, phase in built.items()}):
+            for name in level:
+                built[name](clock)
+        return
+    done = set()
+    waiting = dict(built)
+    running = {}
+    while waiting or running:
+        for name in sorted(name for name, phase in waiting.items() if phase.after <= done):
+            running[executor.submit(waiting.pop(name), clock)] = name
+        finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in finished:
+            done.add(running.pop(future))
+            future.result()
+
+
+def main(rl, ps, modules):
+    """
+    Runs the modules as phases of each tick until the clock reaches the run length. Within a tick each module runs
+    once, after the modules it follows in phases, which can be replaced by setting phases in specification to a
+    dictionary of module name to the names it follows. Modules which do not depend on each other run at the same
+    time, on as many threads as the widest level of the order needs. The clock is ticked once all phases have finished,
+    so every module sees every tick. Checkpoints are written after the tick when checkpoint_interval is set in
+    specification.
+
+    :param rl: run length
+    :param ps: population size
+    :param modules: names of the modules in the run
+
+    :return: None
+    """
+    import specification
+    after = dependencies(modules, getattr(specification, "phases", None))
+    width = max(len(level) for level in levels(after))
+    built = build(modules, ps)
+    for name, phase in built.items():
+        phase.after = after[name]
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=width) if width > 1 else None
+    try:
+        with contextlib.ExitStack() as stack:
+            for phase in built.values():
+                phase.ses = stack.enter_context(backend.session(phase.auth, phase.max_connection_lifetime))
+                if phase.finish is not None:
+                    stack.callback(phase.finish, phase.ses)
+            with backend.session(specification.Reset_auth) as ses:
+                clock = ses.read_transaction(intf.gettime)
+                while clock < rl:
+                    runtick(executor, built, clock)
+                    clock = clocksignal.tick(ses)
+                    checkpoint.due(ses, clock)
+                    print("T: " + clock.__str__())
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print("Scheduler closed")
@@ -1,31 +1,196 @@
-from neo4j import GraphDatabase
-# import SPmodelling.Interface as intf
-import specification
+import concurrent.futures
+import contextvars
+import random
+import time
+import SPmodelling.Backend as backend
+import SPmodelling.Cache as cache
+import SPmodelling.Instrument as instrument
+import SPmodelling.Interface as intf
+
+
+def conflicts():
+    """
+    Exceptions raised when two concurrent transactions touch the same nodes or edges, eg. a neo4j deadlock.
+
+    :return: tuple of exception classes, empty for the memory backend where write transactions never overlap
+    """
+    if backend.name() == "memory":
+        return ()
+    from neo4j.exceptions import TransientError
+    return (TransientError,)
+
+
+def chunks(agents, size):
+    """
+    Splits agent ids into chunks socialised in one transaction each.
+
+    :param agents: list of agent ids
+    :param size: agents per chunk, None for a single chunk
+
+    :return: list of lists of agent ids
+    """
+    if not size:
+        return [agents] if agents else []
+    return [agents[i:i + size] for i in range(0, len(agents), size)]
+
+
+def socialisechunk(tx, agents):
+    """
+    Calls socialise for each agent in a chunk.
+
+    :param tx: neo4j write transaction
+    :param agents: list of agent ids
+
+    :return: None
+    """
+    import specification
+    for agent in agents:
+        specification.Agent(agent).socialise(tx)
+
+
+def runchunk(agents, strategy="retry", retries=3):
+    """
+    Socialises a chunk in its own transaction on a pooled session. With the retry strategy a conflicting chunk is
+    rolled back and run again after a short random wait, up to retries times. With the serialise strategy it is
+    given up on at the first conflict so it can be run after the concurrent chunks have finished. On neo4j the chunk
+    runs in an explicit transaction as write_transaction would retry the conflict itself before either strategy saw it.
+
+    :param agents: list of agent ids
+    :param strategy: "retry" or "serialise"
+    :param retries: maximum reruns of a conflicting chunk with the retry strategy
+
+    :return: True if the chunk was committed, False if it conflicted and should be serialised
+    """
+    import specification
+    errors = conflicts()
+    with backend.session(specification.Flow_auth) as ses:
+        attempt = 0
+        if backend.name() == "memory":
+            ses.write_transaction(socialisechunk, agents)
+            return True
+        while True:
+            try:
+                with ses.begin_transaction() as tx:
+                    socialisechunk(tx, agents)
+                    tx.commit()
+                return True
+            except errors:
+                if strategy == "serialise":
+                    return False
+                if attempt >= retries:
+                    raise
+                attempt = attempt + 1
+                time.sleep(random.uniform(0, 0.05 * attempt))
+
+
+def step(ses, executor, size=None, strategy="retry", retries=3):
+    """
+    Socialises every agent once: agents are split into chunks which run concurrently on the executor, then any chunks
+    that conflicted are run one at a time. Contacts and co-located agents are served from the neighbourhood cache for
+    the current tick while the step runs.
+
+    :param ses: session used to read the agent ids
+    :param executor: concurrent.futures executor running the chunks, None to run them in this thread
+    :param size: agents per chunk, None for a single chunk
+    :param strategy: conflict strategy for chunks touching the same edges, "retry" or "serialise"
+    :param retries: maximum reruns of a conflicting chunk with the retry strategy
+
+    :return: number of chunks serialised after conflicting
+    """
+    if strategy not in ("retry", "serialise"):
+        raise ValueError("Unknown social conflict strategy " + repr(strategy))
+    with cache.neighbourhoods.step(ses.read_transaction(intf.gettime)):
+        agents = ses.read_transaction(intf.agentids)
+        parts = chunks(agents, size)
+        if executor is None:
+            results = [runchunk(part, strategy, retries) for part in parts]
+        else:
+            futures = [executor.submit(contextvars.copy_context().run, runchunk, part, strategy, retries)
+                       for part in parts]
+            results = [future.result() for future in futures]
+        failed = [part for part, done in zip(parts, results) if not done]
+        for part in failed:
+            ses.write_transaction(socialisechunk, part)
+    return len(failed)
+
+
+async def astep(ses, size=None, strategy="retry", retries=3):
+    """
+    Asynchronous version of step, the chunks run concurrently as awaited calls on the event loop's worker threads.
+
+    :param ses: session used to read the agent ids
+    :param size: agents per chunk, None for a single chunk
+    :param strategy: conflict strategy for chunks touching the same edges, "retry" or "serialise"
+    :param retries: maximum reruns of a conflicting chunk with the retry strategy
+
+    :return: number of chunks serialised after conflicting
+    """
+    import asyncio
+    import SPmodelling.Orchestrator as orchestrator
+    if strategy not in ("retry", "serialise"):
+        raise ValueError("Unknown social conflict strategy " + repr(strategy))
+    with cache.neighbourhoods.step(await orchestrator.transaction(ses, intf.gettime, write=False)):
+        agents = await orchestrator.transaction(ses, intf.agentids, write=False)
+        parts = chunks(agents, size)
+        results = await asyncio.gather(*[orchestrator.call(runchunk, part, strategy, retries) for part in parts])
+        failed = [part for part, done in zip(parts, results) if not done]
+        for part in failed:
+            await orchestrator.transaction(ses, socialisechunk, part)
+    return len(failed)
 
 
 def main(rl, rn):
     """
-    Calls the socialise function for each agent in system until clock reaches or exceeds run length
+    Calls the socialise function for each agent in system until clock reaches or exceeds run length. Set social_chunk
+    in specification to bound the agents socialised per transaction, social_workers to run that many chunks at once and
+    social_conflicts to "retry" or "serialise" to choose how chunks which touch the same edges are resolved.
 
     :param rl: run length
     :param rn: run number
 
     :return: None
     """
+    import specification
     verbose = False
-    uri = specification.database_uri
-    dri = GraphDatabase.driver(uri, auth=specification.Flow_auth, max_connection_lifetime=2000)
-    with dri.session() as ses:
+    size = getattr(specification, "social_chunk", None)
+    workers = getattr(specification, "social_workers", 1)
+    strategy = getattr(specification, "social_conflicts", "retry")
+    retries = getattr(specification, "social_retries", 3)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        with backend.session(specification.Flow_auth) as ses:
+            clock = 0
+            while clock < rl:
+                with instrument.step("Social", clock):
+                    step(ses, executor, size, strategy, retries)
+                    clock = ses.read_transaction(intf.gettime)
+                print("T: " + clock.__str__())
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print("Social closed")
+
+
+async def amain(rl, rn):
+    """
+    Asynchronous version of main run as a task by Orchestrator.run. Chunks run on the event loop's worker threads
+    rather than a social_workers pool.
+
+    :param rl: run length
+    :param rn: run number
+
+    :return: None
+    """
+    import specification
+    import SPmodelling.Orchestrator as orchestrator
+    size = getattr(specification, "social_chunk", None)
+    strategy = getattr(specification, "social_conflicts", "retry")
+    retries = getattr(specification, "social_retries", 3)
+    with backend.session(specification.Flow_auth) as ses:
         clock = 0
         while clock < rl:
-            tx = ses.begin_transaction()
-            agents = tx.run("MATCH (a:Agent) "
-                            "RETURN a.id").values()
-            for agent in agents:
-                ag = specification.Agent(agent)
-                ag.socialise(tx)
-            clock = intf.gettime(tx)
+            with instrument.step("Social", clock):
+                await astep(ses, size, strategy, retries)
+                clock = await orchestrator.transaction(ses, intf.gettime, write=False)
             print("T: " + clock.__str__())
-            tx.close()
-    dri.close()
     print("Social closed")
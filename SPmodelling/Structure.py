@@ -1,7 +1,9 @@
-from neo4j import GraphDatabase
-import specification
 from abc import abstractmethod, ABC
-# import SPmodelling.Interface as intf
+import SPmodelling.Backend as backend
+import SPmodelling.Cache as cache
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Instrument as instrument
+import SPmodelling.Paths as paths
 
 
 class Structure(ABC):
@@ -26,6 +28,21 @@ class Structure(ABC):
         pass
 
 
+def step(ses):
+    """
+    Applies structural change once and drops node views and shortest path graphs read before the change, which may
+    have been made with queries outside the Interface.
+
+    :param ses: neo4j session
+
+    :return: None
+    """
+    import specification
+    ses.write_transaction(specification.Structure.applychange)
+    cache.perceptions.clear()
+    paths.service.clear()
+
+
 def main(rl):
     """
     Runs to apply structural change to the system checks continue until clock reaches or exceeds run length
@@ -34,16 +51,30 @@ def main(rl):
 
     :return: None
     """
+    import specification
+    clock = 0
+    with backend.session(specification.Structure_auth) as ses:
+        while clock < rl:
+            with instrument.step("Structure", clock):
+                step(ses)
+            clock = clocksignal.waittick(ses, clock)
+            print(clock)
+
+
+async def amain(rl):
+    """
+    Asynchronous version of main run as a task by Orchestrator.run.
+
+    :param rl: run length
+
+    :return: None
+    """
+    import specification
+    import SPmodelling.Orchestrator as orchestrator
     clock = 0
-    while clock < rl:
-        dri = GraphDatabase.driver(specification.database_uri, auth=specification.Structure_auth,
-                                   max_connection_lifetime=2000)
-        with dri.session() as ses:
-            ses.write_transaction(specification.Structure.applychange)
-            tx = ses.begin_transaction()
-            time = intf.gettime(tx)
-            while clock == time:
-                time = intf.gettime(tx)
-            clock = time
-        print(clock)
-        dri.close()
+    with backend.session(specification.Structure_auth) as ses:
+        while clock < rl:
+            with instrument.step("Structure", clock):
+                await orchestrator.call(step, ses)
+            clock = await orchestrator.waittick(ses, clock)
+            print(clock)
@@ -0,0 +1,210 @@
+import concurrent.futures
+import itertools
+import json
+import os
+import random
+import shutil
+
+
+def grid(**axes):
+    """
+    Full factorial design: one point for every combination of the given values.
+
+    :param axes: name to list of values, population and length set the run's population size and length, any other
+                 name is set in specification for the run, eg. grid(population=[100, 200], alpha=[0.1, 0.5])
+
+    :return: list of dictionaries of name to value
+    """
+    names = sorted(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def sample(count, seed=0, **axes):
+    """
+    Random design of count points.
+
+    :param count: number of points
+    :param seed: random seed, the same seed gives the same design
+    :param axes: name to a list of values to choose from or a (low, high) tuple to draw uniformly from, integers if
+                 both bounds are integers, see grid for names
+
+    :return: list of dictionaries of name to value
+    """
+    generator = random.Random(seed)
+    names = sorted(axes)
+    points = []
+    for i in range(count):
+        point = {}
+        for name in names:
+            axis = axes[name]
+            if isinstance(axis, tuple):
+                low, high = axis
+                if isinstance(low, int) and isinstance(high, int):
+                    point[name] = generator.randint(low, high)
+                else:
+                    point[name] = generator.uniform(low, high)
+            else:
+                point[name] = generator.choice(axis)
+        points.append(point)
+    return points
+
+
+def runid(index, repeat):
+    """
+    Name of a run in a sweep, used for its record directory.
+
+    :param index: index of the point in the design
+    :param repeat: repeat number of the point
+
+    :return: run id string
+    """
+    return "p%06d_r%03d" % (index, repeat)
+
+
+def _runpoint(index, repeat, repeats, point, length, population, modules, path, checkpoint):
+    """
+    Runs one point of a sweep in this process. The point's specification parameters are set for the run and put back
+    afterwards, as workers run many points. Monitor records go to the run's own directory in path/records.
+    """
+    import specification
+    import SPmodelling.SPm
+    settings = {name: value for name, value in point.items() if name not in ("population", "length")}
+    records = os.path.join(path, "records", runid(index, repeat))
+    shutil.rmtree(records, ignore_errors=True)
+    settings.setdefault("record_path", records)
+    settings.setdefault("headless", True)
+    missing = object()
+    saved = {name: getattr(specification, name, missing) for name in settings}
+    try:
+        for name, value in settings.items():
+            setattr(specification, name, value)
+        result = SPmodelling.SPm.run(index * repeats + repeat, point.get("length", length),
+                                     point.get("population", population), modules, checkpoint)
+    finally:
+        for name, value in saved.items():
+            if value is missing:
+                delattr(specification, name)
+            else:
+                setattr(specification, name, value)
+    result["records"] = os.path.join(records, str(result["name"]))
+    return result
+
+
+def completed(path):
+    """
+    Runs of a sweep that have finished, read from path/sweep.jsonl. A line cut short by an interrupted sweep is
+    ignored, its run is repeated on resume.
+
+    :param path: sweep directory
+
+    :return: list of dictionaries with the run id, index, repeat, point and result of each finished run
+    """
+    name = os.path.join(path, "sweep.jsonl")
+    if not os.path.exists(name):
+        return []
+    entries = []
+    with open(name) as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def run(design, length, population, modules=None, path="sweep", processes=None, repeats=1, checkpoint=None):
+    """
+    Runs every point of a design, repeats times each, across a pool of worker processes which each import the model
+    once and run many points. Each finished run is appended to path/sweep.jsonl with its point and result, and its
+    Monitor records are streamed to path/records, see read. Calling run again with the same design and path skips the
+    runs already finished, so an interrupted sweep is resumed. Neo4j workers each claim one of the databases in
+    specification.database_uris, see SPm.main.
+
+    :param design: list of points, eg. from grid or sample
+    :param length: run length for points which do not set length
+    :param population: population size for points which do not set population
+    :param modules: List of modules to be used in each run eg. ['Monitor', 'Flow', 'Population']
+    :param path: sweep directory
+    :param processes: worker processes, the number of CPUs by default, 1 runs the sweep in this process
+    :param repeats: runs of each point, with different run numbers
+    :param checkpoint: checkpoint file every run starts from instead of resetting
+
+    :return: list of the finished run entries, in design order. If any run fails the others are still finished and
+             stored before the first error is raised.
+    """
+    from SPmodelling.SPm import _databases, _isolate
+    os.makedirs(path, exist_ok=True)
+    name = os.path.join(path, "design.json")
+    sweep = {"design": design, "length": length, "population": population, "repeats": repeats}
+    if os.path.exists(name):
+        with open(name) as f:
+            if json.load(f) != json.loads(json.dumps(sweep)):
+                raise ValueError("Sweep directory " + path + " holds a different design, use a new path")
+    else:
+        with open(name + ".tmp", "w") as f:
+            json.dump(sweep, f)
+        os.replace(name + ".tmp", name)
+    done = {entry["run id"] for entry in completed(path)}
+    todo = [(index, repeat) for index in range(len(design)) for repeat in range(repeats)
+            if runid(index, repeat) not in done]
+    processes = max(1, min(processes or os.cpu_count() or 1, len(todo)))
+    with open(os.path.join(path, "sweep.jsonl"), "a+") as manifest:
+        if manifest.tell():
+            manifest.seek(manifest.tell() - 1)
+            if manifest.read(1) != "\n":
+                manifest.write("\n")
+
+        def store(index, repeat, result):
+            entry = {"run id": runid(index, repeat), "index": index, "repeat": repeat, "point": design[index],
+                     "result": result}
+            manifest.write(json.dumps(entry, default=str) + "\n")
+            manifest.flush()
+            os.fsync(manifest.fileno())
+
+        errors = []
+        if processes == 1:
+            for index, repeat in todo:
+                try:
+                    store(index, repeat, _runpoint(index, repeat, repeats, design[index], length, population, modules,
+                                                   path, checkpoint))
+                except Exception as error:
+                    errors.append(error)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=_isolate,
+                                                        initargs=(_databases(processes),)) as executor:
+                futures = {executor.submit(_runpoint, index, repeat, repeats, design[index], length, population,
+                                           modules, path, checkpoint): (index, repeat) for index, repeat in todo}
+                for future in concurrent.futures.as_completed(futures):
+                    index, repeat = futures[future]
+                    try:
+                        store(index, repeat, future.result())
+                    except Exception as error:
+                        errors.append(error)
+        if errors:
+            raise errors[0]
+    return sorted(completed(path), key=lambda entry: (entry["index"], entry["repeat"]))
+
+
+def read(path, columns=None):
+    """
+    Monitor records of every finished run in a sweep joined into one table, with columns for the run id and the
+    point's parameters.
+
+    :param path: sweep directory
+    :param columns: names of the recorded columns wanted, all columns if None
+
+    :return: dictionary of column name to array with a row per record
+    """
+    import numpy
+    from SPmodelling.Recorder import read as readrecords, _column, _concatenate
+    parts = {}
+    entries = sorted(completed(path), key=lambda entry: (entry["index"], entry["repeat"]))
+    for entry in entries:
+        data = readrecords(entry["result"]["records"], columns)
+        rows = max((len(array) for array in data.values()), default=0)
+        data["run id"] = numpy.array([entry["run id"]] * rows)
+        for name, value in entry["point"].items():
+            data[name] = _column([value] * rows)
+        for column, array in data.items():
+            parts.setdefault(column, []).append(array)
+    return {column: _concatenate(arrays) for column, arrays in parts.items()}
@@ -0,0 +1,271 @@
+import heapq
+import os
+import shutil
+import weakref
+from collections.abc import MutableMapping
+
+
+class _Slot(dict):
+    """
+    Agents released at one tick, mapped to their queue entries. Keeps the owning queue's agent index up to date when
+    changed directly, eg. node.queue[time][agent] = [dest, wait].
+    """
+
+    def __init__(self, wheel, tick, entries=()):
+        super().__init__()
+        self.wheel = wheel
+        self.tick = tick
+        self.update(entries)
+
+    def __setitem__(self, agent, entry):
+        if agent not in self:
+            self.wheel._added(self.tick, agent)
+        super().__setitem__(agent, entry)
+
+    def __delitem__(self, agent):
+        super().__delitem__(agent)
+        self.wheel._removed(self.tick, agent)
+
+    def pop(self, agent, *default):
+        if agent in self:
+            entry = super().pop(agent)
+            self.wheel._removed(self.tick, agent)
+            return entry
+        return super().pop(agent, *default)
+
+    def popitem(self):
+        agent, entry = super().popitem()
+        self.wheel._removed(self.tick, agent)
+        return agent, entry
+
+    def setdefault(self, agent, default=None):
+        if agent not in self:
+            self[agent] = default
+        return self[agent]
+
+    def update(self, *args, **kwargs):
+        for agent, entry in dict(*args, **kwargs).items():
+            self[agent] = entry
+
+    def clear(self):
+        for agent in list(self):
+            del self[agent]
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class AgentQueue(MutableMapping):
+    """
+    Queue of agents waiting at a node, held as a timing wheel: one slot per release tick, a heap of ticks for expiry
+    and an index from agent id to its slot. Enqueueing, checking whether an agent is queued and releasing a tick's
+    agents are constant time whatever the queue length. It reads and writes like the dictionary of
+    {tick: {agent id: entry}} that Node.queue has always been. When spill is set, slots furthest in the future are
+    written to a file on disk once more than spill agents are held in memory and read back when accessed. The spill
+    file lives in a temporary directory of its own, removed once every spilled slot has been read back or the queue is
+    garbage collected.
+    """
+
+    def __init__(self, slots=None, spill=None, path=None):
+        """
+        :param slots: initial {tick: {agent id: entry}} contents
+        :param spill: maximum agents held in memory before distant slots are written to disk, None to never spill
+        :param path: directory the spill file's temporary directory is created in, the system default if None
+        """
+        self.slots = {}
+        self.ticks = []
+        self.heaped = set()
+        self.index = {}
+        self.resident = 0
+        self.spill = spill
+        self.path = path
+        self.spilled = None
+        self.spilledticks = set()
+        self.closer = None
+        for tick, entries in (slots or {}).items():
+            self[tick] = entries
+
+    # Mapping of tick to slot
+
+    def __getitem__(self, tick):
+        if tick in self.spilledticks:
+            self._load(tick)
+        return self.slots[tick]
+
+    def __setitem__(self, tick, entries):
+        if tick in self:
+            del self[tick]
+        self.slots[tick] = _Slot(self, tick)
+        if tick not in self.heaped:
+            heapq.heappush(self.ticks, tick)
+            self.heaped.add(tick)
+        self.slots[tick].update(entries)
+
+    def __delitem__(self, tick):
+        if tick in self.spilledticks:
+            self._load(tick)
+        slot = self.slots.pop(tick)
+        for agent in slot:
+            if self.index.get(agent) == tick:
+                del self.index[agent]
+        self.resident = self.resident - len(slot)
+
+    def __contains__(self, tick):
+        return tick in self.slots or tick in self.spilledticks
+
+    def __iter__(self):
+        return iter(sorted(set(self.slots) | self.spilledticks))
+
+    def __len__(self):
+        return len(self.slots) + len(self.spilledticks)
+
+    # Agent operations
+
+    def enqueue(self, agent, tick, entry):
+        """
+        Queue an agent for release at a tick.
+
+        :param agent: agent id
+        :param tick: time the agent is released
+        :param entry: queue entry, by convention [destination, wait time]
+
+        :return: None
+        """
+        if tick not in self:
+            self[tick] = {}
+        self[tick][agent] = entry
+
+    def queued(self, agent):
+        """
+        Checks if an agent is in the queue.
+
+        :param agent: agent id
+
+        :return: True if the agent has a slot
+        """
+        return agent in self.index
+
+    def slotof(self, agent):
+        """
+        Release tick of a queued agent.
+
+        :param agent: agent id
+
+        :return: tick, None if the agent is not queued
+        """
+        return self.index.get(agent)
+
+    def due(self, tick):
+        """
+        Agents released at a tick, without removing them.
+
+        :param tick: current time
+
+        :return: {agent id: entry}, empty if no agents are due
+        """
+        if tick in self:
+            return self[tick]
+        return {}
+
+    def expire(self, tick):
+        """
+        Removes every slot at or before a tick.
+
+        :param tick: current time
+
+        :return: None
+        """
+        while self.ticks and self.ticks[0] <= tick:
+            old = heapq.heappop(self.ticks)
+            self.heaped.discard(old)
+            if old in self:
+                del self[old]
+
+    # Index and spill maintenance
+
+    def _added(self, tick, agent):
+        old = self.index.get(agent)
+        if old is not None and old != tick and old in self:
+            self[old].pop(agent, None)
+        self.index[agent] = tick
+        self.resident = self.resident + 1
+        if self.spill is not None and self.resident > self.spill:
+            self._spill(tick)
+
+    def _removed(self, tick, agent):
+        if self.index.get(agent) == tick:
+            del self.index[agent]
+        self.resident = self.resident - 1
+
+    def _spill(self, keep):
+        """
+        Writes the furthest slots to disk until half the spill limit is resident, never spilling the slot being changed.
+        """
+        if self.spilled is None:
+            self._openspill()
+        for tick in sorted(self.slots, reverse=True):
+            if self.resident <= self.spill // 2:
+                break
+            if tick == keep:
+                continue
+            slot = self.slots.pop(tick)
+            self.spilled[repr(tick)] = dict(slot)
+            self.spilledticks.add(tick)
+            self.resident = self.resident - len(slot)
+
+    def _openspill(self):
+        import shelve
+        import tempfile
+        directory = tempfile.mkdtemp(prefix="spm_queue_", dir=self.path)
+        self.spilled = shelve.open(os.path.join(directory, "queue"))
+        self.closer = weakref.finalize(self, _discard, self.spilled, directory)
+
+    def _closespill(self):
+        """
+        Closes the spill file and removes its directory.
+        """
+        if self.closer is not None:
+            self.closer()
+        self.spilled = None
+        self.closer = None
+
+    def _load(self, tick):
+        entries = self.spilled.pop(repr(tick))
+        self.spilledticks.discard(tick)
+        slot = _Slot(self, tick)
+        dict.update(slot, entries)
+        self.slots[tick] = slot
+        self.resident = self.resident + len(slot)
+        if not self.spilledticks:
+            self._closespill()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["slots"] = {tick: dict(slot) for tick, slot in self.slots.items()}
+        state["spilled"] = {tick: self.spilled[repr(tick)] for tick in self.spilledticks}
+        state["closer"] = None
+        return state
+
+    def __setstate__(self, state):
+        slots = state.pop("slots")
+        spilled = state.pop("spilled")
+        self.__dict__.update(state)
+        self.slots = {}
+        self.spilled = None
+        for tick, entries in slots.items():
+            slot = _Slot(self, tick)
+            dict.update(slot, entries)
+            self.slots[tick] = slot
+        if spilled:
+            self._openspill()
+            for tick, entries in spilled.items():
+                self.spilled[repr(tick)] = entries
+
+
+def _discard(spilled, directory):
+    """
+    Closes a queue's spill file and removes its directory, run once when the spill is no longer needed or the queue is
+    collected.
+    """
+    spilled.close()
+    shutil.rmtree(directory, ignore_errors=True)
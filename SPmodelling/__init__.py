@@ -1,9 +1,25 @@
-from SPmodelling.Agent import MobileAgent, CommunicativeAgent
-import SPmodelling.Reset
-import SPmodelling.Interface
-import SPmodelling.Flow
-import SPmodelling.Social
-import SPmodelling.Monitor
-import SPmodelling.Population
-import SPmodelling.Structure
-import SPmodelling.Balancer
\ No newline at end of file
+"""
+Submodules are imported on first use, so importing the package, or a single module such as SPmodelling.Agent for a
+model definition, does not load the specification, neo4j, NumPy or matplotlib until a run needs them.
+"""
+import importlib
+
+__all__ = ["MobileAgent", "CommunicativeAgent", "Agent", "Backend", "Reset", "Interface", "Flow", "Social", "Monitor",
+           "Population", "Structure", "Balancer"]
+
+_submodules = {"Agent", "Backend", "Balancer", "Cache", "Checkpoint", "Clock", "Flow", "Instrument", "Interface",
+               "Memory", "Monitor", "Node", "Orchestrator", "Paths", "Population", "Queries", "Recorder", "Reset",
+               "Scheduler", "SPm", "Social", "Structure", "Sweep", "Wheel"}
+_classes = {"MobileAgent": "Agent", "CommunicativeAgent": "Agent"}
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module("SPmodelling." + name)
+    if name in _classes:
+        return getattr(importlib.import_module("SPmodelling." + _classes[name]), name)
+    raise AttributeError("module 'SPmodelling' has no attribute " + repr(name))
+
+
+def __dir__():
+    return sorted(set(globals()) | _submodules | set(_classes))
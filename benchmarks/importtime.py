@@ -0,0 +1,72 @@
+"""
+Import time benchmark for SPmodelling. Each module is imported in a fresh interpreter, timing the import and listing
+the heavy dependencies it pulled in, so cold start for workers and command line runs stays low.
+
+Usage: python benchmarks/importtime.py [--repeat N] [--budget SECONDS] [module ...]
+
+Exits with status 1 if the median import time of any module exceeds the budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = ["SPmodelling", "SPmodelling.Agent", "SPmodelling.Node", "SPmodelling.Interface", "SPmodelling.Monitor",
+           "SPmodelling.Flow", "SPmodelling.SPm"]
+HEAVY = ["specification", "neo4j", "numpy", "matplotlib"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, repeat):
+    """
+    Imports a module in repeat fresh interpreters.
+
+    :param module: dotted module name
+    :param repeat: number of interpreters to start
+
+    :return: dictionary of median seconds, all timings and the heavy dependencies loaded
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    timings = []
+    loaded = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)], env=env,
+                             stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        loaded = result["loaded"]
+    return {"median": statistics.median(timings), "timings": timings, "loaded": loaded}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=None, help="maximum median seconds per module")
+    args = parser.parse_args(argv)
+    over = []
+    print("%-24s %10s  %s" % ("module", "median ms", "loaded"))
+    for module in args.modules:
+        result = measure(module, args.repeat)
+        print("%-24s %10.1f  %s" % (module, result["median"] * 1000, ", ".join(result["loaded"]) or "-"))
+        if args.budget is not None and result["median"] > args.budget:
+            over.append(module)
+    if over:
+        print("Over budget: " + ", ".join(over))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
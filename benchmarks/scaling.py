@@ -0,0 +1,166 @@
+"""
+Scaling benchmark for SPmodelling on the synthetic specification. Runs the chosen modules for a number of ticks at each
+population size and reports ticks per second, wall and CPU time per module and Interface calls per tick in total and
+for each module, with the neo4j query counts from SPmodelling.Queries. Results are written as JSON and can be compared
+with an earlier file.
+
+Usage: python benchmarks/scaling.py [--sizes N ...] [--ticks T] [--modules M ...] [--output FILE] [--compare FILE]
+"""
+import argparse
+import concurrent.futures
+import datetime
+import functools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["Flow", "Social", "Population", "Monitor"]
+
+
+class CallCounter:
+    """
+    Counts calls to the public functions of SPmodelling.Interface, which modules and models always call through the
+    module, so the count covers both backends. Calls are counted against the module whose pass made them, as marked by
+    Instrument.step, and against None outside any pass.
+    """
+
+    def __init__(self):
+        import SPmodelling.Interface as intf
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.originals = {}
+        for name, func in list(vars(intf).items()):
+            if callable(func) and not name.startswith("_") and getattr(func, "__module__", None) == intf.__name__:
+                self.originals[name] = func
+                setattr(intf, name, self.wrap(name, func))
+
+    def wrap(self, name, func):
+        import SPmodelling.Instrument as instrument
+
+        @functools.wraps(func)
+        def counted(*args, **kwargs):
+            module = instrument.current.get()[0]
+            with self.lock:
+                calls = self.counts.setdefault(module, {})
+                calls[name] = calls.get(name, 0) + 1
+            return func(*args, **kwargs)
+        return counted
+
+    def total(self):
+        with self.lock:
+            return sum(sum(calls.values()) for calls in self.counts.values())
+
+    def permodule(self, ticks):
+        """
+        Calls per tick made by each module, with the calls made outside any module's pass under None.
+        """
+        with self.lock:
+            return {module: sum(calls.values()) / ticks for module, calls in self.counts.items()}
+
+    def restore(self):
+        import SPmodelling.Interface as intf
+        for name, func in self.originals.items():
+            setattr(intf, name, func)
+
+
+def timed(func, *args):
+    """
+    Runs a module main function, returning its wall and CPU time.
+    """
+    start = time.perf_counter()
+    cpu = time.thread_time()
+    func(*args)
+    return {"wall": time.perf_counter() - start, "cpu": time.thread_time() - cpu}
+
+
+def measure(agents, ticks, modules, nodes=None, edges=None, degree=3, settings=None):
+    """
+    Runs the synthetic model once.
+
+    :param agents: population size
+    :param ticks: run length
+    :param modules: names of the modules to run
+    :param nodes: number of nodes, one per 20 agents by default
+    :param edges: number of REACHES edges, four per node by default
+    :param degree: target social degree
+    :param settings: other specification settings
+
+    :return: dictionary of sizes and measurements
+    """
+    import synthetic
+    nodes = nodes or max(2, agents // 20)
+    edges = edges or 4 * nodes
+    synthetic.configure(nodes, edges, agents, degree, **(settings or {}))
+    import SPmodelling
+    import SPmodelling.Queries as queries
+    start = time.perf_counter()
+    SPmodelling.Reset.main(0, agents, ticks)
+    reset = time.perf_counter() - start
+    queries.reset()
+    counter = CallCounter()
+    mains = {"Flow": (SPmodelling.Flow.main, ticks, 0), "Social": (SPmodelling.Social.main, ticks, 0),
+             "Population": (SPmodelling.Population.main, ticks, agents), "Monitor": (SPmodelling.Monitor.main, ticks),
+             "Balancer": (SPmodelling.Balancer.main, ticks), "Structure": (SPmodelling.Structure.main, ticks)}
+    try:
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(modules)) as executor:
+            futures = {name: executor.submit(timed, *mains[name]) for name in modules}
+            times = {name: future.result() for name, future in futures.items()}
+        seconds = time.perf_counter() - start
+    finally:
+        counter.restore()
+    return {"agents": agents, "nodes": nodes, "edges": edges, "degree": degree, "ticks": ticks,
+            "reset seconds": reset, "seconds": seconds, "ticks per second": ticks / seconds, "modules": times,
+            "interface calls per tick": counter.total() / ticks,
+            "interface calls per tick by module": counter.permodule(ticks), "interface calls": counter.counts,
+            "queries": queries.stats()}
+
+
+def compare(results, baseline):
+    """
+    Prints the change in ticks per second against an earlier results file for each size present in both.
+    """
+    before = {run["agents"]: run for run in baseline["results"]}
+    for run in results["results"]:
+        if run["agents"] in before:
+            ratio = run["ticks per second"] / before[run["agents"]]["ticks per second"]
+            print("%8d agents  %6.2fx ticks per second" % (run["agents"], ratio))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--ticks", type=int, default=10)
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--degree", type=int, default=3)
+    parser.add_argument("--backend", default="memory")
+    parser.add_argument("--uri", default="synthetic", help="database uri for the neo4j backend")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", default=None, help="earlier results file")
+    args = parser.parse_args(argv)
+    settings = {"backend": args.backend, "database_uri": args.uri}
+    results = {"python": platform.python_version(), "platform": platform.platform(), "backend": args.backend,
+               "modules": args.modules, "date": datetime.datetime.now().isoformat(), "results": []}
+    print("%8s %8s %12s %14s" % ("agents", "nodes", "ticks/s", "calls/tick"))
+    for size in args.sizes:
+        run = measure(size, args.ticks, args.modules, degree=args.degree, settings=settings)
+        results["results"].append(run)
+        print("%8d %8d %12.2f %14.1f" % (size, run["nodes"], run["ticks per second"], run["interface calls per tick"]))
+        for module, calls in sorted(run["interface calls per tick by module"].items(), key=str):
+            print("%44s %-10s" % ("%.1f" % calls, module or "(none)"))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
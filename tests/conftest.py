@@ -0,0 +1,29 @@
+import random
+import sys
+import pytest
+import model
+
+
+@pytest.fixture
+def configure(request, monkeypatch):
+    """
+    Sizes the test model and installs it as specification, with an in-memory database of its own for each test.
+    Settings are put back once the test finishes.
+
+    :return: function taking the node, edge and agent counts, the SOCIAL degree, churn, a random seed and any other
+             specification settings, eg. batch_moves, and returning the model
+    """
+
+    def install(nodes=6, edges=12, agents=20, degree=2, churn=0, seed=0, **settings):
+        monkeypatch.setitem(sys.modules, "specification", model)
+        monkeypatch.setattr(model, "database_uri", request.node.nodeid)
+        for key, value in dict(NODES=nodes, EDGES=max(edges, nodes), AGENTS=agents, DEGREE=degree,
+                               CHURN=churn).items():
+            monkeypatch.setattr(model, key, value)
+        for key, value in settings.items():
+            monkeypatch.setattr(model, key, value, raising=False)
+        monkeypatch.setattr(model, "nodes", [model.Node("n" + str(i)) for i in range(nodes)])
+        random.seed(seed)
+        return model
+
+    return install
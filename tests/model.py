@@ -0,0 +1,133 @@
+"""
+Specification used by the tests. A ring of nodes with extra random REACHES edges, agents which wander at random and
+keep a few SOCIAL contacts among the agents they meet, and a headless Monitor recording node loads. The configure
+fixture in conftest sizes it and installs it as specification on the in-memory backend.
+"""
+import random
+import SPmodelling.Interface as intf
+from SPmodelling.Agent import MobileAgent, CommunicativeAgent
+from SPmodelling.Monitor import Monitor as BaseMonitor
+from SPmodelling.Node import Node as BaseNode
+from SPmodelling.Reset import Reset as BaseReset
+
+specname = "model"
+backend = "memory"
+database_uri = "model"
+Flow_auth = Monitor_auth = Reset_auth = Population_auth = Balancer_auth = Structure_auth = None
+headless = True
+
+NODES = 6
+EDGES = 12
+AGENTS = 20
+DEGREE = 2
+CHURN = 0
+nodes = []
+
+
+class Agent(MobileAgent, CommunicativeAgent):
+    def __init__(self, agentid, params=None, nuid="id"):
+        MobileAgent.__init__(self, agentid, params, nuid)
+
+    def generator(self, tx, params):
+        intf.addagent(tx, {"id": random.randrange(NODES)}, "Agent", {"wealth": 1}, "id")
+
+    def bulkgenerator(self, tx, params, number):
+        counts = {}
+        for i in range(number):
+            node = random.randrange(NODES)
+            counts[node] = counts.get(node, 0) + 1
+        for node, count in counts.items():
+            intf.addagents(tx, {"id": node}, "Agent", [{"wealth": 1}] * count, "id")
+
+    def perception(self, tx, perc):
+        super().perception(tx, perc)
+
+    def choose(self, tx, perc):
+        super().choose(tx, perc)
+        return random.choice(perc) if perc else None
+
+    def learn(self, tx, choice):
+        if random.random() < CHURN:
+            intf.deleteagent(tx, {"id": self.id}, "id")
+
+    def payment(self, tx):
+        return True
+
+    def look(self, tx):
+        self.view = intf.agentcontacts(tx, self.id, "Agent")
+        self.met = intf.colocated(tx, self.id)
+
+    def update(self, tx):
+        pass
+
+    def talk(self, tx):
+        known = {edge.end_node["id"] for edge in self.view}
+        strangers = [ag["id"] for ag in self.met if ag["id"] != self.id and ag["id"] not in known]
+        if strangers and len(known) < DEGREE:
+            intf.createedge(tx, self.id, random.choice(strangers), "Agent", "Agent", "SOCIAL")
+
+    def listen(self, tx):
+        pass
+
+    def react(self, tx):
+        if len(self.view) > DEGREE:
+            intf.deletecontact(tx, self.id, random.choice(self.view).end_node["id"], "Agent", "Agent")
+
+
+Agents = Agent
+
+
+class Node(BaseNode):
+    def agentsready(self, tx):
+        super().agentsready(tx)
+
+    def agentperception(self, tx, agent, dest=None, waittime=None):
+        return super().agentperception(tx, agent, dest, waittime)
+
+    def agentprediction(self, tx, agent):
+        return super().agentprediction(tx, agent)
+
+
+class _Reset(BaseReset):
+    def __init__(self):
+        super().__init__("test")
+
+    @staticmethod
+    def set_nodes(tx):
+        for i in range(NODES):
+            intf.addnode(tx, "Node", {"name": "n" + str(i), "id": i})
+
+    @staticmethod
+    def set_edges(tx):
+        for i in range(NODES):
+            intf.createedge(tx, i, (i + 1) % NODES, "Node", "Node", "REACHES")
+        for i in range(EDGES - NODES):
+            intf.createedge(tx, random.randrange(NODES), random.randrange(NODES), "Node", "Node", "REACHES")
+
+    @staticmethod
+    def generate_population(tx, pop_size):
+        Agent(None).bulkgenerator(tx, None, pop_size)
+
+
+class Reset:
+    Reset = _Reset
+
+
+class Population:
+    params = None
+
+    @staticmethod
+    def check(ses, ps):
+        return max(0, ps - len(ses.read_transaction(intf.agentids)))
+
+
+class Monitor(BaseMonitor):
+    def __init__(self):
+        super().__init__(False, headless=True)
+
+    def snapshot(self, txl, ctime):
+        self.nrecord = [len(intf.getnodeagents(txl, node.name, "name")) for node in nodes]
+        return super().snapshot(txl, ctime)
+
+    def close(self, txl):
+        pass
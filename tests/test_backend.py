@@ -0,0 +1,33 @@
+import SPmodelling.Backend as backend
+import SPmodelling.Interface as intf
+import SPmodelling.Memory as memory
+
+
+def test_sessions_pooled_per_credentials(configure):
+    configure()
+    pool = backend.ConnectionPool()
+    with pool.session(None) as ses:
+        first = ses
+        with pool.session(None) as other:
+            assert other is not first
+    with pool.session(None) as ses:
+        assert ses in (first, other)
+    with pool.session(("user", "password")) as ses:
+        pass
+    with pool.session({"user": "unhashable"}):
+        pass
+    assert pool.stats == {"drivers created": 3, "drivers reused": 2, "sessions created": 4, "sessions reused": 1}
+    assert pool.size() == {"drivers": 3, "idle sessions": 4}
+    pool.close()
+    assert pool.size() == {"drivers": 0, "idle sessions": 0}
+
+
+def test_memory_graph_shared_by_database_uri(configure):
+    spec = configure()
+    pool = backend.ConnectionPool()
+    assert isinstance(pool.driver(None), memory.MemoryDriver)
+    assert pool.driver(None).graph is memory.graph(spec.database_uri)
+    with pool.session(None) as ses:
+        ses.write_transaction(intf.addnode, "Node", {"id": 0})
+        assert backend.inmemory(ses.begin_transaction())
+    assert len(memory.graph(spec.database_uri).labelled("Node")) == 1
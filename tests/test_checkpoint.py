@@ -0,0 +1,59 @@
+import os
+import SPmodelling.Backend as backend
+import SPmodelling.Checkpoint as checkpoint
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Interface as intf
+import SPmodelling.Reset as reset
+from SPmodelling.Wheel import AgentQueue
+
+
+class Counter:
+    def __init__(self, count=0):
+        self.count = count
+
+    def getstate(self):
+        return {"count": self.count}
+
+    def setstate(self, state):
+        self.count = state["count"]
+
+
+def state(ses, spec):
+    """
+    Clock, agent locations, SOCIAL contacts and node queues, to compare before saving and after restoring.
+    """
+    located = {ag["id"]: node.name for node in spec.nodes
+               for ag in ses.read_transaction(intf.getnodeagents, node.name, "name")}
+    contacts = sorted((a, b) for a, la, b, lb, edge in ses.read_transaction(intf.socialedges))
+    queues = {node.name: {tick: dict(node.queue[tick]) for tick in node.queue} for node in spec.nodes if node.queue}
+    return ses.read_transaction(intf.gettime), located, contacts, queues
+
+
+def test_restored_run_continues_from_checkpoint(configure, tmp_path):
+    spec = configure(agents=10, checkpoint_interval=2, checkpoint_path=str(tmp_path))
+    reset.main(0, 10, 4)
+    counter = Counter(5)
+    checkpoint.register("Counter", counter)
+    with backend.session(None) as ses:
+        for agent in range(4):
+            ses.write_transaction(intf.createedge, agent, agent + 1, "Agent", "Agent", "SOCIAL")
+        spec.nodes[0].queue = AgentQueue({3: {1: ["n1", 2]}, 5: {2: ["n2", 0]}})
+        assert checkpoint.due(ses, clocksignal.tick(ses)) is None
+        saved = checkpoint.due(ses, clocksignal.tick(ses))
+        assert saved == os.path.join(str(tmp_path), "model_test_10_4_0_2.ckpt")
+        before = state(ses, spec)
+        checkpoint.unregister("Counter")
+        ses.write_transaction(intf.deleteagent, {"id": 3})
+        ses.write_transaction(intf.moveagent, 4, 5)
+        spec.nodes[0].queue.enqueue(4, 6, ["n0", 0])
+        clocksignal.tick(ses)
+    reset.main(1, 10, 4, start=saved)
+    with backend.session(None) as ses:
+        assert state(ses, spec) == before
+        assert ses.read_transaction(intf.getrunname) == "model_test_10_4_1"
+        assert ses.write_transaction(intf.addagents, {"id": 0}, "Agent", [{}], "id") == [10]
+    assert clocksignal.signal.time >= 2
+    restored = Counter()
+    checkpoint.register("Counter", restored)
+    checkpoint.unregister("Counter")
+    assert restored.count == 5
@@ -0,0 +1,50 @@
+import asyncio
+import threading
+import SPmodelling.Backend as backend
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Interface as intf
+import SPmodelling.Reset as reset
+
+
+def test_waiting_modules_see_each_committed_tick(configure):
+    configure(agents=0)
+    reset.main(0, 0, 3)
+    seen = []
+
+    def module():
+        clock = 0
+        with backend.session(None) as ses:
+            while clock < 3:
+                clock = clocksignal.waittick(ses, clock, timeout=5)
+                seen.append(clock)
+
+    waiters = [threading.Thread(target=module) for i in range(3)]
+    for waiter in waiters:
+        waiter.start()
+    with backend.session(None) as ses:
+        for i in range(3):
+            assert clocksignal.tick(ses) == i + 1
+    for waiter in waiters:
+        waiter.join(5)
+    assert sorted(seen)[-3:] == [3, 3, 3] and all(1 <= time <= 3 for time in seen)
+
+
+def test_unsignalled_ticks_seen_by_reading_the_clock(configure):
+    configure(agents=0)
+    reset.main(0, 0, 3)
+    with backend.session(None) as ses:
+        clock = ses.read_transaction(intf.gettime)
+        threading.Timer(0.05, ses.write_transaction, (intf.tick,)).start()
+        assert clocksignal.waittick(ses, clock, timeout=0.01) == clock + 1
+
+
+def test_tasks_await_the_signal():
+    signal = clocksignal.TickSignal()
+
+    async def waiting():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.01, signal.publish, 1)
+        return await signal.waitasync(0, timeout=5), await signal.waitasync(1, timeout=0.01)
+
+    assert asyncio.run(waiting()) == (1, 1)
+    assert signal.waiters == set()
@@ -0,0 +1,73 @@
+import pytest
+import SPmodelling.Backend as backend
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Flow as flow
+import SPmodelling.Interface as intf
+import SPmodelling.Reset as reset
+
+
+def positions(ses, spec):
+    """
+    Node name of every agent located at one of the model's nodes.
+    """
+    return {ag["id"]: node.name for node in spec.nodes
+            for ag in ses.read_transaction(intf.getnodeagents, node.name, "name")}
+
+
+def unloaded(ses, spec, full="n1", cap=3):
+    """
+    Resets every node's load and gives one node a small capacity.
+    """
+    for node in spec.nodes:
+        ses.write_transaction(intf.updatenode, node.name, "load", 0, "name", "Node")
+    ses.write_transaction(intf.updatenode, full, "cap", cap, "name", "Node")
+
+
+@pytest.mark.parametrize("batch", [None, "node", "tick"])
+def test_batch_decisions_keep_agents_located(batch, configure):
+    spec = configure(10, 40, 50, batch_decisions=True)
+    reset.main(0, 50, 6)
+    with backend.session(None) as ses:
+        for i in range(6):
+            flow.step(ses, batch)
+            clocksignal.tick(ses)
+        assert len(ses.read_transaction(intf.agentids)) == 50
+        assert len(positions(ses, spec)) == 50
+
+
+@pytest.mark.parametrize("batch", ["node", "tick", "shard"])
+def test_batched_moves_respect_capacity(batch, configure):
+    spec = configure(10, 40, 200, flow_shards=3)
+    reset.main(0, 200, 1)
+    with backend.session(None) as ses:
+        unloaded(ses, spec)
+        before = {ag["id"] for ag in ses.read_transaction(intf.getnodeagents, "n1", "name")}
+        flow.step(ses, batch)
+        after = {ag["id"] for ag in ses.read_transaction(intf.getnodeagents, "n1", "name")}
+        assert len(after - before) <= 3
+        assert len(positions(ses, spec)) == 200
+
+
+@pytest.mark.parametrize("batch", ["node", "shard"])
+def test_only_accepted_moves_pay(batch, monkeypatch, configure):
+    spec = configure(10, 40, 200, flow_shards=3)
+    paid = {}
+
+    class PayingAgent(spec.Agent):
+        def payment(self, tx):
+            if self.id % 2:
+                return False
+            paid[self.id] = self.choice.end_node["name"]
+            return True
+
+    monkeypatch.setattr(spec, "Agent", PayingAgent)
+    reset.main(0, 200, 1)
+    with backend.session(None) as ses:
+        unloaded(ses, spec)
+        before = positions(ses, spec)
+        flow.step(ses, batch)
+        after = positions(ses, spec)
+        moved = {agent for agent in before if after[agent] != before[agent]}
+        assert moved and all(agent % 2 == 0 for agent in moved)
+        assert moved <= set(paid)
+        assert all(after[agent] == destination for agent, destination in paid.items())
@@ -0,0 +1,68 @@
+import SPmodelling.Instrument as instrument
+import SPmodelling.Queries as queries
+
+
+class Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def values(self):
+        return [[row] for row in self.rows]
+
+    def detach(self):
+        return len(self.rows)
+
+
+class Transaction:
+    """
+    Stands in for a neo4j transaction, answering every statement with three rows.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.success = None
+
+    def run(self, statement, parameters=None, **kwparameters):
+        self.sent.append(statement)
+        return Result([1, 2, 3])
+
+
+class Session:
+    def __init__(self):
+        self.tx = Transaction()
+
+    def write_transaction(self, unit_of_work, *args, **kwargs):
+        return unit_of_work(self.tx, *args, **kwargs)
+
+    def begin_transaction(self):
+        return self.tx
+
+
+def test_statements_recorded_once_against_module():
+    ses = instrument.RecordedSession(Session())
+    instrument.enable()
+    instrument.reset()
+    try:
+        with instrument.step("Population", 4):
+            ses.write_transaction(lambda tx: tx.run("MATCH (a:Agent) RETURN a.id"))
+            ses.write_transaction(queries.run, "agentids", {"label": ":Agent"})
+            tx = ses.begin_transaction()
+            tx.success = True
+        ses.write_transaction(lambda tx: tx.run("MATCH (c:Clock) RETURN c.time"))
+    finally:
+        instrument.enable(False)
+    assert ses.inner.tx.success is True
+    assert len(ses.inner.tx.sent) == 3
+    assert {key: entry[::3] for key, entry in instrument.calls.items()} == {
+        (4, "Population", "tx.run"): [1, 3], (4, "Population", "agentids"): [1, 3], (None, None, "tx.run"): [1, 3]}
+    modules = [(row["module"], row["function"], row["calls"]) for row in instrument.summary()]
+    assert ("Population", None, 2) in modules and ("Population", "agentids", 1) in modules
+    assert instrument.steps[(4, "Population")][0] == 1
+
+
+def test_nothing_recorded_when_disabled():
+    ses = instrument.RecordedSession(Session())
+    instrument.reset()
+    with instrument.step("Population", 0):
+        ses.write_transaction(lambda tx: tx.run("MATCH (a:Agent) RETURN a.id"))
+    assert instrument.calls == {} and instrument.steps == {}
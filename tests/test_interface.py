@@ -0,0 +1,193 @@
+import os
+import pytest
+from SPmodelling.Interface import _properties
+import SPmodelling.Backend as backend
+import SPmodelling.Interface as intf
+import SPmodelling.Queries as queries
+import SPmodelling.Reset as reset
+
+
+def nodes(found):
+    """
+    Names of nodes, or ids of agents, sorted so both backends compare equal.
+    """
+    return sorted(node["name"] if "name" in node else node["id"] for node in found)
+
+
+def edges(found):
+    """
+    (start, type, end, properties) of relationships, sorted so both backends compare equal.
+    """
+    return sorted((nodes([edge.start_node])[0], edge.type, nodes([edge.end_node])[0], sorted(edge.items()))
+                  for edge in found)
+
+
+def scenario(ses):
+    """
+    Calls every Interface function on a freshly reset four node ring and returns what was read, keyed by the call.
+    """
+    read = {"time": ses.read_transaction(intf.gettime), "tick": ses.write_transaction(intf.tick),
+            "run name": ses.read_transaction(intf.getrunname)}
+    read["added"] = ses.write_transaction(intf.addagents, {"id": 0}, "Agent", [{"wealth": 1}] * 2, "id")
+    ses.write_transaction(intf.addagent, {"id": 1}, "Agent", {"wealth": 1}, "id")
+    read["agents"] = sorted(ses.read_transaction(intf.agentids))
+    read["located"] = nodes([ses.read_transaction(intf.locateagent, 2)])
+    read["at n0"] = nodes(ses.read_transaction(intf.getnodeagents, "n0", "name"))
+    read["colocated"] = nodes(ses.read_transaction(intf.colocated, 0))
+    perception = ses.read_transaction(intf.perception, 0)
+    read["perception"] = nodes(perception[:1]), edges(perception[1:])
+    ses.write_transaction(intf.updateedge, perception[1], "cost", 7, "id")
+    view = ses.read_transaction(intf.nodeperception, "n0", "name")
+    read["node perception"] = nodes(view[:1]), edges(view[1:])
+    ses.write_transaction(intf.createedge, 0, 1, "Agent", "Agent", "SOCIAL", "weight: 2")
+    ses.write_transaction(intf.updatecontactedge, 0, 1, "weight", 3, "Agent", "Agent")
+    read["contacts"] = edges(ses.read_transaction(intf.agentcontacts, 0, "Agent"))
+    read["social"] = sorted((a, sorted(la), b, sorted(lb), dict(r)) for a, la, b, lb, r in
+                            ses.read_transaction(intf.socialedges))
+    read["locations"] = sorted(agent["id"] for key, agent in ses.read_transaction(intf.locations))
+    read["node"] = nodes([ses.read_transaction(intf.getnode, 1, "Node", "id")])
+    ses.write_transaction(intf.updatenode, "n1", "cap", 5, "name", "Node")
+    read["cap"] = ses.read_transaction(intf.getnodevalue, "n1", "cap", "Node", "name")
+    ses.write_transaction(intf.updateagent, 0, "wealth", 4)
+    read["wealth"] = ses.read_transaction(intf.getnode, 0, "Agent", "id")["wealth"]
+    ses.write_transaction(intf.moveagent, 2, 0)
+    ses.write_transaction(intf.moveagents, [{"id": 0, "new": 2}, {"id": 1, "new": 3}])
+    read["moved"] = [nodes([ses.read_transaction(intf.locateagent, agent)]) for agent in range(3)]
+    read["path"] = ses.read_transaction(intf.shortestpath, 0, 2, "Node", "REACHES", True)
+    read["adjacency"] = sorted(ses.read_transaction(intf.adjacency, "Node", "REACHES"))
+    ses.write_transaction(intf.deletecontact, 0, 1, "Agent", "Agent")
+    read["deleted contact"] = ses.read_transaction(intf.agentcontacts, 0, "Agent")
+    ses.write_transaction(intf.deleteagent, {"id": 2})
+    read["after delete"] = sorted(ses.read_transaction(intf.agentids))
+    read["next ids"] = ses.write_transaction(intf.nextids, "Agent", 3)
+    ses.write_transaction(intf.createindex, "Node", "cap")
+    read["indexes"] = {("Agent", "id"), ("Node", "cap")} <= set(ses.read_transaction(intf.indexes))
+    time, graph, relationships = ses.read_transaction(intf.graphsnapshot)
+    ses.write_transaction(intf.cleardatabase)
+    read["cleared"] = ses.read_transaction(intf.graphnodes), ses.read_transaction(intf.graphedges)
+    ses.write_transaction(intf.restorenodes, graph)
+    ses.write_transaction(intf.restoreedges, relationships)
+    ses.write_transaction(intf.finishrestore)
+    read["restored"] = (sorted(sorted(properties.items()) for key, labels, properties in
+                               ses.read_transaction(intf.graphnodes)) ==
+                        sorted(sorted(properties.items()) for key, labels, properties in graph),
+                        len(ses.read_transaction(intf.graphedges)) == len(relationships))
+    read["moved after restore"] = nodes(ses.read_transaction(intf.getnodeagents, "n2", "name"))
+    return read
+
+
+agreed = {
+    "time": 0, "tick": 1, "run name": "model_test_0_1_0", "added": [0, 1], "agents": [0, 1, 2], "located": ["n1"],
+    "at n0": [0, 1], "colocated": [0, 1], "perception": (["n0"], [("n0", "REACHES", "n1", [])]),
+    "node perception": (["n0"], [("n0", "REACHES", "n1", [("cost", 7)])]),
+    "contacts": [(0, "SOCIAL", 1, [("weight", 3)])], "social": [(0, ["Agent"], 1, ["Agent"], {"weight": 3})],
+    "locations": [0, 1, 2], "node": ["n1"], "cap": 5, "wealth": 4, "moved": [["n2"], ["n3"], ["n0"]], "path": 2,
+    "adjacency": [(0, 1), (1, 2), (2, 3), (3, 0)], "deleted contact": [], "after delete": [0, 1], "next ids": 3,
+    "indexes": True, "cleared": ([], []), "restored": (True, True), "moved after restore": [0],
+}
+
+
+@pytest.mark.parametrize("graph", ["memory", "neo4j"])
+def test_backends_agree(graph, configure):
+    if graph == "neo4j":
+        uri = os.environ.get("SPM_TEST_NEO4J_URI")
+        if not uri:
+            pytest.skip("set SPM_TEST_NEO4J_URI, and SPM_TEST_NEO4J_AUTH as user:password, to test against neo4j")
+        auth = tuple(os.environ.get("SPM_TEST_NEO4J_AUTH", "neo4j:neo4j").split(":", 1))
+        spec = configure(4, 4, 0, backend="neo4j", database_uri=uri, Reset_auth=auth)
+    else:
+        spec = configure(4, 4, 0)
+    reset.main(0, 0, 1)
+    with backend.session(spec.Reset_auth) as ses:
+        assert scenario(ses) == agreed
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("weight: 1, tags: [1, 2]", {"weight": 1, "tags": [1, 2]}),
+    ("name: 'Smith, J'", {"name": "Smith, J"}),
+    ("{a: -1.5e3, b: true, c: null, d: {x: ['q\\'r', 2]}}",
+     {"a": -1500.0, "b": True, "c": None, "d": {"x": ["q'r", 2]}}),
+    ({"weight": 1}, {"weight": 1}),
+])
+def test_edge_parameters(text, expected):
+    assert _properties(text) == expected
+
+
+@pytest.mark.parametrize("text", ["weight: timestamp()", "weight 1", "tags: [1, 2", "name: 'Smith"])
+def test_edge_parameters_rejected(text):
+    with pytest.raises(ValueError):
+        _properties(text)
+
+
+def test_clearchunk_deletes_relationships_first(configure):
+    configure(6, 12, 20)
+    reset.main(0, 20, 1)
+    with backend.session(None) as ses:
+        edges = len(ses.read_transaction(intf.graphedges))
+        nodes = len(ses.read_transaction(intf.graphnodes))
+        counts = []
+        deleted = ses.write_transaction(intf.clearchunk, 5)
+        while deleted:
+            counts.append((deleted, len(ses.read_transaction(intf.graphnodes))))
+            deleted = ses.write_transaction(intf.clearchunk, 5)
+        assert all(count <= 5 for count, remaining in counts)
+        edgecalls = -(-edges // 5)
+        assert all(remaining == nodes for count, remaining in counts[:edgecalls])
+        assert all(remaining < nodes for count, remaining in counts[edgecalls:])
+        assert sum(count for count, remaining in counts) == edges + nodes
+        assert ses.read_transaction(intf.graphnodes) == []
+
+
+class StatementLog:
+    """
+    Stands in for a neo4j transaction, keeping the statements sent and returning no records.
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def run(self, statement, **parameters):
+        self.sent.append((statement, parameters))
+        return self
+
+    def values(self):
+        return []
+
+
+def test_values_sent_as_parameters():
+    tx = StatementLog()
+    queries.reset()
+    for node in ["n0", "n1", "n0'}) DETACH DELETE (n"]:
+        intf.getnodeagents(tx, node, "name")
+    statements = {statement for statement, parameters in tx.sent}
+    assert len(statements) == 1 and "n0" not in statements.pop()
+    assert [parameters for statement, parameters in tx.sent][1] == {"id": "n1"}
+    with pytest.raises(ValueError):
+        intf.getnodeagents(tx, "n0", "name}) DETACH DELETE (n")
+    assert queries.stats()["getnodeagents"]["reuse"] == pytest.approx(2 / 3)
+    queries.reset()
+    intf.getnodeagents(tx, "n2", "name")
+    assert queries.stats()["getnodeagents"]["reuse"] == 0
+
+
+def test_node_views_cached_per_tick(configure):
+    configure(4, 4, 0)
+    reset.main(0, 0, 1)
+    with backend.session(None) as ses:
+
+        def view(node, clock):
+            found = ses.read_transaction(intf.nodeperception, node, "name", clock)
+            return [found[0]["name"]] + [(edge.end_node["name"], edge.get("cost")) for edge in found[1:]]
+
+        assert view("n0", 0) == ["n0", ("n1", None)]
+        ses.write_transaction(intf.addnode, "Node", {"name": "n9", "id": 9})
+        ses.write_transaction(intf.createedge, 0, 9, None, None, "REACHES")
+        assert view("n0", 0) == ["n0", ("n1", None)]
+        assert view("n0", 1) == ["n0", ("n1", None), ("n9", None)]
+        ses.write_transaction(intf.createedge, 0, 2, "Node", "Node", "REACHES")
+        assert len(view("n0", 1)) == 4
+        edge = ses.read_transaction(intf.nodeperception, "n3", "name", 1)[1]
+        ses.write_transaction(intf.updateedge, edge, "cost", 2, "name")
+        assert view("n3", 1) == ["n3", ("n0", 2)]
+        ses.write_transaction(intf.updatenode, "n1", "cap", 1, "name", "Node")
+        assert ses.read_transaction(intf.nodeperception, "n0", "name", 1)[1].end_node["cap"] == 1
@@ -0,0 +1,47 @@
+import os
+import pytest
+import SPmodelling.Backend as backend
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Interface as intf
+import SPmodelling.Monitor as monitor
+import SPmodelling.Recorder as recorder
+import SPmodelling.Reset as reset
+
+
+class SilentMonitor(monitor.Monitor):
+    def snapshot(self, txl, ctime):
+        pass
+
+    def close(self, txl):
+        pass
+
+
+def test_plotruns_names_monitor_without_plot():
+    with pytest.raises(NotImplementedError, match="SilentMonitor"):
+        monitor.plotruns(["records"], SilentMonitor)
+    assert SilentMonitor.plot({}, None) is None
+
+
+def test_headless_records_streamed_and_plotted_afterwards(configure, tmp_path):
+    spec = configure(agents=20, record_path=str(tmp_path), record_buffer=2)
+    totals = []
+
+    class PlottingMonitor(spec.Monitor):
+        @staticmethod
+        def plot(data, fig):
+            totals.append([sum(load) for load in data["record"]])
+            fig.add_subplot(1, 1, 1).plot(data["clock"], totals[-1])
+
+    reset.main(0, 20, 5)
+    mon = PlottingMonitor()
+    assert mon.headless and mon.fig is None
+    with backend.session(None) as ses:
+        for i in range(5):
+            ses.write_transaction(mon.snapshot, ses.read_transaction(intf.gettime))
+            clocksignal.tick(ses)
+    mon.recorder.close()
+    path = os.path.join(str(tmp_path), "model_test_20_5_0")
+    assert mon.records == {} and len(recorder.chunks(path)) == 2
+    assert recorder.read(path)["clock"].tolist() == [1, 2, 3]
+    assert monitor.plotruns([path], PlottingMonitor) == [path + ".png"]
+    assert totals == [[20, 20, 20]] and os.path.exists(path + ".png")
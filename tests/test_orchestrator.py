@@ -0,0 +1,42 @@
+import asyncio
+import SPmodelling.Backend as backend
+import SPmodelling.Clock as clocksignal
+import SPmodelling.Instrument as instrument
+import SPmodelling.Interface as intf
+import SPmodelling.Orchestrator as orchestrator
+import SPmodelling.Reset as reset
+import SPmodelling.SPm as spm
+
+
+def test_module_tasks_reach_length(configure, tmp_path):
+    configure(orchestrator="asyncio", instrument=True, instrument_path=str(tmp_path))
+    result = spm.run(0, 3, 20, ["Flow", "Population", "Social", "Monitor"])
+    assert result["time"] == 4 and result["name"] == "model_test_20_3_0"
+    modules = {module for clock, module in instrument.steps}
+    assert modules == {"Reset", "Flow", "Population", "Social", "Monitor"}
+    with backend.session(None) as ses:
+        assert len(ses.read_transaction(intf.agentids)) == 20
+
+
+def test_waiting_tasks_let_others_tick(configure):
+    configure(agents=0)
+    reset.main(0, 0, 3)
+
+    async def ticking(ses):
+        for i in range(3):
+            await orchestrator.call(clocksignal.tick, ses)
+            await asyncio.sleep(0.01)
+
+    async def waiting(ses):
+        seen = [0]
+        while seen[-1] < 3:
+            seen.append(await orchestrator.waittick(ses, seen[-1], timeout=5))
+        return seen
+
+    async def both():
+        with backend.session(None) as ses:
+            seen, ticked = await asyncio.wait_for(asyncio.gather(waiting(ses), ticking(ses)), 5)
+            return seen, await orchestrator.transaction(ses, intf.gettime, write=False)
+
+    seen, time = asyncio.run(both())
+    assert seen == [0, 1, 2, 3] and time == 3
@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ["specification", "neo4j", "numpy", "matplotlib"]
+
+
+def loaded(statement):
+    """
+    Heavy dependencies in sys.modules after running a statement in a fresh interpreter.
+    """
+    probe = statement + "\nimport json, sys\nprint(json.dumps([m for m in %r if m in sys.modules]))" % HEAVY
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    output = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["SPmodelling", "SPmodelling.Agent", "SPmodelling.Node", "SPmodelling.Interface",
+                                    "SPmodelling.Monitor", "SPmodelling.SPm"])
+def test_import_loads_nothing_heavy(module):
+    assert loaded("import " + module) == []
+
+
+def test_submodules_and_classes_loaded_on_use():
+    assert loaded("import SPmodelling\nSPmodelling.Recorder") == ["numpy"]
+    import SPmodelling
+    from SPmodelling.Agent import MobileAgent
+    assert SPmodelling.MobileAgent is MobileAgent and SPmodelling.Flow.__name__ == "SPmodelling.Flow"
+    assert "Sweep" in dir(SPmodelling)
+    with pytest.raises(AttributeError):
+        SPmodelling.Specification
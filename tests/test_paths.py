@@ -0,0 +1,47 @@
+import random
+import pytest
+import SPmodelling.Backend as backend
+import SPmodelling.Interface as intf
+import SPmodelling.Paths as paths
+import SPmodelling.Reset as reset
+
+
+def test_cached_paths_follow_confirmed_edge_changes(configure):
+    configure(6, 6, 0)
+    reset.main(0, 0, 1)
+    with backend.session(None) as ses:
+        assert ses.read_transaction(intf.shortestpath, 0, 3, "Node", "REACHES", True) == 3
+        ses.write_transaction(intf.createedge, 0, 99, "Node", "Node", "REACHES")
+        ses.write_transaction(intf.createedge, 0, 3, "Agent", "Node", "REACHES")
+        assert ses.read_transaction(intf.shortestpath, 0, 3, "Node", "REACHES", True) == 3
+        ses.write_transaction(intf.createedge, 0, 3, "Node", "Node", "REACHES")
+        assert ses.read_transaction(intf.shortestpath, 0, 3, "Node", "REACHES", True) == 1
+        ses.write_transaction(intf.deletecontact, 0, 3, "Node", "Node", None)
+        assert ses.read_transaction(intf.shortestpath, 0, 3, "Node", "REACHES", True) == 3
+        ses.write_transaction(intf.deletecontact, 2, 3, None, None, "REACHES")
+        assert ses.read_transaction(intf.shortestpath, 0, 3, "Node", "REACHES", True) is None
+
+
+@pytest.mark.parametrize("directed", [True, False])
+def test_incremental_distances_match_fresh_search(directed):
+    rng = random.Random(3)
+    pairs = [(rng.randrange(12), rng.randrange(12)) for i in range(15)]
+    graph = paths.PathGraph(pairs, directed, maxsources=5)
+    for i in range(60):
+        node_a, node_b = rng.randrange(12), rng.randrange(12)
+        action = rng.random()
+        if action < 0.4:
+            graph.add(node_a, node_b)
+            pairs.append((node_a, node_b))
+        elif action < 0.6 and pairs:
+            start, end = rng.choice(pairs)
+            graph.remove(start, end)
+            pairs = [pair for pair in pairs if pair != (start, end)]
+        elif action < 0.65:
+            graph.discard(node_a)
+            pairs = [pair for pair in pairs if node_a not in pair]
+        fresh = paths.PathGraph(pairs, directed)
+        for nodeid in graph.index:
+            fresh.node(nodeid)
+        for source in range(0, 12, 3):
+            assert [graph.distance(source, n) for n in range(12)] == [fresh.distance(source, n) for n in range(12)]
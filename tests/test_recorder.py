@@ -0,0 +1,34 @@
+import os
+import numpy
+import SPmodelling.Recorder as recorder
+
+
+def test_reopened_recorder_appends_after_a_crash(tmp_path):
+    path = str(tmp_path / "records")
+    rec = recorder.Recorder(path, buffer=2)
+    for time in range(5):
+        rec.append({"time": time, "load": [time, 2 * time]})
+    open(os.path.join(path, "chunk000002.npz.tmp"), "wb").close()
+    del rec
+    rec = recorder.Recorder(path, buffer=2)
+    for time in range(5, 8):
+        rec.append({"time": time, "load": [time, 2 * time]})
+    rec.close()
+    assert [os.path.basename(name) for name in recorder.chunks(path)] == ["chunk000000.npz", "chunk000001.npz",
+                                                                         "chunk000002.npz", "chunk000003.npz"]
+    records = recorder.read(path)
+    assert records["time"].tolist() == [0, 1, 2, 3, 5, 6, 7]
+    assert records["load"].tolist() == [[time, 2 * time] for time in [0, 1, 2, 3, 5, 6, 7]]
+    assert list(recorder.read(path, ["time"])) == ["time"]
+
+
+def test_columns_of_differing_shape_kept_as_rows(tmp_path):
+    path = str(tmp_path)
+    rec = recorder.Recorder(path, buffer=2)
+    for row in [{"load": None, "name": "a"}, {"load": [1, 2]}, {"load": [3, 4], "name": "b"}]:
+        rec.append(row)
+    rec.close()
+    records = recorder.read(path)
+    assert records["load"][0] is None and list(records["load"][2]) == [3, 4]
+    assert records["name"].tolist() == ["a", None, "b"]
+    assert isinstance(records["load"], numpy.ndarray)
@@ -0,0 +1,42 @@
+import pytest
+import SPmodelling.Backend as backend
+import SPmodelling.Interface as intf
+import SPmodelling.Reset as reset
+
+
+def test_lookups_indexed_once(configure, capsys):
+    configure(indexes=[("Agent", "wealth")])
+    assert reset.lookups() == [("Agent", "id", True), ("Sequence", "label", True), ("Node", "name", False),
+                               ("Agent", "wealth", False)]
+    reset.main(0, 20, 1)
+    with backend.session(None) as ses:
+        assert set(ses.read_transaction(intf.indexes)) >= {("Agent", "id"), ("Node", "name"), ("Agent", "wealth")}
+        assert reset.provision_indexes(ses, reset.lookups()) == []
+        assert reset.unindexed(ses, reset.lookups() + [("Agent", "age", False)]) == [("Agent", "age")]
+    assert "Unindexed lookup: Agent.age" in capsys.readouterr().out
+
+
+def test_agent_ids_allocated_in_blocks(configure):
+    configure(agents=0)
+    reset.main(0, 0, 1)
+    with backend.session(None) as ses:
+        ses.write_transaction(intf.addnode, "Agent", {"id": 7, "wealth": 1})
+        assert ses.write_transaction(intf.addagents, {"id": 1}, "Agent", [{"wealth": 1}] * 3, "id") == [8, 9, 10]
+        ses.write_transaction(intf.addagent, {"id": 2}, "Agent", {"wealth": 1}, "id")
+        assert ses.write_transaction(intf.nextids, "Agent", 2) == 12
+        assert ses.write_transaction(intf.addagents, {"id": 2}, "Agent", [], "id") == []
+        assert sorted(ses.read_transaction(intf.agentids)) == [7, 8, 9, 10, 11]
+
+
+@pytest.mark.parametrize("strategy", ["single", "chunked", "drop"])
+def test_every_run_starts_from_the_same_state(strategy, configure):
+    configure(clear_strategy=strategy, clear_batch=7)
+    runs = []
+    for run in range(2):
+        reset.main(run, 20, 1)
+        with backend.session(None) as ses:
+            runs.append((sorted(ses.read_transaction(intf.agentids)), len(ses.read_transaction(intf.graphnodes)),
+                         len(ses.read_transaction(intf.graphedges)), ses.read_transaction(intf.getrunname)))
+    assert runs[0][0] == runs[1][0] == list(range(20))
+    assert runs[0][1:3] == runs[1][1:3]
+    assert [run[3] for run in runs] == ["model_test_20_1_0", "model_test_20_1_1"]
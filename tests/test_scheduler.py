@@ -0,0 +1,52 @@
+import threading
+import pytest
+import SPmodelling.Instrument as instrument
+import SPmodelling.Scheduler as scheduler
+import SPmodelling.SPm as spm
+
+
+def test_missing_modules_pass_their_order_on():
+    after = scheduler.dependencies(["Flow", "Social", "Monitor", "Structure"])
+    assert after == {"Flow": {"Structure"}, "Social": {"Flow"}, "Monitor": {"Social"}, "Structure": set()}
+    order = {"A": [], "B": ["A"], "C": ["A"], "D": ["B", "C"]}
+    assert scheduler.levels(scheduler.dependencies(["A", "B", "C", "D"], order)) == [["A"], ["B", "C"], ["D"]]
+    with pytest.raises(ValueError, match="No phase declared for Census"):
+        scheduler.dependencies(["Flow", "Census"])
+    with pytest.raises(ValueError, match="cycle"):
+        scheduler.dependencies(["A", "B"], {"A": ["B"], "B": ["A"]})
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_phases_run_after_those_they_follow(workers):
+    ran = []
+    lock = threading.Lock()
+
+    def phase(name):
+        def run(ses, clock):
+            with lock:
+                ran.append((clock, name))
+        return scheduler.Phase(name, None, run)
+
+    order = {"A": [], "B": ["A"], "C": ["A"], "D": ["B", "C"]}
+    built = {name: phase(name) for name in order}
+    for name, after in scheduler.dependencies(list(order), order).items():
+        built[name].after = after
+    executor = scheduler.concurrent.futures.ThreadPoolExecutor(max_workers=workers) if workers else None
+    try:
+        for clock in range(3):
+            scheduler.runtick(executor, built, clock)
+    finally:
+        if executor:
+            executor.shutdown()
+    for clock in range(3):
+        names = [name for time, name in ran if time == clock]
+        assert names[0] == "A" and sorted(names[1:3]) == ["B", "C"] and names[3] == "D"
+
+
+def test_phased_run_sees_every_tick(configure, tmp_path):
+    configure(orchestrator="phases", instrument=True, instrument_path=str(tmp_path))
+    result = spm.run(0, 3, 20, ["Flow", "Population", "Social", "Monitor"])
+    steps = sorted(instrument.steps)
+    seen = {module: [clock for clock, name in steps if name == module] for module in ["Flow", "Population"]}
+    assert result["time"] == 3 and seen == {"Flow": [0, 1, 2], "Population": [0, 1, 2]}
+    assert (tmp_path / "model_test_20_3_0.trace.jsonl").exists()
@@ -0,0 +1,105 @@
+import concurrent.futures
+import threading
+import pytest
+import SPmodelling.Backend as backend
+import SPmodelling.Cache as cache
+import SPmodelling.Instrument as instrument
+import SPmodelling.Interface as intf
+import SPmodelling.Reset as reset
+import SPmodelling.Social as social
+
+
+def test_chunks_cover_agents_in_order():
+    assert social.chunks([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert social.chunks([1, 2, 3], None) == [[1, 2, 3]]
+    assert social.chunks([], 2) == []
+
+
+@pytest.mark.parametrize("workers", [None, 3])
+def test_step_socialises_every_agent_once(workers, monkeypatch, configure):
+    spec = configure(10, 40, 60)
+    socialised = []
+
+    class CountedAgent(spec.Agent):
+        def socialise(self, tx):
+            socialised.append(self.id)
+            super().socialise(tx)
+
+    monkeypatch.setattr(spec, "Agent", CountedAgent)
+    reset.main(0, 60, 1)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers) if workers else None
+    try:
+        with backend.session(None) as ses:
+            assert social.step(ses, executor, 7) == 0
+            agents = ses.read_transaction(intf.agentids)
+            with pytest.raises(ValueError):
+                social.step(ses, executor, 7, strategy="later")
+    finally:
+        if executor:
+            executor.shutdown()
+    assert sorted(socialised) == sorted(agents)
+
+
+def test_chunk_queries_recorded_against_social(configure):
+    configure(10, 40, 60)
+    reset.main(0, 60, 1)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=3)
+    instrument.enable()
+    instrument.reset()
+    try:
+        with backend.session(None) as ses:
+            with instrument.step("Social", 0):
+                social.step(ses, executor, 10)
+    finally:
+        instrument.enable(False)
+        executor.shutdown()
+    modules = {module for clock, module, function in instrument.calls}
+    assert modules == {"Social"}
+
+
+def test_neighbourhood_cache_scoped_to_step_and_deleted_agents(configure):
+    configure(4, 4, 6)
+    reset.main(0, 6, 1)
+    with backend.session(None) as ses:
+        for node_a, node_b in [(0, 1), (1, 2), (3, 4)]:
+            ses.write_transaction(intf.createedge, node_a, node_b, "Agent", "Agent", "SOCIAL")
+        assert ses.read_transaction(intf.shortestpath, 0, 2, "Agent", "SOCIAL", True) == 2
+
+        def contacts(node):
+            return [edge.end_node["id"] for edge in ses.read_transaction(intf.agentcontacts, node, "Agent")]
+
+        with cache.neighbourhoods.step(0):
+            assert contacts(3) == [4]
+            outside = []
+            thread = threading.Thread(target=lambda: outside.append(cache.neighbourhoods.contacts(3, None, None, list)))
+            thread.start()
+            thread.join()
+            assert outside == [None]
+            ses.write_transaction(intf.deleteagent, {"id": 1})
+            assert cache.neighbourhoods.stale == {0, 1}
+            assert cache.neighbourhoods.edges is not None
+            assert contacts(0) == []
+            assert contacts(3) == [4]
+            assert 1 not in [ag["id"] for ag in ses.read_transaction(intf.colocated, 2)]
+            ses.write_transaction(intf.addagent, {"id": 0}, "Agent", {"wealth": 1}, "id")
+            assert cache.neighbourhoods.located is None
+        assert cache.neighbourhoods.contacts(3, None, None, list) is None
+        assert ses.read_transaction(intf.shortestpath, 0, 2, "Agent", "SOCIAL", True) is None
+
+
+def test_cached_colocation_follows_moves(configure):
+    configure(4, 4, 0)
+    reset.main(0, 0, 1)
+    with backend.session(None) as ses:
+        first = ses.write_transaction(intf.addagents, {"id": 0}, "Agent", [{"wealth": 1}] * 2, "id")
+        second = ses.write_transaction(intf.addagents, {"id": 1}, "Agent", [{"wealth": 1}] * 2, "id")
+
+        def met(agent):
+            return sorted(ag["id"] for ag in ses.read_transaction(intf.colocated, agent))
+
+        with cache.neighbourhoods.step(0):
+            assert met(first[0]) == first
+            ses.write_transaction(intf.moveagent, first[0], 1)
+            assert met(first[0]) == sorted(second + first[:1])
+            ses.write_transaction(intf.moveagents, [{"id": agent, "new": 2} for agent in second])
+            assert met(first[0]) == first[:1]
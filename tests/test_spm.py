@@ -0,0 +1,26 @@
+import pytest
+import SPmodelling.Backend as backend
+import SPmodelling.Interface as intf
+import SPmodelling.SPm as spm
+
+
+@pytest.mark.parametrize("modules", [None, ["Flow", "Population", "Social", "Monitor"]])
+def test_run_reaches_length(modules, configure):
+    configure()
+    result = spm.run(0, 3, 20, modules)
+    assert result["time"] == (4 if modules else 0) and result["name"] == "model_test_20_3_0"
+    with backend.session(None) as ses:
+        assert len(ses.read_transaction(intf.agentids)) == 20
+
+
+def test_parallel_runs_in_run_order(configure):
+    configure()
+    results = spm.main(3, 2, 10, ["Flow", "Population"], processes=2)
+    assert [(result["run"], result["name"], result["time"]) for result in results] == [
+        (run, "model_test_10_2_" + str(run), 3) for run in range(3)]
+
+
+def test_parallel_neo4j_runs_need_a_database_each(configure):
+    configure(backend="neo4j", database_uris=["bolt://one"])
+    with pytest.raises(ValueError, match="database_uris has 1 for 2 processes"):
+        spm._databases(2)
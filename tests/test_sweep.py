@@ -0,0 +1,55 @@
+import json
+import os
+import pytest
+import SPmodelling.Sweep as sweep
+
+
+def test_designs():
+    assert sweep.grid(population=[10, 20], alpha=[0.1]) == [{"alpha": 0.1, "population": 10},
+                                                             {"alpha": 0.1, "population": 20}]
+    design = sweep.sample(4, seed=2, population=(10, 20), alpha=(0.0, 1.0), mode=["a", "b"])
+    assert design == sweep.sample(4, seed=2, population=(10, 20), alpha=(0.0, 1.0), mode=["a", "b"])
+    assert all(isinstance(point["population"], int) and 10 <= point["population"] <= 20 for point in design)
+    assert all(0.0 <= point["alpha"] <= 1.0 and point["mode"] in ("a", "b") for point in design)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_sweep_resumed_after_failures(processes, configure, tmp_path, monkeypatch):
+    spec = configure(orchestrator="phases")
+    path = str(tmp_path / "sweep")
+    design = sweep.grid(population=[10, 15], fail=[True, False])
+
+    class FailingAgent(spec.Agent):
+        def bulkgenerator(self, tx, params, number):
+            if spec.fail:
+                raise RuntimeError("point failed")
+            super().bulkgenerator(tx, params, number)
+
+    monkeypatch.setattr(spec, "Agent", FailingAgent)
+    with pytest.raises(RuntimeError, match="point failed"):
+        sweep.run(design, 4, 10, ["Flow", "Monitor"], path, processes, repeats=2)
+    finished = sweep.completed(path)
+    assert sorted((entry["index"], entry["repeat"]) for entry in finished) == [(2, 0), (2, 1), (3, 0), (3, 1)]
+    assert not hasattr(spec, "fail")
+    with open(os.path.join(path, "sweep.jsonl"), "a") as f:
+        f.write('{"run id": "p000001_r0')
+    monkeypatch.undo()
+    configure(orchestrator="phases")
+    entries = sweep.run(design, 4, 10, ["Flow", "Monitor"], path, processes, repeats=2)
+    assert [entry["run id"] for entry in entries] == [sweep.runid(index, repeat) for index in range(4)
+                                                      for repeat in range(2)]
+    assert len(sweep.completed(path)) == 8
+    data = sweep.read(path, ["record"])
+    assert data["run id"].tolist() == [entry["run id"] for entry in entries for row in range(2)]
+    assert sorted(set(data["population"].tolist())) == [10, 15]
+    with pytest.raises(ValueError, match="different design"):
+        sweep.run(design[:1], 2, 10, ["Flow"], path, processes)
+
+
+def test_nothing_rerun_once_finished(configure, tmp_path):
+    configure()
+    path = str(tmp_path)
+    first = sweep.run([{"population": 5}], 1, 5, ["Flow"], path, 1)
+    assert sweep.run([{"population": 5}], 1, 5, ["Flow"], path, 1) == first
+    with open(os.path.join(path, "design.json")) as f:
+        assert json.load(f)["design"] == [{"population": 5}]
@@ -0,0 +1,60 @@
+import gc
+import os
+import pickle
+from SPmodelling.Wheel import AgentQueue
+
+
+def contents(queue):
+    return {tick: dict(queue[tick]) for tick in queue}
+
+
+def test_reads_like_a_dictionary_of_slots():
+    queue = AgentQueue({3: {1: ["n1", 0]}})
+    queue.enqueue(2, 5, ["n2", 1])
+    queue[5][3] = ["n3", 1]
+    queue.enqueue(1, 4, ["n4", 0])
+    assert contents(queue) == {3: {}, 4: {1: ["n4", 0]}, 5: {2: ["n2", 1], 3: ["n3", 1]}}
+    assert queue.queued(3) and queue.slotof(1) == 4 and not queue.queued(9)
+    del queue[5][2]
+    assert not queue.queued(2)
+    queue.expire(4)
+    assert list(queue) == [5] and queue.due(4) == {} and queue.due(5) == {3: ["n3", 1]}
+    assert not queue.queued(1)
+
+
+def test_ticks_pushed_once():
+    queue = AgentQueue()
+    for agent in range(5):
+        queue[7] = {agent: None}
+    assert queue.ticks == [7]
+    queue.expire(7)
+    queue.enqueue(1, 7, None)
+    assert queue.ticks == [7] and queue.due(7) == {1: None}
+
+
+def test_distant_slots_spilled_and_read_back(tmp_path):
+    queue = AgentQueue(spill=4, path=str(tmp_path))
+    for agent in range(10):
+        queue.enqueue(agent, agent // 2, [agent])
+    assert queue.spilledticks and queue.resident <= 4
+    assert len(os.listdir(str(tmp_path))) == 1
+    assert contents(queue) == {tick: {2 * tick: [2 * tick], 2 * tick + 1: [2 * tick + 1]} for tick in range(5)}
+    assert all(queue.queued(agent) for agent in range(10))
+    queue.expire(4)
+    assert len(queue) == 0 and os.listdir(str(tmp_path)) == []
+
+
+def test_pickled_with_spilled_slots(tmp_path):
+    queue = AgentQueue(spill=4, path=str(tmp_path))
+    for agent in range(10):
+        queue.enqueue(agent, agent, [agent])
+    spilled = set(queue.spilledticks)
+    copy = pickle.loads(pickle.dumps(queue))
+    assert queue.spilledticks == copy.spilledticks == spilled
+    assert len(os.listdir(str(tmp_path))) == 2
+    assert contents(copy) == contents(queue) == {agent: {agent: [agent]} for agent in range(10)}
+    copy.enqueue(10, 3, [10])
+    assert copy.slotof(10) == 3 and not queue.queued(10)
+    del queue, copy
+    gc.collect()
+    assert os.listdir(str(tmp_path)) == []